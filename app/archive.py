@@ -0,0 +1,417 @@
+# app/archive.py
+
+"""
+Cold-history archival of calculations.
+
+The retention job moves calculations older than ARCHIVE_AFTER_DAYS out of the
+database into compressed Arrow IPC files, partitioned by user and month:
+
+    {ARCHIVE_DIR}/user_id=7/month=2024-03/part-00000120-00000345-00000200.arrow
+
+The file name holds the first id, the last id and the row count. Part files
+are written once and never modified. A new run adds new parts, so the
+archive is append-only, and the archive can be counted and paged without
+opening any part.
+
+Deleting archived calculations does not rewrite parts either: the deleted
+ids are written to a new tombstone file under {ARCHIVE_DIR}/user_id=7/deleted/,
+and every read leaves them out. Each part is split into record batches of
+ARCHIVE_BATCH_ROWS rows that are compressed separately; the schema metadata
+lists the first id of every batch, so reads decompress only the batches they
+need.
+
+`GET /calculations` lists a user's history in id order, merging archived and
+live rows by id. Pages that reach into the archive are read through
+memory-mapped IPC readers. Archived timestamps are returned the way the live
+database returns them (naive UTC on SQLite).
+
+    python -m app.archive run [--older-than-days 365]
+"""
+
+import argparse
+import bisect
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Engine
+
+from app import database
+from app.calculation_queries import normalize_timestamp
+from app.models import Calculation
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+ARCHIVE_BATCH_SIZE = 10_000
+# Rows per record batch inside a part. Batches are compressed separately, so a
+# read decompresses only the batches it needs.
+ARCHIVE_BATCH_ROWS = int(os.getenv("ARCHIVE_BATCH_ROWS", "1024"))
+
+_PART_RE = re.compile(r"part-(\d+)-(\d+)-(\d+)\.arrow$")
+
+COLUMNS = ["id", "a", "b", "type", "result", "user_id", "created_at"]
+# Archive columns stored under another name in the calculations table
+COLUMN_KEYS = {"type": "type_code"}
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("a", pa.int64()),
+        ("b", pa.int64()),
+        ("type", pa.dictionary(pa.int8(), pa.string())),
+        ("result", pa.int64()),
+        ("user_id", pa.int64()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+def _user_dir(user_id: int, root: str) -> str:
+    return os.path.join(root, f"user_id={user_id}")
+
+
+def list_parts(user_id: int, root: str = None) -> List[tuple]:
+    """Return [(first_id, last_id, rows, path)] for a user, in id order."""
+    user_dir = _user_dir(user_id, root or ARCHIVE_DIR)
+    if not os.path.isdir(user_dir):
+        return []
+    parts = []
+    for month in os.listdir(user_dir):
+        if not month.startswith("month="):
+            continue
+        month_dir = os.path.join(user_dir, month)
+        for name in os.listdir(month_dir):
+            match = _PART_RE.match(name)
+            if match:
+                first, last, rows = (int(g) for g in match.groups())
+                parts.append((first, last, rows, os.path.join(month_dir, name)))
+    parts.sort()
+    return parts
+
+
+def _deleted_dir(user_id: int, root: str) -> str:
+    return os.path.join(_user_dir(user_id, root), "deleted")
+
+
+def deleted_ids(user_id: int, root: str = None) -> List[int]:
+    """The ids of a user's deleted archived calculations, sorted."""
+    import pyarrow as pa
+
+    deleted_dir = _deleted_dir(user_id, root or ARCHIVE_DIR)
+    if not os.path.isdir(deleted_dir):
+        return []
+    ids = set()
+    for name in os.listdir(deleted_dir):
+        if name.endswith(".arrow"):
+            with pa.memory_map(os.path.join(deleted_dir, name)) as source:
+                ids.update(pa.ipc.open_file(source).read_all().column("id").to_pylist())
+    return sorted(ids)
+
+
+def _deleted_in(deleted: List[int], first: int, last: int) -> List[int]:
+    """The deleted ids within a part's id range."""
+    return deleted[bisect.bisect_left(deleted, first):bisect.bisect_right(deleted, last)]
+
+
+def count(user_id: int, root: str = None) -> int:
+    return sum(rows for _, _, rows, _ in list_parts(user_id, root)) - len(deleted_ids(user_id, root))
+
+
+def last_id(user_id: int, root: str = None) -> Optional[int]:
+    """The highest archived id of a user, or None with nothing archived."""
+    parts = list_parts(user_id, root)
+    return max(last for _, last, _, _ in parts) if parts else None
+
+
+def _batch_layout(reader, first: int, rows: int) -> tuple:
+    """
+    (rows per record batch, first id of every batch), from the part's schema
+    metadata, which is read with the footer and needs no decompression.
+    """
+    metadata = reader.schema.metadata or {}
+    if b"batch_first_ids" not in metadata:
+        # Parts written before the metadata existed hold a single batch
+        return rows, [first]
+    return int(metadata[b"batch_rows"]), [int(i) for i in metadata[b"batch_first_ids"].split(b",")]
+
+
+def _read_part(part: tuple, skip: int, limit: int) -> List[dict]:
+    """Rows skip..skip+limit of a part; only the record batches holding them are decompressed."""
+    import pyarrow as pa
+
+    first, _, part_rows, path = part
+    rows = []
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        batch_rows, _ = _batch_layout(reader, first, part_rows)
+        index, skip = divmod(skip, batch_rows)
+        while len(rows) < limit and index < reader.num_record_batches:
+            rows += reader.get_batch(index).slice(skip, limit - len(rows)).to_pylist()
+            index += 1
+            skip = 0
+    return rows
+
+
+def read(user_id: int, offset: int, limit: int, root: str = None) -> List[dict]:
+    """Archived rows offset..offset+limit of a user's history, in id order."""
+    deleted = deleted_ids(user_id, root)
+    rows = []
+    for part in list_parts(user_id, root):
+        first, last, part_rows, _ = part
+        if len(rows) >= limit:
+            break
+        gone = set(_deleted_in(deleted, first, last))
+        if offset >= part_rows - len(gone):
+            offset -= part_rows - len(gone)
+            continue
+        if gone:
+            # Offsets within the part shift past deleted rows, so read it whole
+            kept = [row for row in _read_part(part, 0, part_rows) if row["id"] not in gone]
+            rows += kept[offset:offset + limit - len(rows)]
+        else:
+            rows += _read_part(part, offset, limit - len(rows))
+        offset = 0
+    return rows
+
+
+def _filter_mask(batch, filters, after_id: Optional[int]):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    mask = None
+
+    def both(condition):
+        return condition if mask is None else pc.and_(mask, condition)
+
+    if after_id is not None:
+        mask = both(pc.greater(batch.column("id"), after_id))
+    if filters is None:
+        return mask
+    if filters.type is not None:
+        mask = both(pc.equal(batch.column("type").cast(pa.string()), filters.type))
+    if filters.min_result is not None:
+        mask = both(pc.greater_equal(batch.column("result"), filters.min_result))
+    if filters.max_result is not None:
+        mask = both(pc.less_equal(batch.column("result"), filters.max_result))
+    timestamp = pa.timestamp("us", tz="UTC")
+    if filters.since is not None:
+        since = pa.scalar(normalize_timestamp(filters.since, "arrow"), type=timestamp)
+        mask = both(pc.greater_equal(batch.column("created_at"), since))
+    if filters.until is not None:
+        until = pa.scalar(normalize_timestamp(filters.until, "arrow"), type=timestamp)
+        mask = both(pc.less(batch.column("created_at"), until))
+    return mask
+
+
+def search(user_id: int, filters=None, after_id: Optional[int] = None, limit: int = None, root: str = None) -> List[dict]:
+    """
+    Archived rows matching `filters` (a CalculationFilters) with id > after_id,
+    in id order, at most `limit` of them. Parts and record batches that end at
+    or before after_id are never read, and reading stops once `limit` rows
+    have matched.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    deleted = deleted_ids(user_id, root)
+    rows = []
+    for first, last, part_rows, path in list_parts(user_id, root):
+        if limit is not None and len(rows) >= limit:
+            break
+        if after_id is not None and last <= after_id:
+            continue
+        gone = pa.array(_deleted_in(deleted, first, last), pa.int64())
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            _, first_ids = _batch_layout(reader, first, part_rows)
+            for index in range(reader.num_record_batches):
+                if limit is not None and len(rows) >= limit:
+                    break
+                # Every id in batch `index` is below the next batch's first id
+                if after_id is not None and index + 1 < len(first_ids) and first_ids[index + 1] - 1 <= after_id:
+                    continue
+                batch = reader.get_batch(index)
+                mask = _filter_mask(batch, filters, after_id)
+                if mask is not None:
+                    batch = batch.filter(mask)
+                if len(gone):
+                    batch = batch.filter(pc.invert(pc.is_in(batch.column("id"), value_set=gone)))
+                if limit is not None:
+                    batch = batch.slice(0, limit - len(rows))
+                rows += batch.to_pylist()
+    return rows
+
+
+def get(user_id: int, calculation_id: int, root: str = None) -> Optional[dict]:
+    """Look up one archived calculation; only the record batch whose id range covers it is read."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if _deleted_in(deleted_ids(user_id, root), calculation_id, calculation_id):
+        return None
+    for first, last, part_rows, path in list_parts(user_id, root):
+        if first <= calculation_id <= last:
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                _, first_ids = _batch_layout(reader, first, part_rows)
+                batch = reader.get_batch(bisect.bisect_right(first_ids, calculation_id) - 1)
+                match = batch.filter(pc.equal(batch.column("id"), calculation_id)).to_pylist()
+            if match:
+                return match[0]
+    return None
+
+
+def _archived_among(parts: List[tuple], ids: Optional[List[int]]) -> set:
+    """
+    Which of `ids` (every id with None) are archived in `parts`. The part file
+    names give each part's id range; only parts whose range covers one of the
+    ids are opened, and only their id column is read.
+    """
+    import pyarrow as pa
+
+    done = set()
+    for first, last, _, path in parts:
+        candidates = None if ids is None else {i for i in ids if first <= i <= last}
+        if candidates is not None and not candidates:
+            continue
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source, options=pa.ipc.IpcReadOptions(included_fields=[0]))
+            part_ids = reader.read_all().column("id").to_pylist()
+        done |= set(part_ids) if candidates is None else candidates.intersection(part_ids)
+    return done
+
+
+def delete_calculations(user_id: int, ids: Optional[List[int]] = None, filters=None, root: str = None) -> int:
+    """
+    Delete a user's archived calculations with the given ids, or those
+    matching `filters` (a CalculationFilters), or, with neither, all of them.
+    Returns how many were deleted.
+    """
+    import pyarrow as pa
+
+    root = root or ARCHIVE_DIR
+    parts = list_parts(user_id, root)
+    if not parts:
+        return 0
+    if filters is not None and not filters.is_empty():
+        # search() already leaves out deleted rows
+        found = {row["id"] for row in search(user_id, filters, root=root)}
+    else:
+        found = _archived_among(parts, ids) - set(deleted_ids(user_id, root))
+    if not found:
+        return 0
+    deleted_dir = _deleted_dir(user_id, root)
+    os.makedirs(deleted_dir, exist_ok=True)
+    # A new file per delete, so concurrent deletes never overwrite each other
+    path = os.path.join(deleted_dir, f"deleted-{uuid.uuid4().hex}.arrow")
+    table = pa.table({"id": pa.array(sorted(found), pa.int64())})
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+    return len(found)
+
+
+def _write_part(user_id: int, month: str, rows: List[dict], root: str) -> tuple:
+    import pyarrow as pa
+
+    month_dir = os.path.join(_user_dir(user_id, root), f"month={month}")
+    os.makedirs(month_dir, exist_ok=True)
+    name = f"part-{rows[0]['id']:08d}-{rows[-1]['id']:08d}-{len(rows):08d}.arrow"
+    path = os.path.join(month_dir, name)
+    batches = pa.Table.from_pylist(rows, schema=_schema()).to_batches(max_chunksize=ARCHIVE_BATCH_ROWS)
+    # Lets readers pick record batches by offset or id without decompressing any
+    schema = _schema().with_metadata({
+        "batch_rows": str(ARCHIVE_BATCH_ROWS),
+        "batch_first_ids": ",".join(str(batch.column(0)[0].as_py()) for batch in batches),
+    })
+    tmp_path = path + ".tmp"
+    options = pa.ipc.IpcWriteOptions(compression=ARCHIVE_COMPRESSION)
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, schema, options=options) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    # Readers only ever see complete part files
+    os.replace(tmp_path, path)
+    return rows[0]["id"], rows[-1]["id"], len(rows), path
+
+
+def archive_engine(engine: Engine, cutoff: datetime, root: str = None) -> int:
+    """
+    Move calculations created before `cutoff` from one database into the
+    archive. Each batch is written to disk before it is deleted, and rows that
+    are already archived (from an interrupted run) are not written twice.
+    """
+    root = root or ARCHIVE_DIR
+    table = Calculation.__table__
+    # Each user's parts, listed once per run and kept up to date as parts are written
+    parts = {}
+    if engine.dialect.name == "sqlite":
+        # SQLite stores naive UTC timestamps
+        cutoff = cutoff.astimezone(timezone.utc).replace(tzinfo=None)
+    moved = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(*[table.c[COLUMN_KEYS.get(name, name)].label(name) for name in COLUMNS])
+                .where(table.c.created_at < cutoff)
+                .order_by(table.c.user_id, table.c.id)
+                .limit(ARCHIVE_BATCH_SIZE)
+            ).mappings().all()
+        if not rows:
+            return moved
+
+        partitions = {}
+        for row in rows:
+            row = dict(row)
+            created_at = row["created_at"]
+            if created_at.tzinfo is None:
+                row["created_at"] = created_at = created_at.replace(tzinfo=timezone.utc)
+            partitions.setdefault((row["user_id"], created_at.strftime("%Y-%m")), []).append(row)
+
+        for (user_id, month), part_rows in partitions.items():
+            if user_id not in parts:
+                parts[user_id] = list_parts(user_id, root)
+            done = _archived_among(parts[user_id], [row["id"] for row in part_rows])
+            part_rows = [row for row in part_rows if row["id"] not in done]
+            if part_rows:
+                parts[user_id].append(_write_part(user_id, month, part_rows, root))
+
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.id.in_([row["id"] for row in rows])))
+        moved += len(rows)
+        logger.info(f"Archived {moved} calculations so far")
+
+
+def run(older_than_days: int = None, root: str = None) -> int:
+    """Archive old calculations from the primary database or, if sharded, every shard."""
+    older_than_days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    engines = database.shard_engines or [database.engine]
+    return sum(archive_engine(engine, cutoff, root) for engine in engines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old calculations to compressed Arrow files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="move old calculations into the archive")
+    run_parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    run_parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args(argv)
+
+    moved = run(args.older_than_days, args.archive_dir)
+    print(f"Archived {moved} calculations into {args.archive_dir}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
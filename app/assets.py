@@ -0,0 +1,209 @@
+# app/assets.py
+
+"""
+Fingerprinted static assets.
+
+The page styles and scripts live in static/css and static/js. `build()`
+copies each one to static/dist under a name that includes a hash of its
+content, e.g. js/dashboard.3f9c2a1b7e04.js. It writes a gzip copy next to
+it, and a brotli copy when the `brotli` package is installed. It also writes
+static/dist/manifest.json, which maps source names to built names:
+
+    python -m app.assets build
+
+Templates link assets through the manifest with `asset_url('js/dashboard.js')`.
+A changed file gets a new URL, so `AssetFiles` (mounted at /static) can
+serve every file with `Cache-Control: public, max-age=31536000, immutable`.
+Repeat visits then only download the HTML. It serves the .br or .gz copy
+when the client accepts that encoding.
+
+Files from earlier builds are kept, so pages rendered by workers that have
+not restarted yet still find their assets. When there is no manifest (a
+fresh checkout), the first asset_url() call builds one. With
+ASSETS_AUTO_REBUILD on (the default), an edited source file is noticed too:
+asset_url() compares the sources' sizes and modification times with the
+last check, and rebuilds when their hashes no longer match the manifest. The
+Docker image builds once and sets ASSETS_AUTO_REBUILD=0, so production never
+stats the sources.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+from mimetypes import guess_type
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, "static")
+SOURCE_DIRS = ("css", "js")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+URL_PREFIX = "/static/"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Served in this order of preference when the client accepts them
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+# Rebuild when a source file no longer matches the manifest (off in production)
+ASSETS_AUTO_REBUILD = os.getenv("ASSETS_AUTO_REBUILD", "1") == "1"
+
+_build_lock = threading.Lock()
+_manifest = None
+_manifest_sources = None
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _write(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _sources(static_dir: str) -> list:
+    """[(source name, path)] of every source asset, e.g. ('js/dashboard.js', ...)."""
+    sources = []
+    for source_dir in SOURCE_DIRS:
+        directory = os.path.join(static_dir, source_dir)
+        if os.path.isdir(directory):
+            sources += [(f"{source_dir}/{name}", os.path.join(directory, name)) for name in sorted(os.listdir(directory))]
+    return sources
+
+
+def _built_name(name: str, content: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def is_current(manifest: dict, static_dir: str = STATIC_DIR) -> bool:
+    """Whether the manifest names the current content of every source asset."""
+    expected = {name: _built_name(name, _read(path)) for name, path in _sources(static_dir)}
+    return manifest == expected
+
+
+def _sources_signature(static_dir: str) -> tuple:
+    """Cheap stand-in for the sources' content: their names, sizes and mtimes."""
+    signature = []
+    for name, path in _sources(static_dir):
+        st = os.stat(path)
+        signature.append((name, st.st_size, st.st_mtime_ns))
+    return tuple(signature)
+
+
+def build(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> dict:
+    """Write hashed copies (and compressed variants) of every source asset; returns the manifest."""
+    brotli = _brotli()
+    manifest = {}
+    for name, path in _sources(static_dir):
+        content = _read(path)
+        built = _built_name(name, content)
+        target = os.path.join(dist_dir, built)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not os.path.exists(target):
+            _write(target, content)
+            _write(f"{target}.gz", gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(f"{target}.br", brotli.compress(content, quality=11))
+        manifest[name] = built
+    os.makedirs(dist_dir, exist_ok=True)
+    _write(os.path.join(dist_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def ensure_built(dist_dir: str = DIST_DIR, static_dir: str = STATIC_DIR) -> dict:
+    """The manifest, built first if it is missing or (with ASSETS_AUTO_REBUILD) out of date."""
+    with _build_lock:
+        path = os.path.join(dist_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return build(static_dir, dist_dir)
+        with open(path) as f:
+            manifest = json.load(f)
+        if ASSETS_AUTO_REBUILD and not is_current(manifest, static_dir):
+            return build(static_dir, dist_dir)
+        return manifest
+
+
+def load_manifest() -> dict:
+    """
+    The manifest, read once. With ASSETS_AUTO_REBUILD it is checked again
+    whenever a source file's size or modification time changes.
+    """
+    global _manifest, _manifest_sources
+    sources = _sources_signature(STATIC_DIR) if ASSETS_AUTO_REBUILD else None
+    if _manifest is None or sources != _manifest_sources:
+        _manifest = ensure_built(DIST_DIR, STATIC_DIR)
+        _manifest_sources = sources
+    return _manifest
+
+
+def asset_url(name: str) -> str:
+    """URL of the current build of a source asset, e.g. asset_url('css/auth.css')."""
+    return URL_PREFIX + load_manifest()[name]
+
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles for built assets: immutable caching and precompressed variants."""
+
+    async def check_config(self) -> None:
+        ensure_built(self.directory)
+        await super().check_config()
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        accept_encoding = request_headers.get("accept-encoding", "")
+        headers = {"Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        media_type = guess_type(str(full_path))[0] or "text/plain"
+        path = full_path
+        for encoding, suffix in PRECOMPRESSED:
+            if not _accepts(accept_encoding, encoding):
+                continue
+            try:
+                stat_result = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            path = f"{full_path}{suffix}"
+            headers["Content-Encoding"] = encoding
+            break
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build fingerprinted static assets.")
+    parser.add_argument("command", choices=["build"])
+    parser.parse_args(argv)
+    manifest = build()
+    for name, built in manifest.items():
+        print(f"{name} -> {built}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# app/cache.py
+
+"""
+Caches shared by the app modules, with two backends:
+
+    local    an LRU dict in the worker process (the default)
+    shared   a hash table in a memory-mapped file that every worker on the
+             host maps, so an entry stored by one worker is a hit in the
+             others and an invalidation reaches all of them at once
+
+`make_cache(name, maxsize)` returns the backend chosen by CACHE_BACKEND.
+Both have the same interface:
+
+    get(key)                          value, or None on a miss
+    set(key, value, ttl=None, version=None)
+    delete(key)
+    version(key) / invalidate(key)    per-key version stamps, see below
+    clear(), stats(), len()
+
+Keys are str or bytes. Entries expire `ttl` seconds after they are set
+(default: the cache's `ttl`, None for never). Once `maxsize` entries are
+stored, adding one evicts the least recently used: exactly for the local
+backend, among the few slots the key can go in for the shared one.
+`maxsize = 0` turns a cache off.
+
+Version stamps make invalidation safe against concurrent fills. Read
+`v = cache.version(key)` before computing a value and store it with
+`cache.set(key, value, version=v)`. If `cache.invalidate(key)` ran in
+between, the set is dropped, and entries stored before an invalidation
+are never returned after it. Stamps are kept in a fixed table of
+counters indexed by the key's hash. Two keys may share a counter, which
+only means that invalidating one also drops the other.
+
+Shared caches live in a private directory (mode 0700, owned by the user
+running the app) under SHARED_CACHE_DIR (/dev/shm when it exists), one file
+per cache and layout, e.g. calculator-cache-1000/tokens-10000x512.cache. A
+directory or file that another user owns or can access is refused rather
+than used, since the token cache holds claims the app trusts without
+checking a signature. Values must be bytes or JSON-serializable; nothing
+read back can run code. They are stored with the key in fixed
+SHARED_CACHE_SLOT_BYTES (default 512) slots; larger values are not stored
+and are counted as `oversize`. An exclusive flock
+plus a thread lock serialize access, so each operation costs a few
+microseconds more than a local one. The hit and miss counts are kept in
+the file and cover every worker.
+"""
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Optional, Union
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+SHARED_CACHE_SLOT_BYTES = int(os.getenv("SHARED_CACHE_SLOT_BYTES", "512"))
+
+# Number of version counters; keys hash onto them
+VERSION_SLOTS = 4096
+
+Key = Union[str, bytes]
+
+
+def _key_bytes(key: Key) -> bytes:
+    return key.encode() if isinstance(key, str) else key
+
+
+def _expires_at(ttl: Optional[float], default: Optional[float]) -> float:
+    ttl = default if ttl is None else ttl
+    return time.time() + ttl if ttl is not None else 0.0
+
+
+class LocalCache:
+    """Bounded LRU in this process. Values are stored as they are, not copied."""
+
+    backend = "local"
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (value, expires_at or 0, version)
+        self._entries = OrderedDict()
+        self._versions = [0] * VERSION_SLOTS
+        self._lock = threading.Lock()
+
+    def _version_index(self, key: Key) -> int:
+        return hash(key) % VERSION_SLOTS
+
+    def get(self, key: Key) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, version = entry
+            if (expires_at and expires_at <= time.time()) or version != self._versions[self._version_index(key)]:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Key, value: Any, ttl: Optional[float] = None, version: Optional[int] = None) -> bool:
+        """Store `value`; False if the cache is off or `key` was invalidated since `version`."""
+        if self.maxsize <= 0:
+            return False
+        expires_at = _expires_at(ttl, self.ttl)
+        with self._lock:
+            current = self._versions[self._version_index(key)]
+            if version is not None and version != current:
+                return False
+            self._entries[key] = (value, expires_at, current)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def delete(self, key: Key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def version(self, key: Key) -> int:
+        return self._versions[self._version_index(key)]
+
+    def invalidate(self, key: Key):
+        with self._lock:
+            self._versions[self._version_index(key)] += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "entries": len(self._entries), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ---------------------------------------------
+# Shared memory
+# ---------------------------------------------
+
+# magic, slots, slot size, entries, hits, misses, evictions, oversize
+_HEADER = struct.Struct("<8sIIQQQQQ")
+_HEADER_BYTES = 64
+_COUNTERS_AT = 16
+_MAGIC = b"CALCCHE1"
+_VERSION = struct.Struct("<Q")
+# used, key hash, version, expires at, last used, key length, value length
+_SLOT = struct.Struct("<BQQddHI")
+# Slots a key may be stored in, starting at its hash
+_PROBE = 8
+
+
+# Value encodings: raw bytes, or JSON for anything else
+_BYTES = b"b"
+_JSON = b"j"
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return _BYTES + value
+    return _JSON + json.dumps(value, separators=(",", ":")).encode()
+
+
+def _decode(data: bytes) -> Any:
+    if data[:1] == _BYTES:
+        return data[1:]
+    if data[:1] == _JSON:
+        return json.loads(data[1:])
+    raise ValueError("unknown value encoding")
+
+
+def _check_private(st: os.stat_result, path: str):
+    if st.st_uid != os.geteuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} must be owned by uid {os.geteuid()} and not accessible to others")
+
+
+def private_dir(directory: str) -> str:
+    """This user's 0700 directory for cache files under `directory`, created if needed."""
+    path = os.path.join(directory, f"calculator-cache-{os.geteuid()}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"{path} is not a directory")
+    _check_private(st, path)
+    return path
+
+
+class SharedMemoryCache:
+    """
+    Fixed-size hash table in a memory-mapped file, shared by every process
+    of the same user that opens the same path. Values must be bytes or
+    JSON-serializable and are returned as copies.
+    """
+
+    backend = "shared"
+
+    def __init__(self, name: str, maxsize: int, ttl: Optional[float] = None,
+                 slot_size: int = SHARED_CACHE_SLOT_BYTES, directory: str = SHARED_CACHE_DIR):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.slots = maxsize
+        self._probe = min(_PROBE, maxsize)
+        self.slot_size = slot_size
+        self.path = os.path.join(private_dir(directory), f"{name}-{self.slots}x{slot_size}.cache")
+        self._versions_at = _HEADER_BYTES
+        self._slots_at = _HEADER_BYTES + VERSION_SLOTS * _VERSION.size
+        self._size = self._slots_at + self.slots * slot_size
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            _check_private(os.fstat(self._fd), self.path)
+        except PermissionError:
+            os.close(self._fd)
+            raise
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != self._size:
+                os.ftruncate(self._fd, self._size)
+            self._mm = mmap.mmap(self._fd, self._size)
+            if self._mm[:8] != _MAGIC:
+                self._mm[:self._size] = bytes(self._size)
+                self._write_header(0, 0, 0, 0, 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child shares the parent's lock on the inherited
+                # descriptor; it needs one of its own
+                self._pid = os.getpid()
+                self._fd = os.open(self.path, os.O_RDWR | os.O_NOFOLLOW)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _read_header(self) -> list:
+        return list(_HEADER.unpack_from(self._mm, 0)[3:])
+
+    def _write_header(self, entries, hits, misses, evictions, oversize):
+        _HEADER.pack_into(self._mm, 0, _MAGIC, self.slots, self.slot_size, entries, hits, misses, evictions, oversize)
+
+    def _count(self, field: int, delta: int = 1):
+        # field: 0 entries, 1 hits, 2 misses, 3 evictions, 4 oversize
+        offset = _COUNTERS_AT + field * _VERSION.size
+        _VERSION.pack_into(self._mm, offset, _VERSION.unpack_from(self._mm, offset)[0] + delta)
+
+    @staticmethod
+    def _hash(key: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+    def _version_offset(self, key_hash: int) -> int:
+        return self._versions_at + (key_hash % VERSION_SLOTS) * _VERSION.size
+
+    def _slot_offsets(self, key_hash: int):
+        first = key_hash % self.slots
+        for i in range(self._probe):
+            yield self._slots_at + (first + i) % self.slots * self.slot_size
+
+    def _find(self, key: bytes, key_hash: int) -> Optional[int]:
+        for offset in self._slot_offsets(key_hash):
+            used, slot_hash, _, _, _, key_len, _ = _SLOT.unpack_from(self._mm, offset)
+            start = offset + _SLOT.size
+            if used and slot_hash == key_hash and self._mm[start:start + key_len] == key:
+                return offset
+        return None
+
+    def _free(self, offset: int):
+        self._mm[offset] = 0
+        self._count(0, -1)
+
+    def get(self, key: Key) -> Optional[Any]:
+        key = _key_bytes(key)
+        key_hash = self._hash(key)
+        with self._locked():
+            offset = self._find(key, key_hash)
+            if offset is not None:
+                _, _, version, expires_at, _, key_len, value_len = _SLOT.unpack_from(self._mm, offset)
+                current = _VERSION.unpack_from(self._mm, self._version_offset(key_hash))[0]
+                now = time.time()
+                if (expires_at and expires_at <= now) or version != current:
+                    self._free(offset)
+                    offset = None
+            if offset is None:
+                self._count(2)
+                return None
+            _SLOT.pack_into(self._mm, offset, 1, key_hash, version, expires_at, now, key_len, value_len)
+            start = offset + _SLOT.size + key_len
+            data = self._mm[start:start + value_len]
+            self._count(1)
+        return _decode(data)
+
+    def set(self, key: Key, value: Any, ttl: Optional[float] = None, version: Optional[int] = None) -> bool:
+        """Store `value`; False if the cache is off, the value too large, or `key` invalidated since `version`."""
+        if self.maxsize <= 0:
+            return False
+        key = _key_bytes(key)
+        key_hash = self._hash(key)
+        data = _encode(value)
+        expires_at = _expires_at(ttl, self.ttl)
+        with self._locked():
+            if _SLOT.size + len(key) + len(data) > self.slot_size:
+                self._count(4)
+                return False
+            current = _VERSION.unpack_from(self._mm, self._version_offset(key_hash))[0]
+            if version is not None and version != current:
+                return False
+            now = time.time()
+            offset = self._find(key, key_hash)
+            if offset is None:
+                offset = self._victim(key_hash, now)
+            _SLOT.pack_into(self._mm, offset, 1, key_hash, current, expires_at, now, len(key), len(data))
+            start = offset + _SLOT.size
+            self._mm[start:start + len(key) + len(data)] = key + data
+        return True
+
+    def _victim(self, key_hash: int, now: float) -> int:
+        """Slot for a new key: a free one, else an expired one, else the least recently used."""
+        oldest = None
+        for offset in self._slot_offsets(key_hash):
+            used, _, _, expires_at, last_used, _, _ = _SLOT.unpack_from(self._mm, offset)
+            if not used:
+                self._count(0)
+                return offset
+            if expires_at and expires_at <= now:
+                return offset
+            if oldest is None or last_used < oldest[0]:
+                oldest = (last_used, offset)
+        self._count(3)
+        return oldest[1]
+
+    def delete(self, key: Key):
+        key = _key_bytes(key)
+        with self._locked():
+            offset = self._find(key, self._hash(key))
+            if offset is not None:
+                self._free(offset)
+
+    def version(self, key: Key) -> int:
+        key_hash = self._hash(_key_bytes(key))
+        with self._locked():
+            return _VERSION.unpack_from(self._mm, self._version_offset(key_hash))[0]
+
+    def invalidate(self, key: Key):
+        key = _key_bytes(key)
+        key_hash = self._hash(key)
+        with self._locked():
+            offset = self._version_offset(key_hash)
+            _VERSION.pack_into(self._mm, offset, _VERSION.unpack_from(self._mm, offset)[0] + 1)
+            slot = self._find(key, key_hash)
+            if slot is not None:
+                self._free(slot)
+
+    def clear(self):
+        with self._locked():
+            self._mm[self._slots_at:self._size] = bytes(self._size - self._slots_at)
+            self._write_header(0, 0, 0, 0, 0)
+
+    def stats(self) -> dict:
+        with self._locked():
+            entries, hits, misses, evictions, oversize = self._read_header()
+        return {"backend": self.backend, "entries": entries, "maxsize": self.slots, "hits": hits,
+                "misses": misses, "evictions": evictions, "oversize": oversize, "path": self.path}
+
+    def __len__(self):
+        return self.stats()["entries"]
+
+
+def make_cache(name: str, maxsize: int, ttl: Optional[float] = None, backend: str = None):
+    """The cache called `name`, in the CACHE_BACKEND backend ("local" or "shared")."""
+    backend = backend or CACHE_BACKEND
+    if backend == "shared" and maxsize > 0:
+        return SharedMemoryCache(name, maxsize, ttl)
+    if backend not in ("local", "shared"):
+        raise ValueError(f"CACHE_BACKEND must be 'local' or 'shared', not {backend!r}")
+    return LocalCache(maxsize, ttl)
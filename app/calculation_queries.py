@@ -0,0 +1,158 @@
+# app/calculation_queries.py
+
+"""
+Filtering, fast reads and bulk deletes of a user's calculations.
+
+The filters are designed to be served by the composite indexes on
+calculations: (user_id, id) for plain keyset pages, (user_id, type_code, id)
+for type filters and (user_id, created_at) for created_at windows.
+"""
+
+import heapq
+import itertools
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from pydantic_core import to_json
+from sqlalchemy import delete, func, literal_column, select
+from sqlalchemy.orm import Session
+
+from app.models import Calculation
+from app.schemas import CalculationFilters, CalculationRead
+
+# Rows removed per DELETE statement (and transaction) by bulk deletes
+DELETE_CHUNK_SIZE = 1000
+
+# CalculationRead's fields, in the order the API serializes them
+READ_FIELDS = list(CalculationRead.model_fields)
+READ_COLUMNS = [getattr(Calculation, name).label(name) for name in READ_FIELDS]
+
+
+def get_calculation_filters(
+    type: Optional[str] = None,
+    min_result: Optional[int] = None,
+    max_result: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> CalculationFilters:
+    """Dependency reading the search filters from the query string."""
+    try:
+        return CalculationFilters(type=type, min_result=min_result, max_result=max_result, since=since, until=until)
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors())
+
+
+def normalize_timestamp(value: Optional[datetime], dialect_name: str) -> Optional[datetime]:
+    """Naive timestamps are UTC. SQLite stores naive UTC, so aware ones are converted."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if dialect_name == "sqlite":
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def calculation_conditions(user_id: int, filters: Optional[CalculationFilters], dialect_name: str, after_id: Optional[int] = None) -> list:
+    """WHERE clauses selecting a user's calculations that match `filters`."""
+    conditions = [Calculation.user_id == user_id]
+    if after_id is not None:
+        conditions.append(Calculation.id > after_id)
+    if filters is None:
+        return conditions
+    if filters.type is not None:
+        conditions.append(Calculation.type == filters.type)
+    if filters.min_result is not None:
+        conditions.append(Calculation.result >= filters.min_result)
+    if filters.max_result is not None:
+        conditions.append(Calculation.result <= filters.max_result)
+    if filters.since is not None:
+        conditions.append(Calculation.created_at >= normalize_timestamp(filters.since, dialect_name))
+    if filters.until is not None:
+        conditions.append(Calculation.created_at < normalize_timestamp(filters.until, dialect_name))
+    return conditions
+
+
+def calculation_order(filters: Optional[CalculationFilters], dialect_name: str):
+    """
+    ORDER BY clause for search results, which are always in id order.
+
+    SQLite's planner prefers walking (user_id, id) to skip the sort, which
+    reads the user's whole history when a created_at window matches only
+    recent rows. Under a created_at window the unary plus on id stops it from
+    using an index for the ordering, so (user_id, created_at) is used instead.
+    """
+    if dialect_name == "sqlite" and filters is not None and (filters.since is not None or filters.until is not None):
+        return literal_column("+calculations.id")
+    return Calculation.id
+
+
+def fetch_page(db: Session, conditions: list, order, offset: int, limit: int) -> List[dict]:
+    """
+    One page of calculations as plain dicts in CalculationRead field order.
+
+    Only the response columns are selected, through Core, so no ORM objects
+    are built or tracked in the session's identity map.
+    """
+    query = select(*READ_COLUMNS).where(*conditions).order_by(order).offset(offset).limit(limit)
+    return [dict(row) for row in db.execute(query).mappings()]
+
+
+def first_id(db: Session, conditions: list) -> Optional[int]:
+    """The lowest id matching `conditions`; one (user_id, id) index lookup."""
+    return db.execute(select(func.min(Calculation.id)).where(*conditions)).scalar()
+
+
+def as_read_row(row: dict, dialect_name: str) -> dict:
+    """
+    Reorder an archived calculation dict to CalculationRead field order, with
+    created_at as the live database returns it, so both serialize alike.
+    """
+    row = {name: row[name] for name in READ_FIELDS}
+    row["created_at"] = normalize_timestamp(row["created_at"], dialect_name)
+    return row
+
+
+def merge_by_id(archived: List[dict], live: List[dict], skip: int, limit: int) -> List[dict]:
+    """Rows skip..skip+limit of two id-ordered lists merged in id order."""
+    return list(itertools.islice(heapq.merge(archived, live, key=lambda row: row["id"]), skip, skip + limit))
+
+
+def render_calculations(rows: List[dict]) -> bytes:
+    """
+    JSON for a list of calculation dicts. pydantic-core's serializer is the
+    one response_model uses, so the bytes match CalculationRead output
+    without validating every row again.
+    """
+    return to_json(rows)
+
+
+def delete_matching(db: Session, conditions: list) -> int:
+    """
+    Delete every calculation matching `conditions`, DELETE_CHUNK_SIZE rows per
+    statement, committing after each chunk so row locks (or SQLite's write
+    lock) are held only briefly. Returns the number of rows deleted.
+    """
+    table = Calculation.__table__
+    deleted = 0
+    while True:
+        chunk = select(table.c.id).where(*conditions).limit(DELETE_CHUNK_SIZE).scalar_subquery()
+        count = db.execute(delete(table).where(table.c.id.in_(chunk))).rowcount
+        db.commit()
+        deleted += count
+        if count < DELETE_CHUNK_SIZE:
+            return deleted
+
+
+def delete_ids(db: Session, user_id: int, ids: List[int]) -> int:
+    """Delete the user's calculations with the given ids, in chunks; ids of other users are ignored."""
+    table = Calculation.__table__
+    ids = sorted(set(ids))
+    deleted = 0
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[start:start + DELETE_CHUNK_SIZE]
+        deleted += db.execute(delete(table).where(table.c.user_id == user_id, table.c.id.in_(chunk))).rowcount
+        db.commit()
+    return deleted
@@ -0,0 +1,496 @@
+# app/jobs.py
+
+"""
+Background jobs for work too large for one request.
+
+`POST /jobs` stores a job in a SQLite queue (JOB_DB_PATH, default jobs.db)
+and returns its id with 202 at once. There are two kinds of job:
+
+    batch    compute the results of a list of calculations (of any size
+             integer operands)
+    import   compute them and store them as the user's calculations
+
+A dispatcher thread in each app worker claims queued jobs and runs them in a
+process pool, JOB_CHUNK_SIZE (default 1000) calculations at a time, so
+they use other cores and never hold up the event loop. Between chunks it
+records progress and checks whether the job was cancelled.
+
+- Priority: jobs with a higher `priority` (0-9, default 5) are claimed
+  first, then the oldest.
+- Concurrency: at most JOB_CONCURRENCY jobs (default: the CPU count) run
+  at once on the host, and at most JOB_USER_CONCURRENCY (default 1) per
+  user. Each app worker sharing the queue file counts toward the limits,
+  since the limits are checked by the same UPDATE that claims a job.
+- Cancellation: `DELETE /jobs/{id}` cancels a queued job at once, and a
+  running one when its current chunk ends.
+- Status: `GET /jobs/{id}` (optionally `?wait=<seconds>` to long-poll until
+  the job finishes) or `GET /jobs/{id}/events`, a server-sent event stream
+  with one event per state or progress change.
+
+Import operands and results must fit the calculations table's INTEGER
+column. `submit` only checks the operands, which is cheap; the results are
+computed by the pool like any other, and rows whose result does not fit are
+skipped and listed in the job's result with their index, next to the number
+of rows imported. That result is updated after every chunk, so it also shows
+the progress of a running import.
+
+The queue survives restarts. Running jobs record a heartbeat. When a worker
+exits, or misses heartbeats for JOB_STALE_SECONDS (default 30), its jobs go
+back to the queue. An import resumes after its last recorded chunk. Each
+chunk is stored together with an imported_chunks row in one transaction, so
+a chunk stored just before a crash is recognised and not stored twice. A
+batch starts over.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import operator
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Optional
+
+from pydantic_core import to_json
+from sqlalchemy import Column, DateTime, Float, Index, Integer, LargeBinary, MetaData, String, Table, Text, case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from app import database
+from app.models import Calculation, ImportedChunk
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", str(os.cpu_count() or 1)))
+JOB_USER_CONCURRENCY = int(os.getenv("JOB_USER_CONCURRENCY", "1"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "1000"))
+JOB_MAX_CALCULATIONS = int(os.getenv("JOB_MAX_CALCULATIONS", "100000"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "30"))
+
+KINDS = ("batch", "import")
+FINISHED = frozenset(["succeeded", "failed", "cancelled"])
+
+# Identifies this process's claims; pids alone repeat across container restarts
+OWNER = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+metadata = MetaData()
+
+jobs_table = Table(
+    "jobs",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    # Names the job in imported_chunks; ids repeat across queue files
+    Column("key", String(32), nullable=False),
+    Column("user_id", Integer, nullable=False),
+    Column("kind", String(16), nullable=False),
+    Column("priority", Integer, nullable=False),
+    Column("state", String(16), nullable=False),
+    # JSON list of [a, b, type]
+    Column("payload", Text, nullable=False),
+    Column("total", Integer, nullable=False),
+    Column("done", Integer, nullable=False, default=0),
+    # JSON, kept as bytes: it may hold integers too long for json.loads
+    Column("result", LargeBinary),
+    Column("error", Text),
+    Column("owner", String(48)),
+    Column("heartbeat", Float),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("started_at", DateTime(timezone=True)),
+    Column("finished_at", DateTime(timezone=True)),
+    Index("ix_jobs_state_priority_id", "state", "priority", "id"),
+    Index("ix_jobs_user_id_id", "user_id", "id"),
+)
+
+READ_COLUMNS = [
+    jobs_table.c[name]
+    for name in ("id", "kind", "state", "priority", "total", "done", "error", "created_at", "started_at", "finished_at")
+]
+
+_engine = None
+_lock = threading.Lock()
+_dispatcher: Optional[threading.Thread] = None
+_stop = threading.Event()
+_wake = threading.Event()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def get_engine():
+    global _engine
+    with _lock:
+        if _engine is None:
+            _engine = database.make_engine(f"sqlite:///{JOB_DB_PATH}")
+            metadata.create_all(_engine)
+        return _engine
+
+
+# ---------------------------------------------
+# Work done in the pool processes
+# ---------------------------------------------
+
+_OPERATIONS = {"Add": operator.add, "Subtract": operator.sub, "Multiply": operator.mul, "Divide": operator.floordiv}
+
+
+def compute_chunk(calculations: list) -> list:
+    """Results of [a, b, type] calculations, the way POST /calculations computes them."""
+    return [_OPERATIONS[kind](a, b) for a, b, kind in calculations]
+
+
+# ---------------------------------------------
+# Queue
+# ---------------------------------------------
+
+def integer_bounds() -> tuple:
+    """The smallest and largest value the calculations table's INTEGER columns hold."""
+    engines = database.shard_engines or [database.engine]
+    # 64-bit on SQLite, 32-bit (int4) on PostgreSQL
+    bits = 64 if all(engine.dialect.name == "sqlite" for engine in engines) else 32
+    return -2 ** (bits - 1), 2 ** (bits - 1) - 1
+
+
+def check_import(calculations: list):
+    """Raise ValueError unless every operand can be stored; results are checked as they are computed."""
+    low, high = integer_bounds()
+    for index, (a, b, kind) in enumerate(calculations):
+        if not (low <= a <= high and low <= b <= high):
+            raise ValueError(f"Calculation {index}: operands must be between {low} and {high}")
+
+
+def submit(user_id: int, kind: str, calculations: list, priority: int = 5) -> dict:
+    """Queue a job of [a, b, type] calculations; returns its status."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    if kind == "import":
+        check_import(calculations)
+    statement = (
+        insert(jobs_table)
+        .values(
+            key=uuid.uuid4().hex, user_id=user_id, kind=kind, priority=priority, state="queued", payload=json.dumps(calculations),
+            total=len(calculations), done=0, created_at=_now(),
+        )
+        .returning(*READ_COLUMNS)
+    )
+    with get_engine().begin() as conn:
+        job = dict(conn.execute(statement).mappings().one())
+    _wake.set()
+    return job
+
+
+def get(job_id: int, user_id: int, with_result: bool = True) -> Optional[dict]:
+    columns = READ_COLUMNS + [jobs_table.c.result] if with_result else READ_COLUMNS
+    query = select(*columns).where(jobs_table.c.id == job_id, jobs_table.c.user_id == user_id)
+    with get_engine().connect() as conn:
+        row = conn.execute(query).mappings().first()
+    return dict(row) if row is not None else None
+
+
+def list_jobs(user_id: int, limit: int = 50) -> list:
+    """The user's most recent jobs, without their results."""
+    query = select(*READ_COLUMNS).where(jobs_table.c.user_id == user_id).order_by(jobs_table.c.id.desc()).limit(limit)
+    with get_engine().connect() as conn:
+        return [dict(row) for row in conn.execute(query).mappings()]
+
+
+def cancel(job_id: int, user_id: int) -> Optional[dict]:
+    """Cancel a queued or running job; returns its status (unchanged if it had already finished)."""
+    statement = (
+        update(jobs_table)
+        .where(jobs_table.c.id == job_id, jobs_table.c.user_id == user_id, jobs_table.c.state.in_(["queued", "running"]))
+        .values(state="cancelled", finished_at=_now())
+    )
+    with get_engine().begin() as conn:
+        conn.execute(statement)
+    return get(job_id, user_id, with_result=False)
+
+
+def render(job: dict) -> bytes:
+    """JSON for a job, with the stored result bytes spliced in as they are."""
+    body = to_json({key: value for key, value in job.items() if key != "result"})
+    result = job.get("result")
+    return body[:-1] + b',"result":' + (result if result is not None else b"null") + b"}"
+
+
+async def wait_until_finished(job_id: int, user_id: int, timeout: float) -> Optional[dict]:
+    """The job once it has finished, or as it is after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    job = await run_in_threadpool(get, job_id, user_id)
+    while job is not None and job["state"] not in FINISHED and time.monotonic() < deadline:
+        await asyncio.sleep(min(JOB_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+        job = await run_in_threadpool(get, job_id, user_id)
+    return job
+
+
+async def events(job_id: int, user_id: int):
+    """Server-sent events: the job's status each time its state or progress changes."""
+    last = None
+    while True:
+        job = await run_in_threadpool(get, job_id, user_id)
+        if job is None:
+            return
+        if (job["state"], job["done"]) != last:
+            last = (job["state"], job["done"])
+            yield b"event: " + job["state"].encode() + b"\ndata: " + render(job) + b"\n\n"
+        if job["state"] in FINISHED:
+            return
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+def claim_next(conn) -> Optional[dict]:
+    """
+    Mark the next job that fits the concurrency limits as running by this
+    process, in one UPDATE, so concurrent dispatchers never claim the same
+    job or exceed the limits together.
+    """
+    candidate = jobs_table.alias("candidate")
+    running = jobs_table.alias("running")
+    running_total = select(func.count()).select_from(running).where(running.c.state == "running").scalar_subquery()
+    running_for_user = (
+        select(func.count())
+        .select_from(running)
+        .where(running.c.state == "running", running.c.user_id == candidate.c.user_id)
+        .scalar_subquery()
+    )
+    next_id = (
+        select(candidate.c.id)
+        .where(candidate.c.state == "queued", running_total < JOB_CONCURRENCY, running_for_user < JOB_USER_CONCURRENCY)
+        .order_by(candidate.c.priority.desc(), candidate.c.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    statement = (
+        update(jobs_table)
+        .where(jobs_table.c.id == next_id)
+        .values(state="running", owner=OWNER, heartbeat=time.time(), started_at=func.coalesce(jobs_table.c.started_at, _now()))
+        .returning(
+            jobs_table.c.id, jobs_table.c.key, jobs_table.c.user_id, jobs_table.c.kind, jobs_table.c.payload,
+            jobs_table.c.done, jobs_table.c.result,
+        )
+    )
+    row = conn.execute(statement).mappings().first()
+    return dict(row) if row is not None else None
+
+
+def requeue_stale(conn, owner: Optional[str] = None) -> int:
+    """Put running jobs back in the queue: this owner's, or those whose owner stopped heartbeating."""
+    if owner is not None:
+        condition = jobs_table.c.owner == owner
+    else:
+        condition = jobs_table.c.heartbeat < time.time() - JOB_STALE_SECONDS
+    statement = (
+        update(jobs_table)
+        .where(jobs_table.c.state == "running", condition)
+        .values(
+            state="queued", owner=None,
+            # Batch results are not stored until the end, so a batch starts over
+            done=case((jobs_table.c.kind == "import", jobs_table.c.done), else_=0),
+        )
+    )
+    return conn.execute(statement).rowcount
+
+
+# ---------------------------------------------
+# Dispatcher
+# ---------------------------------------------
+
+class _Running:
+    __slots__ = ("id", "key", "user_id", "kind", "calculations", "done", "results", "imported", "errors", "future")
+
+    def __init__(self, claimed: dict):
+        self.id = claimed["id"]
+        self.key = claimed["key"]
+        self.user_id = claimed["user_id"]
+        self.kind = claimed["kind"]
+        self.calculations = json.loads(claimed["payload"])
+        self.done = claimed["done"]
+        self.results = []
+        # An import's progress so far, from before a restart
+        progress = json.loads(claimed["result"]) if self.kind == "import" and claimed["result"] else {}
+        self.imported = progress.get("imported", 0)
+        self.errors = progress.get("errors", [])
+        self.future = None
+
+    def next_chunk(self) -> list:
+        return self.calculations[self.done:self.done + JOB_CHUNK_SIZE]
+
+    def import_result(self) -> bytes:
+        return to_json({"imported": self.imported, "errors": self.errors})
+
+
+def _calculation_session(user_id: int):
+    return database.shard_session(user_id) if database.shard_engines else database.SessionLocal()
+
+
+def _import_rows(job: _Running, calculations: list, results: list) -> tuple:
+    """The chunk's rows to store, and an error for each row whose result does not fit."""
+    low, high = integer_bounds()
+    rows, errors = [], []
+    for index, ((a, b, kind), result) in enumerate(zip(calculations, results), start=job.done):
+        if low <= result <= high:
+            rows.append({"a": a, "b": b, "type": kind, "result": result, "user_id": job.user_id})
+        else:
+            errors.append({"index": index, "error": f"result {result} is outside {low} to {high}"})
+    return rows, errors
+
+
+def _store_calculations(job: _Running, rows: list) -> bool:
+    """Store a chunk of an import; False if it was already stored before a restart."""
+    db = _calculation_session(job.user_id)
+    try:
+        try:
+            db.execute(insert(ImportedChunk).values(job_key=job.key, start=job.done))
+        except IntegrityError:
+            db.rollback()
+            return False
+        if rows:
+            db.execute(insert(Calculation), rows)
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def _forget_chunks(job: _Running):
+    db = _calculation_session(job.user_id)
+    try:
+        db.execute(delete(ImportedChunk).where(ImportedChunk.job_key == job.key))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _finish(conn, job: _Running, state: str, result: bytes = None, error: str = None):
+    conn.execute(
+        update(jobs_table)
+        .where(jobs_table.c.id == job.id, jobs_table.c.state == "running", jobs_table.c.owner == OWNER)
+        .values(state=state, done=job.done, result=result, error=error, finished_at=_now())
+    )
+
+
+def _advance(pool, job: _Running) -> bool:
+    """Take in a finished chunk; submit the next one. False once the job is over."""
+    engine = get_engine()
+    try:
+        results = job.future.result()
+    except Exception as e:
+        with engine.begin() as conn:
+            _finish(conn, job, "failed", error=f"{type(e).__name__}: {e}")
+        return False
+    with engine.connect() as conn:
+        state = conn.execute(select(jobs_table.c.state, jobs_table.c.owner).where(jobs_table.c.id == job.id)).first()
+    if state is None or tuple(state) != ("running", OWNER):
+        # Cancelled (or requeued as stale and claimed elsewhere); drop the chunk
+        return False
+    try:
+        if job.kind == "import":
+            rows, errors = _import_rows(job, job.next_chunk(), results)
+            if not _store_calculations(job, rows):
+                logger.info(f"Job {job.id}: chunk at {job.done} was already stored")
+            job.imported += len(rows)
+            job.errors += errors
+        else:
+            job.results.extend(results)
+        job.done += len(results)
+        if job.done >= len(job.calculations):
+            result = job.import_result() if job.kind == "import" else to_json(job.results)
+            with engine.begin() as conn:
+                _finish(conn, job, "succeeded", result=result)
+            if job.kind == "import":
+                _forget_chunks(job)
+            return False
+    except Exception as e:
+        with engine.begin() as conn:
+            _finish(conn, job, "failed", error=f"{type(e).__name__}: {e}")
+        return False
+    progress = {"done": job.done}
+    if job.kind == "import":
+        progress["result"] = job.import_result()
+    with engine.begin() as conn:
+        conn.execute(update(jobs_table).where(jobs_table.c.id == job.id, jobs_table.c.owner == OWNER).values(**progress))
+    job.future = pool.submit(compute_chunk, job.next_chunk())
+    return True
+
+
+def _run_dispatcher():
+    engine = get_engine()
+    pool = None
+    running = {}
+    last_heartbeat = 0.0
+    try:
+        while not _stop.is_set():
+            now = time.time()
+            if now - last_heartbeat >= JOB_STALE_SECONDS / 3:
+                last_heartbeat = now
+                with engine.begin() as conn:
+                    conn.execute(update(jobs_table).where(jobs_table.c.owner == OWNER, jobs_table.c.state == "running").values(heartbeat=now))
+                    if requeue_stale(conn):
+                        _wake.set()
+
+            while len(running) < JOB_CONCURRENCY:
+                with engine.begin() as conn:
+                    claimed = claim_next(conn)
+                if claimed is None:
+                    break
+                if pool is None:
+                    # Spawned, not forked: a child forked from a process with
+                    # running threads can deadlock on a lock one of them held
+                    pool = ProcessPoolExecutor(JOB_CONCURRENCY, mp_context=multiprocessing.get_context("spawn"))
+                job = _Running(claimed)
+                job.future = pool.submit(compute_chunk, job.next_chunk())
+                running[job.id] = job
+                logger.info(f"Job {job.id} ({job.kind}, {len(job.calculations)} calculations) started")
+
+            if not running:
+                _wake.wait(JOB_POLL_SECONDS)
+                _wake.clear()
+                continue
+            wait([job.future for job in running.values()], timeout=JOB_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for job in [job for job in running.values() if job.future.done()]:
+                if not _advance(pool, job):
+                    del running[job.id]
+                    logger.info(f"Job {job.id} ended")
+    except Exception:
+        logger.exception("Job dispatcher failed")
+    finally:
+        with engine.begin() as conn:
+            requeue_stale(conn, owner=OWNER)
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def ensure_dispatcher():
+    """Start this process's dispatcher thread if it is not running."""
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None or not _dispatcher.is_alive():
+            _stop.clear()
+            _dispatcher = threading.Thread(target=_run_dispatcher, name="jobs", daemon=True)
+            _dispatcher.start()
+
+
+def resume():
+    """At startup: run the jobs left in an existing queue."""
+    if os.path.exists(JOB_DB_PATH):
+        ensure_dispatcher()
+
+
+def shutdown(timeout: float = 10.0):
+    """Stop the dispatcher; jobs it was running go back to the queue."""
+    global _dispatcher, _engine
+    dispatcher = _dispatcher
+    if dispatcher is not None:
+        _stop.set()
+        _wake.set()
+        dispatcher.join(timeout)
+    with _lock:
+        _dispatcher = None
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
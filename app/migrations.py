@@ -0,0 +1,523 @@
+# app/migrations.py
+
+"""
+Versioned schema migrations.
+
+Every migration has an increasing integer version. Applied versions are
+recorded in the `schema_version` table, so a worker starting up only needs one
+read of that small table (`ensure_schema`) to know the schema is current.
+
+Migrations are meant to run once per deployment, before the workers start:
+
+    python -m app.migrations upgrade
+    python -m app.migrations current
+
+Concurrent runs are serialized: with an advisory lock on PostgreSQL and with
+an exclusive file lock (flock) next to the database file on SQLite. A run that
+waited for the lock re-reads the version and only applies what is still
+pending. The file lock only covers processes on the same host; other
+databases must be migrated from one place, as the deployment step above does.
+`python -m app.server` runs the migrations once itself before it starts
+several workers, so they never race each other.
+
+Migrations that remove what older code still uses (contract steps, such as
+dropping a column) are held back by `upgrade` and only run with
+
+    python -m app.migrations contract
+
+once no worker of the previous release is left. Until then the expand step
+before them keeps old and new workers compatible. Later migrations still
+apply, since every applied version is recorded on its own, and the
+application only requires the migrations that are not contract steps. A
+database without the legacy columns a contract step removes (a new database,
+or one created from the current models) gets every migration at once, since
+no older workers can be using them. Databases created by the old create_all()
+startup have no recorded version but do have those columns, so they are
+treated like any other existing database.
+
+Calculation shards (CALCULATION_SHARD_URLS) have their own schema_version.
+They only run the migrations marked `shards=True`; every other version is
+recorded as applied without running anything.
+"""
+
+import argparse
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.schema import CreateTable
+
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+from app import database
+from app.database import Base
+
+logger = logging.getLogger(__name__)
+
+# Kept out of Base.metadata so dropping the application tables never loses
+# the migration history.
+version_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+# Workers apply pending migrations themselves unless this is switched off, which
+# production does after running `upgrade` once as a deployment step. The
+# multi-worker launcher (app.server) switches it off for its workers.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+
+# Arbitrary application-wide key for pg_advisory_lock
+ADVISORY_LOCK_KEY = 727_001
+
+# Rows converted per transaction by data migrations
+BACKFILL_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    # Called with the connection and the shard index (None on the primary)
+    upgrade: Callable[[Connection, Optional[int]], None]
+    # Non-transactional migrations run on an autocommit connection, which is
+    # required for CREATE INDEX CONCURRENTLY on PostgreSQL.
+    transactional: bool = True
+    # Whether the migration also applies to calculation shards
+    shards: bool = False
+    # Contract steps only run when asked for explicitly (see the module docstring)
+    contract: bool = False
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str, transactional: bool = True, shards: bool = False,
+              contract: bool = False):
+    def decorator(fn):
+        MIGRATIONS.append(Migration(version, description, fn, transactional, shards, contract))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return decorator
+
+
+def create_index_online(conn: Connection, name: str, table: str, columns: List[str]):
+    """
+    Create an index without blocking writes where the database supports it.
+
+    On PostgreSQL this uses CREATE INDEX CONCURRENTLY, which must run outside a
+    transaction. A previous interrupted concurrent build leaves an INVALID
+    index behind, so that is dropped and rebuilt first.
+    """
+    cols = ", ".join(columns)
+    if conn.dialect.name == "postgresql":
+        invalid = conn.execute(
+            text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ),
+            {"name": name},
+        ).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})"))
+    else:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})"))
+
+
+# ---------------------------------------------
+# Migrations
+# ---------------------------------------------
+
+def _create_shard_calculations(conn: Connection, shard: int):
+    """
+    Create the calculations table on a shard.
+
+    Users live on the primary, so the foreign key to users is left out. The
+    id sequence starts at the shard's own range (see SHARD_ID_STRIDE).
+    """
+    if inspect(conn).has_table("calculations"):
+        return
+    table = models.Calculation.__table__.to_metadata(MetaData())
+    table.dialect_options["sqlite"]["autoincrement"] = True
+    conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+    for index in table.indexes:
+        index.create(bind=conn, checkfirst=True)
+    start = (shard + 1) * database.SHARD_ID_STRIDE
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('calculations', :start)"), {"start": start})
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT setval(pg_get_serial_sequence('calculations', 'id'), :start)"), {"start": start})
+
+
+@migration(1, "Create users and calculations tables", shards=True)
+def _create_base_tables(conn: Connection, shard: Optional[int]):
+    if shard is not None:
+        _create_shard_calculations(conn, shard)
+    else:
+        Base.metadata.create_all(bind=conn, checkfirst=True)
+
+
+@migration(2, "Index calculations by (user_id, id)", transactional=False, shards=True)
+def _index_calculations_user_id(conn: Connection, shard: Optional[int]):
+    create_index_online(conn, "ix_calculations_user_id_id", "calculations", ["user_id", "id"])
+
+
+@migration(3, "Create revoked_tokens table")
+def _create_revoked_tokens(conn: Connection, shard: Optional[int]):
+    models.RevokedToken.__table__.create(bind=conn, checkfirst=True)
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+@migration(4, "Index calculations for filtered search", transactional=False, shards=True)
+def _index_calculation_filters(conn: Connection, shard: Optional[int]):
+    # Tables created from the current models have type_code instead (migration 5)
+    if _has_column(conn, "calculations", "type"):
+        create_index_online(conn, "ix_calculations_user_id_type_id", "calculations", ["user_id", "type", "id"])
+    create_index_online(conn, "ix_calculations_user_id_created_at", "calculations", ["user_id", "created_at"])
+
+
+def _type_code_case(column: str) -> str:
+    return f"CASE {column} " + " ".join(
+        f"WHEN '{name}' THEN {code}" for name, code in models.CALCULATION_TYPE_CODES.items()
+    ) + " END"
+
+
+def _type_name_case(column: str) -> str:
+    return f"CASE {column} " + " ".join(
+        f"WHEN {code} THEN '{name}'" for name, code in models.CALCULATION_TYPE_CODES.items()
+    ) + " END"
+
+
+def _backfill_type_codes(conn: Connection) -> int:
+    """
+    Fill calculations.type_code from the legacy type strings. The connection
+    autocommits, so every batch is its own short transaction and writers only
+    ever wait for a single batch.
+    """
+    converted = 0
+    while True:
+        count = conn.execute(
+            text(
+                f"UPDATE calculations SET type_code = {_type_code_case('type')} WHERE id IN "
+                "(SELECT id FROM calculations WHERE type_code IS NULL LIMIT :batch)"
+            ),
+            {"batch": BACKFILL_BATCH_SIZE},
+        ).rowcount
+        if not count:
+            return converted
+        converted += count
+        logger.info(f"Converted {converted} calculation types so far")
+
+
+def _relax_sqlite_not_null(conn: Connection, table: str, column: str):
+    """
+    Drop a NOT NULL constraint on SQLite without rebuilding the table.
+
+    SQLite cannot alter a column, but removing a NOT NULL constraint does not
+    change the stored rows, so the documented writable_schema procedure of
+    editing the CREATE TABLE statement in sqlite_master is enough.
+    """
+    sql = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"), {"table": table}
+    ).scalar()
+    relaxed = re.sub(rf'(\b{column}\b"?\s+VARCHAR(?:\(\d+\))?)\s+NOT NULL', r"\1", sql, count=1, flags=re.IGNORECASE)
+    if relaxed == sql:
+        return
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        schema_cookie = conn.exec_driver_sql("PRAGMA schema_version").scalar()
+        conn.exec_driver_sql("PRAGMA writable_schema = ON")
+        conn.execute(
+            text("UPDATE sqlite_master SET sql = :sql WHERE type = 'table' AND name = :table"),
+            {"sql": relaxed, "table": table},
+        )
+        # Makes every open connection reload the schema
+        conn.exec_driver_sql(f"PRAGMA schema_version = {schema_cookie + 1}")
+        conn.exec_driver_sql("PRAGMA writable_schema = OFF")
+        conn.exec_driver_sql("COMMIT")
+    except Exception:
+        conn.exec_driver_sql("ROLLBACK")
+        raise
+
+
+def _sync_legacy_type_column(conn: Connection):
+    """
+    Keep calculations.type and type_code in step while both exist.
+
+    Workers of the previous release only write `type`, new workers only
+    `type_code`; a trigger fills in the other column, so both can run against
+    the same table until migration 6 drops `type`.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION calculations_sync_type() RETURNS trigger AS $$ BEGIN "
+            "IF TG_OP = 'UPDATE' AND NEW.type_code IS DISTINCT FROM OLD.type_code THEN "
+            f"NEW.type := {_type_name_case('NEW.type_code')}; "
+            "ELSIF TG_OP = 'UPDATE' AND NEW.type IS DISTINCT FROM OLD.type THEN "
+            f"NEW.type_code := {_type_code_case('NEW.type')}; "
+            "ELSE "
+            f"NEW.type := COALESCE(NEW.type, {_type_name_case('NEW.type_code')}); "
+            f"NEW.type_code := COALESCE(NEW.type_code, {_type_code_case('NEW.type')}); "
+            "END IF; RETURN NEW; END $$ LANGUAGE plpgsql"
+        ))
+        conn.execute(text("DROP TRIGGER IF EXISTS calculations_sync_type ON calculations"))
+        conn.execute(text(
+            "CREATE TRIGGER calculations_sync_type BEFORE INSERT OR UPDATE ON calculations "
+            "FOR EACH ROW EXECUTE FUNCTION calculations_sync_type()"
+        ))
+    elif conn.dialect.name == "sqlite":
+        # SQLite triggers cannot change NEW, so the new workers' inserts need
+        # `type` to accept NULL until the AFTER trigger fills it in
+        _relax_sqlite_not_null(conn, "calculations", "type")
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS calculations_sync_type_insert AFTER INSERT ON calculations "
+            "WHEN NEW.type IS NULL OR NEW.type_code IS NULL BEGIN "
+            f"UPDATE calculations SET type = COALESCE(NEW.type, {_type_name_case('NEW.type_code')}), "
+            f"type_code = COALESCE(NEW.type_code, {_type_code_case('NEW.type')}) WHERE id = NEW.id; END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS calculations_sync_type_update AFTER UPDATE OF type, type_code ON calculations "
+            "WHEN NEW.type IS NOT OLD.type OR NEW.type_code IS NOT OLD.type_code BEGIN "
+            "UPDATE calculations SET "
+            f"type = CASE WHEN NEW.type_code IS NOT OLD.type_code THEN {_type_name_case('NEW.type_code')} ELSE NEW.type END, "
+            f"type_code = CASE WHEN NEW.type_code IS NOT OLD.type_code THEN NEW.type_code ELSE {_type_code_case('NEW.type')} END "
+            "WHERE id = NEW.id; END"
+        ))
+
+
+def _drop_legacy_type_sync(conn: Connection):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("DROP TRIGGER IF EXISTS calculations_sync_type ON calculations"))
+        conn.execute(text("DROP FUNCTION IF EXISTS calculations_sync_type()"))
+    else:
+        conn.execute(text("DROP TRIGGER IF EXISTS calculations_sync_type_insert"))
+        conn.execute(text("DROP TRIGGER IF EXISTS calculations_sync_type_update"))
+
+
+@migration(5, "Store calculation types as small integer codes", transactional=False, shards=True)
+def _add_calculation_type_codes(conn: Connection, shard: Optional[int]):
+    types = models.CalculationType.__table__
+    types.create(bind=conn, checkfirst=True)
+    existing = set(conn.execute(select(types.c.id)).scalars())
+    missing = [{"id": code, "name": name} for name, code in models.CALCULATION_TYPE_CODES.items() if code not in existing]
+    if missing:
+        conn.execute(types.insert(), missing)
+    if _has_column(conn, "calculations", "type"):
+        if not _has_column(conn, "calculations", "type_code"):
+            # Nullable with no default: a catalog-only change, no table rewrite.
+            # Shards have no foreign keys, since users live on the primary.
+            references = " REFERENCES calculation_types (id)" if shard is None else ""
+            conn.execute(text(f"ALTER TABLE calculations ADD COLUMN type_code SMALLINT{references}"))
+        # Before the backfill, so rows written meanwhile are converted too
+        _sync_legacy_type_column(conn)
+        _backfill_type_codes(conn)
+    create_index_online(conn, "ix_calculations_user_id_type_code_id", "calculations", ["user_id", "type_code", "id"])
+
+
+@migration(6, "Drop the legacy calculations.type column", transactional=False, shards=True, contract=True)
+def _drop_calculation_type_strings(conn: Connection, shard: Optional[int]):
+    if not _has_column(conn, "calculations", "type"):
+        return
+    _drop_legacy_type_sync(conn)
+    # Rows a migration 5 without the sync triggers left behind
+    _backfill_type_codes(conn)
+    if conn.dialect.name == "postgresql":
+        # SET NOT NULL would scan the table under an ACCESS EXCLUSIVE lock. A
+        # NOT VALID check is catalog-only, and validating it only takes a SHARE
+        # UPDATE EXCLUSIVE lock, which lets reads and writes continue.
+        exists = conn.execute(
+            text("SELECT 1 FROM pg_constraint WHERE conname = 'calculations_type_code_not_null'")
+        ).first()
+        if not exists:
+            conn.execute(text(
+                "ALTER TABLE calculations ADD CONSTRAINT calculations_type_code_not_null "
+                "CHECK (type_code IS NOT NULL) NOT VALID"
+            ))
+        conn.execute(text("ALTER TABLE calculations VALIDATE CONSTRAINT calculations_type_code_not_null"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_calculations_user_id_type_id"))
+    # PostgreSQL only marks the column dropped. SQLite rewrites the table and
+    # blocks writes meanwhile, so run `contract` there in a quiet period.
+    conn.execute(text("ALTER TABLE calculations DROP COLUMN type"))
+
+
+@migration(7, "Create imported_chunks table", shards=True)
+def _create_imported_chunks(conn: Connection, shard: Optional[int]):
+    models.ImportedChunk.__table__.create(bind=conn, checkfirst=True)
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+# The migrations this code needs; contract steps are optional
+REQUIRED_VERSIONS = frozenset(m.version for m in MIGRATIONS if not m.contract)
+
+
+# ---------------------------------------------
+# Runner
+# ---------------------------------------------
+
+def current_version(engine: Engine) -> Optional[int]:
+    """Return the applied schema version, or None if nothing has been applied."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                select(schema_version.c.version).order_by(schema_version.c.version.desc()).limit(1)
+            ).scalar()
+    except DBAPIError:
+        # The schema_version table does not exist yet
+        return None
+
+
+def applied_versions(engine: Engine) -> set:
+    """Every recorded schema version (empty if nothing has been applied)."""
+    try:
+        with engine.connect() as conn:
+            return set(conn.execute(select(schema_version.c.version)).scalars())
+    except DBAPIError:
+        return set()
+
+
+def _apply(engine: Engine, m: Migration, shard: Optional[int]):
+    if shard is None or m.shards:
+        if m.transactional:
+            with engine.begin() as conn:
+                m.upgrade(conn, shard)
+        else:
+            with engine.connect() as conn:
+                m.upgrade(conn.execution_options(isolation_level="AUTOCOMMIT"), shard)
+    try:
+        with engine.begin() as conn:
+            conn.execute(schema_version.insert().values(version=m.version, description=m.description))
+    except IntegrityError:
+        # Another process applied and recorded the same migration concurrently
+        logger.info(f"Migration {m.version} was recorded by another process")
+
+
+def _lock_path(engine: Engine) -> Optional[str]:
+    """The file that serializes migrations of a non-PostgreSQL database, if any."""
+    url = engine.url
+    if url.get_backend_name() == "sqlite":
+        if not url.database or url.database == ":memory:" or url.database.startswith("file::memory:"):
+            return None  # private to this process
+        return os.path.abspath(url.database) + ".migrate.lock"
+    key = hashlib.sha256(url.render_as_string(hide_password=True).encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"calculator-migrate-{key}.lock")
+
+
+@contextmanager
+def migration_lock(engine: Engine):
+    """Hold the lock that lets only one process migrate `engine` at a time."""
+    if engine.dialect.name == "postgresql":
+        conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        finally:
+            conn.close()
+        return
+    path = _lock_path(engine)
+    if path is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        # Released when the file is closed, also if the process dies
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _has_legacy_schema(engine: Engine) -> bool:
+    """Whether the database still has what a contract step would remove."""
+    with engine.connect() as conn:
+        return inspect(conn).has_table("calculations") and _has_column(conn, "calculations", "type")
+
+
+def migrate(engine: Engine, shard: Optional[int] = None, contract: bool = False) -> List[int]:
+    """
+    Apply pending migrations and return the versions that were applied.
+    Pass `shard` to migrate calculation shard number `shard` instead of the
+    primary database. Contract steps are skipped unless `contract` is set or
+    there is no legacy schema for older workers to depend on.
+    """
+    with migration_lock(engine):
+        version_metadata.create_all(bind=engine, checkfirst=True)
+        recorded = applied_versions(engine)
+        contract = contract or not _has_legacy_schema(engine)
+        applied = []
+        for m in MIGRATIONS:
+            if m.version in recorded:
+                continue
+            if m.contract and not contract:
+                logger.info(f"Holding back migration {m.version} (contract step): {m.description}")
+                continue
+            logger.info(f"Applying migration {m.version}: {m.description}" + (f" (shard {shard})" if shard is not None else ""))
+            _apply(engine, m, shard)
+            applied.append(m.version)
+        return applied
+
+
+def ensure_schema(engine: Engine, auto_migrate: bool = True, shard: Optional[int] = None) -> int:
+    """
+    Check the schema version at startup with a single read.
+
+    If the schema is behind, migrate when `auto_migrate` is set; otherwise fail
+    so a worker never serves against a schema it does not understand.
+    """
+    recorded = applied_versions(engine)
+    missing = sorted(REQUIRED_VERSIONS - recorded)
+    if not missing:
+        return max(recorded)
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Database schema is missing migrations {missing}. "
+            "Run `python -m app.migrations upgrade`."
+        )
+    migrate(engine, shard)
+    return current_version(engine)
+
+
+def ensure_all_schemas(auto_migrate: bool = True) -> int:
+    """ensure_schema for the primary database and every calculation shard."""
+    version = ensure_schema(database.engine, auto_migrate)
+    for index, shard_engine in enumerate(database.shard_engines):
+        ensure_schema(shard_engine, auto_migrate, shard=index)
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage database schema migrations.")
+    parser.add_argument("command", choices=["upgrade", "contract", "current"],
+                        help="upgrade: apply pending migrations except contract steps; "
+                             "contract: also apply contract steps; current: print the versions")
+    args = parser.parse_args(argv)
+
+    targets = [("primary", database.engine, None)]
+    targets += [(f"shard {i}", e, i) for i, e in enumerate(database.shard_engines)]
+    for name, engine, shard in targets:
+        if args.command in ("upgrade", "contract"):
+            applied = migrate(engine, shard, contract=args.command == "contract")
+            print(f"{name}: applied migrations {applied}" if applied else f"{name}: schema is up to date.")
+        pending = [m.version for m in MIGRATIONS if m.version not in applied_versions(engine)]
+        print(f"{name}: current version {current_version(engine)} (latest: {LATEST_VERSION})"
+              + (f", pending: {pending}" if pending else ""))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,8 +1,32 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, event, func, ForeignKey, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 
 from .database import Base
 
+# Operation types are stored as these codes; the calculation_types table
+# holds the same mapping for anyone reading the database directly.
+CALCULATION_TYPE_CODES = {"Add": 1, "Subtract": 2, "Multiply": 3, "Divide": 4}
+CALCULATION_TYPE_NAMES = {code: name for name, code in CALCULATION_TYPE_CODES.items()}
+
+
+class OperationType(TypeDecorator):
+    """An operation name in Python, its small integer code in the database."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return CALCULATION_TYPE_CODES[value]
+        except KeyError:
+            raise ValueError(f"Unknown operation type: {value}")
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else CALCULATION_TYPE_NAMES[value]
+
 
 class User(Base):
     __tablename__ = "users"
@@ -14,17 +38,54 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
 
+class CalculationType(Base):
+    __tablename__ = "calculation_types"
+
+    id = Column(SmallInteger, primary_key=True, autoincrement=False)
+    name = Column(String(16), unique=True, nullable=False)
+
+
+@event.listens_for(CalculationType.__table__, "after_create")
+def _seed_calculation_types(table, connection, **kw):
+    connection.execute(table.insert(), [{"id": code, "name": name} for name, code in CALCULATION_TYPE_CODES.items()])
+
+
 class Calculation(Base):
     __tablename__ = "calculations"
 
     id = Column(Integer, primary_key=True, index=True)
     a = Column(Integer, nullable=False)
     b = Column(Integer, nullable=False)
-    type = Column(String, nullable=False)
+    type = Column("type_code", OperationType(), ForeignKey("calculation_types.id"), nullable=False)
     result = Column(Integer, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     user = relationship("User", back_populates="calculations")
 
+    __table_args__ = (
+        Index("ix_calculations_user_id_id", "user_id", "id"),
+        # Filtered search: by type in id order, and by created_at window
+        Index("ix_calculations_user_id_type_code_id", "user_id", "type_code", "id"),
+        Index("ix_calculations_user_id_created_at", "user_id", "created_at"),
+    )
+
+
+class ImportedChunk(Base):
+    """A chunk of an import job, recorded in the same transaction as its calculations."""
+    __tablename__ = "imported_chunks"
+
+    job_key = Column(String(32), primary_key=True)
+    start = Column(Integer, primary_key=True, autoincrement=False)
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True)
+    jti = Column(String(64), unique=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 User.calculations = relationship("Calculation", order_by=Calculation.id, back_populates="user")
@@ -0,0 +1,155 @@
+# app/operation_cache.py
+
+"""
+HTTP caching for the GET variants of the arithmetic endpoints.
+
+`GET /add?a=2&b=3` (and /subtract, /multiply, /divide) always returns the
+same bytes for the same operands, so a 200 is sent with
+
+    Cache-Control: public, max-age=31536000, immutable
+    ETag: "<digest of the body>"
+
+and a matching If-None-Match gets a 304. Each operand pair has one canonical
+query string: `a` before `b`, shortest round-tripping number format, no
+other parameters. Any other spelling (`?b=3&a=2.0`) is permanently
+redirected to it, so browsers, proxies and CDNs store one entry per pair.
+
+`OperationCacheMiddleware` also keeps the formatted response bytes of the
+OPERATION_CACHE_SIZE (default 1024, 0 to disable) most recently used
+canonical URLs, in process or in shared memory (see app/cache.py). A hit
+is answered from the raw path and query string before routing, so it skips
+validation and serialization entirely.
+"""
+
+import hashlib
+import os
+from typing import Optional
+from urllib.parse import urlencode
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.cache import make_cache
+
+OPERATION_CACHE_SIZE = int(os.getenv("OPERATION_CACHE_SIZE", "1024"))
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+OPERATION_PATHS = frozenset(["/add", "/subtract", "/multiply", "/divide"])
+
+
+def canonical_number(value: float) -> str:
+    """Shortest text that parses back to exactly `value`: 10, 0.1, -0, 1e+16."""
+    text = repr(value)
+    return text[:-2] if text.endswith(".0") else text
+
+
+def canonical_query(a: float, b: float) -> str:
+    return urlencode({"a": canonical_number(a), "b": canonical_number(b)})
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class OperationCache:
+    """
+    Bounded LRU of formatted response bodies, keyed by raw path and query
+    string, in the CACHE_BACKEND backend (app/cache.py).
+    """
+
+    def __init__(self, maxsize: int, cache=None):
+        self._cache = cache if cache is not None else make_cache("operations", maxsize)
+
+    @property
+    def maxsize(self) -> int:
+        return self._cache.maxsize
+
+    @maxsize.setter
+    def maxsize(self, value: int):
+        self._cache.maxsize = value
+
+    @property
+    def hits(self) -> int:
+        return self._cache.stats()["hits"]
+
+    @property
+    def misses(self) -> int:
+        return self._cache.stats()["misses"]
+
+    def get(self, key: bytes) -> Optional[tuple]:
+        """(body, etag) for a cached URL."""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        etag, _, body = entry.partition(b" ")
+        return body, etag.decode()
+
+    def set(self, key: bytes, body: bytes, etag: str):
+        # One bytes value, which every backend stores as it is
+        self._cache.set(key, etag.encode() + b" " + body)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+operation_cache = OperationCache(OPERATION_CACHE_SIZE)
+
+
+def _cache_key(path: str, query: str) -> bytes:
+    return f"{path}?{query}".encode("latin-1")
+
+
+def cacheable_response(request: Request, body: bytes) -> Response:
+    """200 (or 304) for the canonical URL of an operation, remembered in the LRU."""
+    etag = etag_for(body)
+    operation_cache.set(_cache_key(request.url.path, request.url.query), body, etag)
+    headers = {"Cache-Control": CACHE_CONTROL, "ETag": etag}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+class OperationCacheMiddleware:
+    """Answers GET requests for cached operation URLs before routing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or scope["path"] not in OPERATION_PATHS
+            or operation_cache.maxsize <= 0
+        ):
+            return await self.app(scope, receive, send)
+        entry = operation_cache.get(scope["path"].encode("latin-1") + b"?" + scope["query_string"])
+        if entry is None:
+            return await self.app(scope, receive, send)
+
+        body, etag = entry
+        if_none_match = None
+        for key, value in scope["headers"]:
+            if key == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+                break
+        headers = [(b"cache-control", CACHE_CONTROL.encode()), (b"etag", etag.encode())]
+        if _etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
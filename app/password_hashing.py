@@ -0,0 +1,193 @@
+# app/password_hashing.py
+
+"""
+Password hashing scheme and cost.
+
+PASSWORD_SCHEME picks the scheme new hashes use: pbkdf2_sha256 (default),
+bcrypt or argon2. Its cost comes from:
+
+    PASSWORD_PBKDF2_ROUNDS       pbkdf2_sha256 iterations (default 29000)
+    PASSWORD_BCRYPT_ROUNDS       bcrypt log2 cost (default 12)
+    PASSWORD_ARGON2_TIME_COST    argon2 passes over memory (default 2)
+    PASSWORD_ARGON2_MEMORY_KIB   argon2 memory per hash in KiB (default 19456)
+    PASSWORD_ARGON2_PARALLELISM  argon2 lanes (default 1)
+
+Hashes made with another scheme or another cost still verify. The context
+reports them through `needs_update`, and a successful login stores a fresh
+hash in the background (see `security.rehash_password`). The cost can
+therefore change with a restart, without a migration: each user's hash is
+upgraded the next time they log in.
+
+The right cost depends on the hardware. The calibration command measures
+each scheme on this machine and prints the settings that keep one hash
+within the target time, measured while `--concurrency` hashes run at once
+(to match the logins a worker handles in parallel):
+
+    python -m app.password_hashing calibrate --target-ms 250 [--concurrency 4]
+
+bcrypt needs the `bcrypt` package and argon2 the `argon2-cffi` package.
+Schemes whose backend is missing are reported as unavailable.
+"""
+
+import argparse
+import math
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEMES = ("pbkdf2_sha256", "bcrypt", "argon2")
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "pbkdf2_sha256")
+
+# Setting name -> (environment variable, default), per scheme
+SETTING_ENV = {
+    "pbkdf2_sha256": {"rounds": ("PASSWORD_PBKDF2_ROUNDS", 29000)},
+    "bcrypt": {"rounds": ("PASSWORD_BCRYPT_ROUNDS", 12)},
+    "argon2": {
+        "time_cost": ("PASSWORD_ARGON2_TIME_COST", 2),
+        "memory_cost": ("PASSWORD_ARGON2_MEMORY_KIB", 19456),
+        "parallelism": ("PASSWORD_ARGON2_PARALLELISM", 1),
+    },
+}
+
+SETTINGS = {
+    scheme: {name: int(os.getenv(env, str(default))) for name, (env, default) in settings.items()}
+    for scheme, settings in SETTING_ENV.items()
+}
+
+if PASSWORD_SCHEME not in SCHEMES:
+    raise ValueError(f"PASSWORD_SCHEME must be one of {', '.join(SCHEMES)}, not {PASSWORD_SCHEME!r}")
+
+_CALIBRATION_PASSWORD = "calibration-password"
+
+
+def context_settings(scheme: str = None) -> dict:
+    """Keyword arguments for passlib's CryptContext."""
+    scheme = scheme or PASSWORD_SCHEME
+    settings = SETTINGS[scheme]
+    # The configured scheme first (it hashes); the others only verify
+    options = {"schemes": [scheme] + [s for s in SCHEMES if s != scheme], "deprecated": "auto"}
+    # Pinning min and max to the configured cost makes needs_update() flag
+    # hashes with any other cost, cheaper or dearer
+    rounds = settings["time_cost"] if scheme == "argon2" else settings["rounds"]
+    for option in ("rounds", "min_rounds", "max_rounds"):
+        options[f"{scheme}__{option}"] = rounds
+    if scheme == "argon2":
+        options["argon2__memory_cost"] = settings["memory_cost"]
+        options["argon2__parallelism"] = settings["parallelism"]
+    return options
+
+
+# ---------------------------------------------
+# Calibration
+# ---------------------------------------------
+
+def _handler(scheme: str, settings: dict):
+    from passlib.registry import get_crypt_handler
+
+    settings = dict(settings)
+    if scheme == "argon2":
+        settings["rounds"] = settings.pop("time_cost")
+    return get_crypt_handler(scheme).using(**settings)
+
+
+def time_hash(scheme: str, settings: dict, samples: int = 5, concurrency: int = 1) -> float:
+    """Median milliseconds per hash while `concurrency` threads hash at once."""
+    handler = _handler(scheme, settings)
+    handler.hash(_CALIBRATION_PASSWORD)  # loads the backend
+    timings = []
+    timings_lock = threading.Lock()
+
+    def worker():
+        for _ in range(samples):
+            began = time.perf_counter()
+            handler.hash(_CALIBRATION_PASSWORD)
+            elapsed = (time.perf_counter() - began) * 1000
+            with timings_lock:
+                timings.append(elapsed)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return statistics.median(timings)
+
+
+def calibrate_pbkdf2(target_ms: float, samples: int = 5, concurrency: int = 1) -> tuple:
+    # Time is linear in the iteration count: scale a measurement, then check it
+    rounds = 10000
+    for _ in range(2):
+        ms = time_hash("pbkdf2_sha256", {"rounds": rounds}, samples, concurrency)
+        rounds = max(1000, int(rounds * target_ms / ms) // 1000 * 1000)
+    settings = {"rounds": rounds}
+    return settings, time_hash("pbkdf2_sha256", settings, samples, concurrency)
+
+
+def calibrate_bcrypt(target_ms: float, samples: int = 5, concurrency: int = 1) -> tuple:
+    # Each step of the cost doubles the time; take the largest within the target
+    ms = time_hash("bcrypt", {"rounds": 8}, samples, concurrency)
+    rounds = min(31, max(4, 8 + math.floor(math.log2(target_ms / ms))))
+    ms = time_hash("bcrypt", {"rounds": rounds}, samples, concurrency)
+    while ms > target_ms and rounds > 4:
+        rounds -= 1
+        ms = time_hash("bcrypt", {"rounds": rounds}, samples, concurrency)
+    return {"rounds": rounds}, ms
+
+
+def calibrate_argon2(target_ms: float, samples: int = 5, concurrency: int = 1,
+                     memory_kib: int = None, parallelism: int = None) -> tuple:
+    # Keep the memory cost (the part that resists GPUs) unless one pass
+    # over it is already too slow, then add passes up to the target
+    settings = {
+        "time_cost": 1,
+        "memory_cost": memory_kib or SETTINGS["argon2"]["memory_cost"],
+        "parallelism": parallelism or SETTINGS["argon2"]["parallelism"],
+    }
+    ms = time_hash("argon2", settings, samples, concurrency)
+    while ms > target_ms and settings["memory_cost"] > 8 * settings["parallelism"] * 2:
+        settings["memory_cost"] //= 2
+        ms = time_hash("argon2", settings, samples, concurrency)
+    settings["time_cost"] = max(1, int(target_ms / ms))
+    ms = time_hash("argon2", settings, samples, concurrency)
+    while ms > target_ms and settings["time_cost"] > 1:
+        settings["time_cost"] -= 1
+        ms = time_hash("argon2", settings, samples, concurrency)
+    return settings, ms
+
+
+CALIBRATORS = {"pbkdf2_sha256": calibrate_pbkdf2, "bcrypt": calibrate_bcrypt, "argon2": calibrate_argon2}
+
+
+def env_lines(scheme: str, settings: dict) -> list:
+    lines = [f"PASSWORD_SCHEME={scheme}"]
+    for name, value in settings.items():
+        lines.append(f"{SETTING_ENV[scheme][name][0]}={value}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the password hashing cost on this machine.")
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("--target-ms", type=float, default=250.0, help="time one hash may take (default 250)")
+    parser.add_argument("--scheme", choices=SCHEMES, action="append", help="scheme to calibrate (repeatable; default all)")
+    parser.add_argument("--concurrency", type=int, default=1, help="hashes running at once while measuring (default 1)")
+    parser.add_argument("--samples", type=int, default=5, help="hashes timed per thread and setting (default 5)")
+    parser.add_argument("--argon2-memory-kib", type=int, default=None, help="argon2 memory to start from")
+    args = parser.parse_args(argv)
+
+    print(f"target {args.target_ms:g} ms per hash, {args.concurrency} at a time")
+    for scheme in args.scheme or SCHEMES:
+        kwargs = {"memory_kib": args.argon2_memory_kib} if scheme == "argon2" else {}
+        try:
+            settings, ms = CALIBRATORS[scheme](args.target_ms, args.samples, args.concurrency, **kwargs)
+        except Exception as e:  # a missing or broken backend
+            print(f"\n{scheme}: unavailable ({type(e).__name__}: {e})")
+            continue
+        current = " (current)" if scheme == PASSWORD_SCHEME else ""
+        print(f"\n{scheme}{current}: {ms:.1f} ms per hash")
+        for line in env_lines(scheme, settings):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+# app/profiling.py
+
+"""
+On-demand sampling profiler.
+
+While a profiled request is in flight, a background thread takes a stack
+sample of every thread each PROFILE_INTERVAL_MS (default 10). Samples are
+attributed to the route of the profiled request whose code was running. The
+middleware marks the request's frame, so requests that run at the same time
+but were not selected are left out. Threadpool threads are sampled only when
+they are running code from this project (sync dependencies such as get_db)
+and exactly one profile session has requests in flight,
+and go into a "threadpool" profile.
+
+A request is profiled when any of these apply:
+
+- a profiling window opened by an admin is active (all requests, or a
+  fraction of them)
+- PROFILE_SAMPLE_RATE (0.0-1.0, default 0) selects it at random
+- it carries `X-Profile: 1` and a valid `X-Admin-Token`
+
+Admin access needs ADMIN_TOKEN to be set (see app/security.py); without it
+the admin routes return 404 and the header is ignored. An admin opens a window with
+`POST /admin/profiler`, which writes PROFILE_CONTROL_FILE
+(profiles/control.json). Every worker process re-reads that file at most
+once a second, so a window reaches all uvicorn workers without a restart.
+
+Profiles are written under PROFILE_DIR (profiles/), one directory per
+window ("env" for PROFILE_SAMPLE_RATE, "requests" for the header), and one
+pair of files per route and worker process:
+
+    <route>.<pid>.collapsed   collapsed stacks, for flamegraph.pl or speedscope
+    <route>.<pid>.pstats      for `python -m pstats` or snakeviz; call counts
+                              are sample counts
+
+The files are rewritten with the running totals every PROFILE_FLUSH_SECONDS
+(30) and when the sampler stops, one second after the last profiled request.
+"""
+
+import json
+import logging
+import marshal
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from app import security
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_CONTROL_FILE = os.getenv("PROFILE_CONTROL_FILE", os.path.join(PROFILE_DIR, "control.json"))
+PROFILE_FLUSH_SECONDS = float(os.getenv("PROFILE_FLUSH_SECONDS", "30"))
+
+# Seconds the sampler keeps running after the last profiled request
+_LINGER_SECONDS = 1.0
+_CONTROL_CHECK_SECONDS = 1.0
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# Middleware frame of each profiled request in flight -> (scope, session)
+_profiled = {}
+# (session, route) -> Counter of stacks; a stack is a tuple of
+# (filename, first line, function name), outermost first
+_samples = {}
+_sampler: Optional[threading.Thread] = None
+
+_control = {"session": None, "until": 0.0, "fraction": 1.0}
+_control_mtime = None
+_control_checked = 0.0
+
+
+# ---------------------------------------------
+# Control file
+# ---------------------------------------------
+
+def _refresh_control(now: float):
+    global _control, _control_mtime, _control_checked
+    _control_checked = now
+    try:
+        mtime = os.stat(PROFILE_CONTROL_FILE).st_mtime
+    except OSError:
+        mtime = None
+    if mtime == _control_mtime:
+        return
+    _control_mtime = mtime
+    control = {"session": None, "until": 0.0, "fraction": 1.0}
+    if mtime is not None:
+        try:
+            with open(PROFILE_CONTROL_FILE) as f:
+                control.update(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable profiler control file {PROFILE_CONTROL_FILE}: {e}")
+    _control = control
+
+
+def active_window() -> Optional[dict]:
+    """The profiling window in the control file, if it is still open."""
+    now = time.time()
+    if now - _control_checked >= _CONTROL_CHECK_SECONDS:
+        _refresh_control(now)
+    if _control["session"] and _control["until"] > now:
+        return _control
+    return None
+
+
+def start_window(seconds: float, fraction: float = 1.0) -> dict:
+    """Open a profiling window for every worker that reads PROFILE_CONTROL_FILE."""
+    now = time.time()
+    control = {"session": time.strftime("%Y%m%d-%H%M%S", time.gmtime(now)), "until": now + seconds, "fraction": fraction}
+    _write_control(control)
+    return control
+
+
+def stop_window():
+    _write_control({"session": None, "until": 0.0, "fraction": 1.0})
+
+
+def _write_control(control: dict):
+    directory = os.path.dirname(PROFILE_CONTROL_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{PROFILE_CONTROL_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(control, f)
+    os.replace(tmp, PROFILE_CONTROL_FILE)
+    # This worker picks the change up at once; the others within a second
+    _refresh_control(time.time())
+
+
+# ---------------------------------------------
+# Sampling
+# ---------------------------------------------
+
+def _route_name(scope: dict) -> str:
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"
+
+
+def _stack(frame) -> tuple:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _take_sample():
+    workers = {t.ident for t in threading.enumerate() if t.name == "AnyIO worker thread"}
+    for ident, frame in sys._current_frames().items():
+        marked = None
+        in_project = False
+        f = frame
+        while f is not None:
+            marked = _profiled.get(f)
+            if marked is not None:
+                break
+            in_project = in_project or f.f_code.co_filename.startswith(_PROJECT_ROOT)
+            f = f.f_back
+        if marked is not None:
+            scope, session = marked
+            key = (session, _route_name(scope))
+        elif ident in workers and in_project:
+            sessions = {session for _, session in list(_profiled.values())}
+            if len(sessions) != 1:
+                continue
+            key = (sessions.pop(), "threadpool")
+        else:
+            continue
+        _samples.setdefault(key, Counter())[_stack(frame)] += 1
+
+
+def _run_sampler():
+    global _sampler
+    interval = PROFILE_INTERVAL_MS / 1000
+    idle_since = None
+    last_flush = time.monotonic()
+    while True:
+        time.sleep(interval)
+        now = time.monotonic()
+        with _lock:
+            if _profiled:
+                idle_since = None
+                _take_sample()
+            elif idle_since is None:
+                idle_since = now
+            elif now - idle_since >= _LINGER_SECONDS:
+                _sampler = None
+                break
+        if now - last_flush >= PROFILE_FLUSH_SECONDS:
+            flush()
+            last_flush = now
+    flush()
+
+
+def _ensure_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_run_sampler, name="profiler", daemon=True)
+            _sampler.start()
+
+
+def wait_for_sampler(timeout: float = 5.0):
+    """Block until the sampler has stopped and written its profiles."""
+    sampler = _sampler
+    if sampler is not None:
+        sampler.join(timeout)
+
+
+# ---------------------------------------------
+# Output
+# ---------------------------------------------
+
+def _slug(route: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+
+
+def _frame_label(filename: str, line: int, name: str) -> str:
+    if filename.startswith(_PROJECT_ROOT):
+        filename = os.path.relpath(filename, _PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{name} ({filename}:{line})"
+
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's collapsed-stack format: `outer;...;inner count` per line."""
+    lines = [";".join(_frame_label(*f) for f in stack) + f" {count}" for stack, count in stacks.items()]
+    return "\n".join(sorted(lines)) + "\n"
+
+
+def pstats_data(stacks: Counter, interval: float) -> dict:
+    """A marshal-able dict in the format `pstats.Stats` loads, from stack samples."""
+    stats = {}
+
+    def entry(func):
+        if func not in stats:
+            stats[func] = [0, 0, 0.0, 0.0, {}]
+        return stats[func]
+
+    for stack, count in stacks.items():
+        seconds = count * interval
+        for func in set(stack):
+            row = entry(func)
+            row[0] += count
+            row[1] += count
+            row[3] += seconds
+        entry(stack[-1])[2] += seconds
+        for caller, callee in set(zip(stack, stack[1:])):
+            cc, nc, tt, ct = entry(callee)[4].get(caller, (0, 0, 0.0, 0.0))
+            own = seconds if callee == stack[-1] else 0.0
+            entry(callee)[4][caller] = (cc + count, nc + count, tt + own, ct + seconds)
+    return {func: tuple(row) for func, row in stats.items()}
+
+
+def _write(path: str, data, binary: bool = False):
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb" if binary else "w") as f:
+        if binary:
+            marshal.dump(data, f)
+        else:
+            f.write(data)
+    os.replace(tmp, path)
+
+
+def flush() -> list:
+    """Write the running totals of every profile; returns the files written."""
+    with _lock:
+        snapshot = {key: Counter(stacks) for key, stacks in _samples.items()}
+    written = []
+    pid = os.getpid()
+    for (session, route), stacks in snapshot.items():
+        directory = os.path.join(PROFILE_DIR, session)
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{_slug(route)}.{pid}")
+        _write(f"{base}.collapsed", collapsed(stacks))
+        _write(f"{base}.pstats", pstats_data(stacks, PROFILE_INTERVAL_MS / 1000), binary=True)
+        written += [f"{base}.collapsed", f"{base}.pstats"]
+    return written
+
+
+def reset():
+    """Drop the collected samples."""
+    with _lock:
+        _samples.clear()
+
+
+def status() -> dict:
+    window = active_window()
+    with _lock:
+        routes = {f"{session}/{route}": sum(stacks.values()) for (session, route), stacks in _samples.items()}
+    return {
+        "window": window,
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "interval_ms": PROFILE_INTERVAL_MS,
+        "in_flight": len(_profiled),
+        "samples": routes,
+    }
+
+
+# ---------------------------------------------
+# ASGI middleware
+# ---------------------------------------------
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _select(scope) -> Optional[str]:
+    """The profile session a request belongs to, or None if it is not profiled."""
+    window = active_window()
+    if window is not None and random.random() < window["fraction"]:
+        return window["session"]
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "env"
+    if _header(scope, b"x-profile") == "1" and security.is_admin_token(_header(scope, b"x-admin-token")):
+        return "requests"
+    return None
+
+
+class ProfilerMiddleware:
+    """Marks selected HTTP requests for the sampling profiler."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        session = _select(scope)
+        if session is None:
+            return await self.app(scope, receive, send)
+
+        frame = sys._getframe()
+        with _lock:
+            _profiled[frame] = (scope, session)
+        _ensure_sampler()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            with _lock:
+                del _profiled[frame]
@@ -0,0 +1,139 @@
+# app/query_stats.py
+
+"""
+Per-request SQL accounting.
+
+`QueryStatsMiddleware` counts the statements each request runs and the time
+spent in them, through SQLAlchemy's before/after_cursor_execute events. The
+totals go out as a `Server-Timing` header, which browser dev tools show
+next to the request:
+
+    Server-Timing: db;dur=3.12;desc="4 queries"
+
+Two more checks run in the same listeners:
+
+- N+1 detection: a request that runs the same statement text
+  N_PLUS_ONE_THRESHOLD (default 5) or more times is logged as a warning,
+  with the statement and the route.
+- Slow-query log: statements taking at least SLOW_QUERY_MS (default 100)
+  are logged with their duration, their text and the shape of their bound
+  parameters (names and types, never values), inside requests or not. Set
+  SLOW_QUERY_LOG to a file path to write them to a rotating file of their
+  own instead of the application log.
+
+QUERY_STATS=0 turns off the per-request accounting. The slow-query log
+still runs.
+"""
+
+import logging
+import logging.handlers
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_STATS = os.getenv("QUERY_STATS", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+if SLOW_QUERY_LOG:
+    _handler = logging.handlers.RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=10 * 1024 * 1024, backupCount=5)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_logger.addHandler(_handler)
+    slow_query_logger.propagate = False
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def repeated(self, threshold: int = None) -> list:
+        """[(statement, times)] for statements run at least `threshold` times."""
+        threshold = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return [(statement, times) for statement, times in self.statements.most_common() if times >= threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.2f};desc="{self.count} queries"'
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _request_stats.get()
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Names and type names of bound parameters, without their values."""
+    if executemany and parameters:
+        return {"rows": len(parameters), "each": parameter_shape(parameters[0])}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        stats.statements[statement] += 1
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_query_logger.warning(
+            f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(statement.split())} "
+            f"parameters={parameter_shape(parameters, executemany)}"
+        )
+
+
+class QueryStatsMiddleware:
+    """Counts each HTTP request's SQL statements and reports them in a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_STATS:
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _request_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or scope["path"]
+            for statement, times in stats.repeated():
+                logger.warning(
+                    f"Possible N+1 query in {scope['method']} {path}: statement ran {times} times: "
+                    f"{' '.join(statement.split())}"
+                )
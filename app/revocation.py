@@ -0,0 +1,138 @@
+# app/revocation.py
+
+"""
+In-memory token revocation list.
+
+Every token carries a unique `jti` claim. Revoking a token writes its jti to
+the `revoked_tokens` table and adds it to this worker's in-memory set at once.
+Other workers pick it up from a background sync that reads the rows revoked
+since the last sync. Row ids and `revoked_at` stamps can commit out of order
+(on PostgreSQL, `now()` is the transaction's start), so each sync re-reads
+the last REVOCATION_SYNC_OVERLAP_SECONDS (default 60) before the newest row
+it has seen.
+
+`is_revoked` is a plain set lookup, so checking revocation never touches the
+database on the request path. An entry is dropped once its token has expired,
+because an expired token is rejected anyway. That keeps the set small.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# How often each worker pulls revocations made by other workers
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+# How often expired rows are deleted from the revoked_tokens table
+REVOCATION_PURGE_SECONDS = 3600
+# How far back each sync re-reads, for revocations that committed late
+REVOCATION_SYNC_OVERLAP_SECONDS = float(os.getenv("REVOCATION_SYNC_OVERLAP_SECONDS", "60"))
+
+
+class RevocationList:
+    def __init__(self):
+        self._expires: Dict[str, float] = {}
+        # Newest revoked_at seen, as the database returned it
+        self._synced_until = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        return jti is not None and jti in self._expires
+
+    def add(self, jti: str, expires_at: float):
+        with self._lock:
+            self._expires[jti] = expires_at
+
+    def revoke(self, db: Session, jti: str, expires_at: float) -> bool:
+        """
+        Persist a revocation and apply it to this worker immediately. Returns
+        False if the token had already been revoked, possibly by another
+        worker whose revocation this one has not synced yet.
+        """
+        self.add(jti, expires_at)
+        db.add(RevokedToken(jti=jti, expires_at=datetime.fromtimestamp(expires_at, tz=timezone.utc)))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+
+    def prune(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for jti in [jti for jti, exp in self._expires.items() if exp <= now]:
+                del self._expires[jti]
+
+    def sync(self, db: Session) -> int:
+        """Load revocations recorded since the last sync; returns how many were new."""
+        query = select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at)
+        if self._synced_until is not None:
+            since = self._synced_until - timedelta(seconds=REVOCATION_SYNC_OVERLAP_SECONDS)
+            query = query.where(RevokedToken.revoked_at >= since)
+        new = 0
+        for jti, expires_at, revoked_at in db.execute(query).all():
+            if self._synced_until is None or revoked_at > self._synced_until:
+                self._synced_until = revoked_at
+            if jti in self._expires:
+                continue
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            self.add(jti, expires_at.timestamp())
+            new += 1
+        self.prune()
+        return new
+
+    def clear(self):
+        with self._lock:
+            self._expires.clear()
+            self._synced_until = None
+
+    def __len__(self):
+        return len(self._expires)
+
+
+revocation_list = RevocationList()
+
+
+def purge_expired(db: Session) -> int:
+    """Delete revocations whose tokens have expired anyway."""
+    result = db.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.now(timezone.utc)))
+    db.commit()
+    return result.rowcount
+
+
+async def run_sync(session_factory, interval: float = REVOCATION_SYNC_SECONDS):
+    """Background task: keep this worker's revocation list in step with the table."""
+    from starlette.concurrency import run_in_threadpool
+
+    last_purge = time.monotonic()
+
+    def sync_once():
+        nonlocal last_purge
+        db = session_factory()
+        try:
+            if time.monotonic() - last_purge >= REVOCATION_PURGE_SECONDS:
+                purge_expired(db)
+                last_purge = time.monotonic()
+            return revocation_list.sync(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            await run_in_threadpool(sync_once)
+        except Exception:
+            logger.exception("Revocation list sync failed")
+        await asyncio.sleep(interval)
@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Literal, Optional
 
-from pydantic import BaseModel, EmailStr, field_validator, model_validator
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+
+from app.models import CALCULATION_TYPE_CODES
 
 
 class UserBase(BaseModel):
@@ -29,12 +31,28 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+
+class UserLookup(BaseModel):
+    ids: list[int]
 
 
 class TokenData(BaseModel):
     username: Optional[str] = None
 
 
+CALCULATION_TYPES = list(CALCULATION_TYPE_CODES)
+
+
 class CalculationBase(BaseModel):
     a: int
     b: int
@@ -44,7 +62,7 @@ class CalculationBase(BaseModel):
 class CalculationCreate(CalculationBase):
     @field_validator('type')
     def validate_type(cls, v):
-        if v not in ['Add', 'Subtract', 'Multiply', 'Divide']:
+        if v not in CALCULATION_TYPES:
             raise ValueError('Invalid operation type')
         return v
 
@@ -73,3 +91,50 @@ class UserUpdate(BaseModel):
 class PasswordChange(BaseModel):
     current_password: str
     new_password: str
+
+
+class CalculationFilters(BaseModel):
+    type: Optional[str] = None
+    min_result: Optional[int] = None
+    max_result: Optional[int] = None
+    # created_at window: since <= created_at < until
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    @field_validator('type')
+    def validate_type(cls, v):
+        if v is not None and v not in CALCULATION_TYPES:
+            raise ValueError('Invalid operation type')
+        return v
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in self.model_dump().values())
+
+
+class ProfilerWindow(BaseModel):
+    # How long the window stays open, and the fraction of requests profiled in it
+    seconds: float = Field(60, gt=0, le=3600)
+    fraction: float = Field(1.0, gt=0, le=1)
+
+
+class JobCreate(BaseModel):
+    # "batch" computes the results; "import" also stores the calculations
+    kind: Literal["batch", "import"]
+    calculations: list[CalculationCreate]
+    # Higher runs first
+    priority: int = Field(5, ge=0, le=9)
+
+
+class JobRead(BaseModel):
+    id: int
+    kind: str
+    state: str
+    priority: int
+    total: int
+    done: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # Batch: the results in order; import: {"imported": n, "errors": [{"index": i, "error": ...}]}
+    result: Optional[Any] = None
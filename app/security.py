@@ -1,57 +1,241 @@
+import hashlib
+import hmac
+import os
+import time
+import uuid
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from jose import jwt
-from passlib.context import CryptContext
+
+from app.cache import make_cache
+from app.tracing import span
 
 # Configuration
 SECRET_KEY = "your-secret-key-keep-it-secret" # In production, use env var
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Access tokens are short-lived; clients renew them with a refresh token
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Maximum number of verified tokens kept in memory; 0 disables the cache
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Token for the admin routes (X-Admin-Token header); unset, they return 404
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+# python-jose and passlib pull in the cryptography backends, which is a large
+# share of the cost of importing the app. They are only imported the first time
+# a password is hashed or a token is encoded/decoded.
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    from app.password_hashing import context_settings
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+    return CryptContext(**context_settings())
+
+
+def __getattr__(name):
+    # Keep `from app.security import pwd_context` working without loading passlib
+    # at import time.
+    if name == "pwd_context":
+        return get_pwd_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    with span("security.hash_password"):
+        return get_pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("security.verify_password"):
+        return get_pwd_context().verify(plain_password, hashed_password)
+
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True if the hash uses another scheme or cost than the configured one."""
+    return get_pwd_context().needs_update(hashed_password)
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = "access"):
+    from jose import jwt
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # jti gives every token an identity so it can be revoked individually
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "type": token_type})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-from fastapi import Depends, HTTPException, status
+def create_refresh_token(data: dict):
+    return create_access_token(data, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), token_type="refresh")
+
+
+class TokenCache:
+    """
+    Bounded cache of verified token claims, in the CACHE_BACKEND backend
+    (app/cache.py). With the shared backend, a token verified by one worker
+    is a hit in all of them.
+
+    Entries are keyed by a SHA-256 digest of the signing key and the raw
+    token, so the tokens themselves are not kept in memory and entries made
+    under another SECRET_KEY never match. Each entry expires at the token's
+    `exp` claim. A hit means these exact bytes already passed signature
+    verification.
+    """
+
+    def __init__(self, maxsize: int, cache=None):
+        self._cache = cache if cache is not None else make_cache("tokens", maxsize)
+
+    @property
+    def maxsize(self) -> int:
+        return self._cache.maxsize
+
+    @maxsize.setter
+    def maxsize(self, value: int):
+        self._cache.maxsize = value
+
+    @property
+    def hits(self) -> int:
+        return self._cache.stats()["hits"]
+
+    @property
+    def misses(self) -> int:
+        return self._cache.stats()["misses"]
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(f"{SECRET_KEY}.{token}".encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        return self._cache.get(self._key(token))
+
+    def set(self, token: str, claims: dict):
+        expires_at = claims.get("exp")
+        if expires_at is None:
+            return
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            self._cache.set(self._key(token), claims, ttl=ttl)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+
+def decode_token(token: str, token_type: str = "access") -> dict:
+    """
+    Verify a token and return its claims, skipping verification for tokens
+    that are already in the cache. Raises jose.JWTError if the token is
+    invalid, revoked or of the wrong type.
+    """
+    from jose import JWTError
+
+    with span("security.decode_token", **{"token.type": token_type}) as decode_span:
+        claims = token_cache.get(token)
+        if decode_span is not None:
+            decode_span.attributes["cache.hit"] = claims is not None
+        if claims is None:
+            from jose import jwt
+
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            token_cache.set(token, claims)
+    # Tokens issued before token types existed are access tokens
+    if claims.get("type", "access") != token_type:
+        raise JWTError("Wrong token type")
+    if revocation_list.is_revoked(claims.get("jti")):
+        raise JWTError("Token has been revoked")
+    return claims
+
+
+def decode_access_token(token: str) -> dict:
+    return decode_token(token, "access")
+
+
+def decode_refresh_token(token: str) -> dict:
+    return decode_token(token, "refresh")
+
+
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app import database
+from app.database import get_db, get_read_db
 from app.models import User
+from app.revocation import revocation_list
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def authenticate(token: str, db: Session, primary: Optional[Session] = None) -> User:
+    from jose import JWTError
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except jwt.JWTError:
+    except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    with span("auth.load_user"):
+        user = db.query(User).filter(User.id == int(user_id)).first()
+        if user is None and primary is not None and primary is not db:
+            # A user who registered moments ago may not have reached the replica yet
+            user = primary.query(User).filter(User.id == int(user_id)).first()
     if user is None:
         raise credentials_exception
     return user
+
+
+def rehash_password(user_id: int, old_hash: str, password: str):
+    """
+    Store `password` hashed with the current settings. Runs as a background
+    task after a login whose hash needs_update(); the hash is only replaced if
+    it is still the one the login verified, so a password change made in the
+    meantime wins.
+    """
+    new_hash = hash_password(password)
+    db = database.SessionLocal()
+    try:
+        db.execute(update(User).where(User.id == user_id, User.password_hash == old_hash).values(password_hash=new_hash))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db), primary: Session = Depends(get_db)):
+    return authenticate(token, db, primary)
+
+
+async def get_current_user_for_update(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Like get_current_user, but loads the user from the primary so it can be modified."""
+    return authenticate(token, db)
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Whether `token` is ADMIN_TOKEN; always False while no ADMIN_TOKEN is set."""
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN))
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency for the admin routes."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,188 @@
+# app/server.py
+
+"""
+Production launcher.
+
+    python -m app.server [--workers N] [--port 8000] [--print-config]
+
+Runs main:app under uvicorn with settings for production. Every setting can
+also be given as an environment variable:
+
+    HOST / PORT                 bind address (0.0.0.0:8000)
+    WEB_CONCURRENCY             worker processes (default: usable CPUs)
+    SERVER_LOOP                 auto | uvloop | asyncio
+    SERVER_HTTP                 auto | httptools | h11
+    KEEPALIVE_TIMEOUT           seconds an idle keep-alive connection stays open (5)
+    BACKLOG                     listen() backlog (2048)
+    LIMIT_CONCURRENCY           connections + tasks per worker before 503s (unlimited)
+    LIMIT_MAX_REQUESTS          recycle a worker after this many requests (never)
+    GRACEFUL_TIMEOUT            seconds a stopping worker gets to finish requests (30)
+    ROLLING_RESTART_WARMUP      seconds a new worker gets to start before the
+                                old one is stopped (5)
+
+With `auto`, uvloop and httptools are used when they are installed.
+
+With several workers and MIGRATE_ON_STARTUP left on, pending migrations are
+applied once by the supervisor before the workers start, and the workers only
+check the schema version.
+
+Worker processes share the listening socket. The supervisor restarts workers
+that die or are recycled. Signals:
+
+    SIGHUP              rolling restart: one worker at a time, a new worker is
+                        started before the old one is stopped, so there is
+                        always a full set of workers accepting connections
+    SIGTTIN / SIGTTOU   add / remove a worker
+    SIGTERM / SIGINT    graceful shutdown
+"""
+
+import argparse
+import importlib.util
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+APP = "main:app"
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: its affinity mask, capped by a cgroup v2 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def choose_loop(setting: str = "auto") -> str:
+    if setting == "auto":
+        return "uvloop" if _installed("uvloop") else "asyncio"
+    return setting
+
+
+def choose_http(setting: str = "auto") -> str:
+    if setting == "auto":
+        return "httptools" if _installed("httptools") else "h11"
+    return setting
+
+
+def _optional_int(value):
+    return int(value) if value not in (None, "") else None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Run the calculator API in production.")
+    parser.add_argument("--host", default=env("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(env("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=_optional_int(env("WEB_CONCURRENCY")))
+    parser.add_argument("--loop", choices=["auto", "uvloop", "asyncio"], default=env("SERVER_LOOP", "auto"))
+    parser.add_argument("--http", choices=["auto", "httptools", "h11"], default=env("SERVER_HTTP", "auto"))
+    parser.add_argument("--keepalive-timeout", type=int, default=int(env("KEEPALIVE_TIMEOUT", "5")))
+    parser.add_argument("--backlog", type=int, default=int(env("BACKLOG", "2048")))
+    parser.add_argument("--limit-concurrency", type=int, default=_optional_int(env("LIMIT_CONCURRENCY")))
+    parser.add_argument("--limit-max-requests", type=int, default=_optional_int(env("LIMIT_MAX_REQUESTS")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(env("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--rolling-restart-warmup", type=float, default=float(env("ROLLING_RESTART_WARMUP", "5")))
+    parser.add_argument("--print-config", action="store_true", help="print the resolved settings and exit")
+    return parser
+
+
+def server_config(args: argparse.Namespace) -> dict:
+    """uvicorn.Config keyword arguments for parsed launcher arguments."""
+    return {
+        "host": args.host,
+        "port": args.port,
+        "workers": args.workers or available_cpus(),
+        "loop": choose_loop(args.loop),
+        "http": choose_http(args.http),
+        "timeout_keep_alive": args.keepalive_timeout,
+        "backlog": args.backlog,
+        "limit_concurrency": args.limit_concurrency,
+        "limit_max_requests": args.limit_max_requests,
+        "timeout_graceful_shutdown": args.graceful_timeout,
+        "proxy_headers": True,
+        "server_header": False,
+        "access_log": False,
+    }
+
+
+def _supervisor_class():
+    from uvicorn.supervisors import Multiprocess
+    from uvicorn.supervisors.multiprocess import Process
+
+    class RollingMultiprocess(Multiprocess):
+        """uvicorn's supervisor, with SIGHUP restarting workers one by one, new before old."""
+
+        warmup = 5.0
+
+        def restart_all(self) -> None:
+            for idx, old in enumerate(list(self.processes)):
+                new = Process(self.config, self.target, self.sockets)
+                new.start()
+                deadline = time.monotonic() + self.warmup
+                while time.monotonic() < deadline and not self.should_exit.is_set():
+                    time.sleep(0.1)
+                if not new.is_alive():
+                    logger.error(f"New worker [{new.pid}] failed to start; keeping worker [{old.pid}]")
+                    new.kill()
+                    new.join()
+                    continue
+                self.processes[idx] = new
+                # The old worker stops accepting, then finishes in-flight requests
+                old.terminate()
+                old.join()
+                logger.info(f"Replaced worker [{old.pid}] with [{new.pid}]")
+
+    return RollingMultiprocess
+
+
+def run(argv=None):
+    import uvicorn
+
+    args = build_parser().parse_args(argv)
+    settings = server_config(args)
+    if args.print_config:
+        for key, value in settings.items():
+            print(f"{key}={value}")
+        return
+
+    config = uvicorn.Config(APP, **settings)
+    server = uvicorn.Server(config)
+    logger.info(
+        f"Starting {settings['workers']} worker(s) on {settings['host']}:{settings['port']} "
+        f"(loop={settings['loop']}, http={settings['http']})"
+    )
+    if config.workers > 1:
+        if os.getenv("MIGRATE_ON_STARTUP", "1") == "1":
+            # Migrate once here instead of racing in every worker; the workers
+            # inherit the environment and only check the version
+            from app.migrations import ensure_all_schemas
+
+            ensure_all_schemas()
+            os.environ["MIGRATE_ON_STARTUP"] = "0"
+        sock = config.bind_socket()
+        supervisor = _supervisor_class()(config, target=server.run, sockets=[sock])
+        supervisor.warmup = args.rolling_restart_warmup
+        supervisor.run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
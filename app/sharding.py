@@ -0,0 +1,150 @@
+# app/sharding.py
+
+"""
+Shard-aware session dependencies and the shard rebalancing tool.
+
+With CALCULATION_SHARD_URLS set, every user's calculations live on one shard,
+chosen by `app.database.shard_for_user`. Writes for different users on
+different shards no longer share a write lock. The calculation routes get
+their session from `get_calc_db` (or `get_calc_read_db` for reads), which
+returns the user's shard session, or the ordinary primary/replica session
+when sharding is off.
+
+Changing the number of shards changes where users hash to. Move their rows
+with:
+
+    python -m app.sharding rebalance --from URL1,URL2 --to URL1,URL2,URL3
+
+Use the primary DATABASE_URL as the only --from URL when sharding an
+existing deployment. Rows keep their ids, and moving them is idempotent, so
+an interrupted rebalance can be run again. Run it while the app is stopped or
+read-only, then restart with the new CALCULATION_SHARD_URLS.
+"""
+
+import argparse
+import logging
+
+from fastapi import Depends
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import database
+from app.database import get_db, get_read_db, shard_for_user
+from app.models import Calculation, User
+from app.security import get_current_user
+
+logger = logging.getLogger(__name__)
+
+
+def get_calc_db(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Session holding the current user's calculations, for writes."""
+    if not database.shard_engines:
+        yield db
+        return
+    shard_db = database.shard_session(current_user.id)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+def get_calc_read_db(db: Session = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    """Session holding the current user's calculations, for reads."""
+    if not database.shard_engines:
+        yield db
+        return
+    shard_db = database.shard_session(current_user.id)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+# ---------------------------------------------
+# Rebalancing
+# ---------------------------------------------
+
+def _move_user(user_id: int, source: Engine, target: Engine, batch_size: int) -> int:
+    table = Calculation.__table__
+    moved = 0
+    while True:
+        with source.connect() as src:
+            rows = src.execute(
+                select(table).where(table.c.user_id == user_id).order_by(table.c.id).limit(batch_size)
+            ).mappings().all()
+        if not rows:
+            return moved
+        ids = [row["id"] for row in rows]
+        with target.begin() as dst:
+            # Skip rows copied by an earlier, interrupted run
+            existing = set(dst.execute(select(table.c.id).where(table.c.id.in_(ids))).scalars())
+            new_rows = [dict(row) for row in rows if row["id"] not in existing]
+            if new_rows:
+                dst.execute(insert(table), new_rows)
+        with source.begin() as src:
+            src.execute(delete(table).where(table.c.id.in_(ids)))
+        moved += len(rows)
+
+
+def rebalance(from_urls, to_urls, batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """
+    Move every user's calculations to the shard they hash to among `to_urls`.
+    Returns {(source index, target index): rows moved}.
+    """
+    from app.migrations import migrate
+
+    source_engines = {url: database.make_engine(url) for url in from_urls}
+    target_engines = [source_engines.get(url) or database.make_engine(url) for url in to_urls]
+    if not dry_run:
+        for index, target in enumerate(target_engines):
+            migrate(target, shard=index)
+
+    moves = {}
+    table = Calculation.__table__
+    for source_index, url in enumerate(from_urls):
+        source = source_engines[url]
+        with source.connect() as conn:
+            user_ids = conn.execute(select(table.c.user_id).distinct()).scalars().all()
+        for user_id in user_ids:
+            target_index = shard_for_user(user_id, len(to_urls))
+            if to_urls[target_index] == url:
+                continue
+            if dry_run:
+                with source.connect() as conn:
+                    count = len(conn.execute(select(table.c.id).where(table.c.user_id == user_id)).all())
+            else:
+                count = _move_user(user_id, source, target_engines[target_index], batch_size)
+            key = (source_index, target_index)
+            moves[key] = moves.get(key, 0) + count
+            logger.info(f"User {user_id}: {count} rows from source {source_index} to shard {target_index}")
+
+    for e in {id(e): e for e in list(source_engines.values()) + target_engines}.values():
+        e.dispose()
+    return moves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebalance calculation shards.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebalance", help="move calculations to the shards their users hash to")
+    rb.add_argument("--from", dest="from_urls", required=True, help="comma-separated current shard URLs")
+    rb.add_argument("--to", dest="to_urls", required=True, help="comma-separated new shard URLs")
+    rb.add_argument("--batch-size", type=int, default=1000)
+    rb.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    moves = rebalance(
+        [u.strip() for u in args.from_urls.split(",") if u.strip()],
+        [u.strip() for u in args.to_urls.split(",") if u.strip()],
+        args.batch_size,
+        args.dry_run,
+    )
+    for (source, target), count in sorted(moves.items()):
+        print(f"source {source} -> shard {target}: {count} rows{' (dry run)' if args.dry_run else ''}")
+    print(f"Total: {sum(moves.values())} rows")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,126 @@
+# app/singleflight.py
+
+"""
+Request coalescing ("singleflight") for hot reads.
+
+When several requests need the same read at the same moment, the first one
+(the leader) runs the query in the threadpool. The others wait for the
+leader's result instead of running the same query again. Used for:
+
+    user_flights         GET /users/{user_id}
+    calculation_flights  the first page of GET /calculations (no filters)
+
+Keys are tuples starting with the user id, followed by whatever else makes
+the result differ (page size, the engine read from). Writes call
+`forget(user_id)` just before they commit. There is no await in between, so
+reads that start after the write never join a query that started before it.
+
+A follower waits at most the group's timeout, counted from the start of the
+leader's query (SINGLEFLIGHT_USER_TIMEOUT / SINGLEFLIGHT_CALCULATIONS_TIMEOUT,
+default 2 seconds). Past that, it runs its own query, and requests arriving
+later start a new flight. A slow or stuck leader then delays others only up
+to the timeout. If the leader fails, its followers get the same error. If the
+leader is cancelled (client went away), they run their own query.
+
+Flights are kept per event loop. A flight's future belongs to the leader's
+loop, so requests served by another loop (another thread, or the TestClient's
+portal) never join it and run their own query.
+
+`stats()` counts, per group, the queries run, the queries saved by sharing
+and the timeouts; GET /admin/coalescing returns them. SINGLEFLIGHT=0 turns
+coalescing off.
+"""
+
+import asyncio
+import os
+import weakref
+from typing import Awaitable, Callable, Hashable
+
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "1") == "1"
+
+
+class _Flight:
+    __slots__ = ("future", "started")
+
+    def __init__(self, future: asyncio.Future, started: float):
+        self.future = future
+        self.started = started
+
+
+class SingleFlight:
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        self.queries = 0
+        self.shared = 0
+        self.timeouts = 0
+        # event loop -> {key: _Flight}; entries go away with their loop
+        self._flights = weakref.WeakKeyDictionary()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable], timeout: float = None):
+        """Result of `await fn()`, shared with concurrent calls for the same key."""
+        if not SINGLEFLIGHT:
+            self.queries += 1
+            return await fn()
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+
+        flights = self._flights.get(loop)
+        if flights is None:
+            flights = self._flights[loop] = {}
+        flight = flights.get(key)
+        if flight is not None and now - flight.started < timeout:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(flight.future), flight.started + timeout - now)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+            except asyncio.CancelledError:
+                if not flight.future.cancelled():
+                    raise
+            else:
+                self.shared += 1
+                return result
+            self.queries += 1
+            return await fn()
+
+        flight = _Flight(loop.create_future(), now)
+        flights[key] = flight
+        self.queries += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            flight.future.cancel()
+            raise
+        except BaseException as exc:
+            flight.future.set_exception(exc)
+            # Followers re-raise it; without them the error is still handled here
+            flight.future.exception()
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            if flights.get(key) is flight:
+                del flights[key]
+
+    def forget(self, user_id):
+        """Stop sharing in-flight reads of this user's data with later requests."""
+        for flights in list(self._flights.values()):
+            for key in [key for key in list(flights) if key[0] == user_id]:
+                flights.pop(key, None)
+
+    def stats(self) -> dict:
+        in_flight = sum(len(flights) for flights in list(self._flights.values()))
+        return {"queries": self.queries, "saved": self.shared, "timeouts": self.timeouts, "in_flight": in_flight}
+
+    def reset_stats(self):
+        self.queries = self.shared = self.timeouts = 0
+
+
+user_flights = SingleFlight("users", float(os.getenv("SINGLEFLIGHT_USER_TIMEOUT", "2")))
+calculation_flights = SingleFlight("calculations", float(os.getenv("SINGLEFLIGHT_CALCULATIONS_TIMEOUT", "2")))
+
+
+def stats() -> dict:
+    return {group.name: group.stats() for group in (user_flights, calculation_flights)}
@@ -0,0 +1,98 @@
+# app/sqlite_profile.py
+
+"""
+High-throughput SQLite profile.
+
+Single-node deployments run on SQLite. With `SQLITE_PROFILE=throughput` (the
+default) every new connection is configured for concurrent readers and a
+single writer:
+
+- journal_mode=WAL: readers no longer block the writer, and vice versa;
+- synchronous=NORMAL: in WAL mode this is still safe against corruption and
+  only fsyncs at checkpoints;
+- mmap_size / cache_size: serve reads from memory instead of read() calls;
+- busy_timeout: wait for the write lock instead of failing with
+  "database is locked";
+- temp_store=MEMORY: sorts and temporary indexes stay off disk.
+
+`run_maintenance` runs in the background to checkpoint the WAL and to run
+PRAGMA optimize, so the WAL file does not grow without bound and the query
+planner statistics stay current. Set `SQLITE_PROFILE=off` to use SQLite
+defaults.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "throughput")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative values are in KiB, so this is 64 MiB per connection
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CHECKPOINT_SECONDS = float(os.getenv("SQLITE_CHECKPOINT_SECONDS", "60"))
+SQLITE_OPTIMIZE_SECONDS = float(os.getenv("SQLITE_OPTIMIZE_SECONDS", "3600"))
+
+
+def _is_memory(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def configure(engine: Engine, profile: str = None):
+    """Install the connection PRAGMAs for `profile` on a SQLite engine."""
+    profile = SQLITE_PROFILE if profile is None else profile
+    if engine.dialect.name != "sqlite" or profile == "off":
+        return
+    if profile != "throughput":
+        raise ValueError(f"Unknown SQLITE_PROFILE: {profile}")
+    in_memory = _is_memory(engine.url)
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if not in_memory:
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
+
+
+def checkpoint(engine: Engine):
+    """Copy WAL pages back into the database without blocking readers or writers."""
+    with engine.connect() as conn:
+        busy, log_frames, checkpointed = conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)")).one()
+    logger.debug(f"WAL checkpoint: {checkpointed}/{log_frames} frames (busy={busy})")
+
+
+def optimize(engine: Engine):
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA optimize"))
+
+
+async def run_maintenance(engine: Engine):
+    """Background task: periodic WAL checkpoints and PRAGMA optimize."""
+    from starlette.concurrency import run_in_threadpool
+
+    if engine.dialect.name != "sqlite" or SQLITE_PROFILE == "off" or _is_memory(engine.url):
+        return
+    last_optimize = time.monotonic()
+    while True:
+        await asyncio.sleep(SQLITE_CHECKPOINT_SECONDS)
+        try:
+            await run_in_threadpool(checkpoint, engine)
+            if time.monotonic() - last_optimize >= SQLITE_OPTIMIZE_SECONDS:
+                await run_in_threadpool(optimize, engine)
+                last_optimize = time.monotonic()
+        except Exception:
+            logger.exception("SQLite maintenance failed")
@@ -0,0 +1,87 @@
+# app/storage.py
+
+"""
+Storage used per table and per row.
+
+    python -m app.storage report [--table calculations]
+
+For each table: the row count, the bytes in table pages and in its indexes,
+and both divided by the row count. SQLite sizes come from the dbstat virtual
+table and PostgreSQL sizes from pg_relation_size/pg_indexes_size, so both
+include page overhead and free space inside pages.
+"""
+
+import argparse
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app import database
+
+
+def _sqlite_sizes(conn, table: str, indexes: List[str]):
+    sizes = dict(conn.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).all())
+    return sizes.get(table, 0), sum(sizes.get(name, 0) for name in indexes)
+
+
+def _postgres_sizes(conn, table: str):
+    return conn.execute(
+        text("SELECT pg_relation_size(CAST(:t AS regclass)), pg_indexes_size(CAST(:t AS regclass))"),
+        {"t": table},
+    ).one()
+
+
+def table_report(engine: Engine, table: str) -> dict:
+    inspector = inspect(engine)
+    # Indexes SQLite creates itself for primary keys and unique constraints
+    # are not reported by the inspector, but dbstat names them after the table
+    indexes = [ix["name"] for ix in inspector.get_indexes(table)]
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+        if engine.dialect.name == "sqlite":
+            indexes += list(conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t AND sql IS NULL"),
+                {"t": table},
+            ).scalars())
+            table_bytes, index_bytes = _sqlite_sizes(conn, table, indexes)
+        elif engine.dialect.name == "postgresql":
+            table_bytes, index_bytes = _postgres_sizes(conn, table)
+        else:
+            raise RuntimeError(f"Storage report is not supported on {engine.dialect.name}")
+    return {
+        "table": table,
+        "rows": rows,
+        "table_bytes": table_bytes,
+        "index_bytes": index_bytes,
+        "table_bytes_per_row": table_bytes / rows if rows else 0.0,
+        "index_bytes_per_row": index_bytes / rows if rows else 0.0,
+    }
+
+
+def report(engine: Engine, tables: Optional[List[str]] = None) -> List[dict]:
+    tables = tables or sorted(inspect(engine).get_table_names())
+    return [table_report(engine, table) for table in tables]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report storage used per table and per row.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_parser = sub.add_parser("report", help="print table and index sizes")
+    report_parser.add_argument("--table", action="append", dest="tables", help="limit to this table (repeatable)")
+    args = parser.parse_args(argv)
+
+    targets = [("primary", database.engine)]
+    targets += [(f"shard {i}", e) for i, e in enumerate(database.shard_engines)]
+    for name, engine in targets:
+        print(f"{name}:")
+        print(f"  {'table':20}{'rows':>12}{'table KB':>12}{'index KB':>12}{'table B/row':>13}{'index B/row':>13}")
+        for r in report(engine, args.tables):
+            print(
+                f"  {r['table']:20}{r['rows']:12}{r['table_bytes'] / 1024:12.1f}{r['index_bytes'] / 1024:12.1f}"
+                f"{r['table_bytes_per_row']:13.1f}{r['index_bytes_per_row']:13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
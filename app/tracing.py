@@ -0,0 +1,295 @@
+# app/tracing.py
+
+"""
+Lightweight request tracing.
+
+A sampled request gets a root span from `TracingMiddleware`. Everything it
+does then records nested child spans:
+- SQL statements and session commits (SQLAlchemy events)
+- JWT decoding and the current-user lookup
+- password hashing and verification
+- anything wrapped in `with span("name"):`
+
+When the request finishes, the whole trace is appended as one line of
+OpenTelemetry (OTLP/JSON `ExportTraceServiceRequest`) to a rotating file:
+
+    TRACE_SAMPLE_RATE       fraction of requests traced, 0.0-1.0 (default 0: off)
+    TRACE_FILE              output file (traces/spans.jsonl)
+    TRACE_FILE_MAX_BYTES    rotate after this size (10 MB)
+    TRACE_FILE_BACKUPS      rotated files kept (5)
+
+A W3C `traceparent` header with the sampled flag forces sampling and
+continues the caller's trace.
+
+With sampling off, the only per-request cost is a random() call. Each
+instrumentation point then does one context variable read and returns.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("traces", "spans.jsonl"))
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "5"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "fastapi-calculator")
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_MAX_STATEMENT_LENGTH = 1000
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, trace: list, trace_id: str, parent_id: Optional[str], name: str, kind: int, attributes: dict):
+        self.trace = trace
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = STATUS_UNSET
+
+    def child(self, name: str, kind: int = KIND_INTERNAL, **attributes) -> "Span":
+        return Span(self.trace, self.trace_id, self.span_id, name, kind, attributes)
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.trace.append(self)
+
+    def to_otlp(self) -> dict:
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        return data
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Record a child span of the current span; does nothing outside a sampled trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, kind, **attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException:
+        child.status = STATUS_ERROR
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+# ---------------------------------------------
+# Export
+# ---------------------------------------------
+
+_exporter = None
+
+
+def _get_exporter() -> logging.Logger:
+    global _exporter
+    if _exporter is None:
+        directory = os.path.dirname(TRACE_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        exporter = logging.getLogger("app.tracing.export")
+        exporter.propagate = False
+        exporter.setLevel(logging.INFO)
+        exporter.addHandler(handler)
+        _exporter = exporter
+    return _exporter
+
+
+def export(spans: list):
+    """Append one trace to TRACE_FILE as an OTLP/JSON ExportTraceServiceRequest line."""
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": [s.to_otlp() for s in spans]}],
+        }]
+    }
+    _get_exporter().info(json.dumps(payload, separators=(",", ":")))
+
+
+def reset_exporter():
+    """Close the trace file, so the next export reopens TRACE_FILE."""
+    global _exporter
+    if _exporter is not None:
+        for handler in list(_exporter.handlers):
+            _exporter.removeHandler(handler)
+            handler.close()
+    _exporter = None
+
+
+# ---------------------------------------------
+# ASGI middleware
+# ---------------------------------------------
+
+def _parse_traceparent(headers) -> Optional[tuple]:
+    for key, value in headers:
+        if key == b"traceparent":
+            parts = value.decode("latin-1").split("-")
+            try:
+                if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16 and int(parts[3], 16) & 1:
+                    return parts[1], parts[2]
+            except ValueError:
+                pass
+            return None
+    return None
+
+
+class TracingMiddleware:
+    """Starts a root span for sampled HTTP requests and exports the trace at the end."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        parent = _parse_traceparent(scope.get("headers", ()))
+        if parent is None and (TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE):
+            return await self.app(scope, receive, send)
+
+        trace_id, parent_id = parent or (os.urandom(16).hex(), None)
+        root = Span([], trace_id, parent_id, f"{scope['method']} {scope['path']}", KIND_SERVER, {
+            "http.request.method": scope["method"],
+            "url.path": scope["path"],
+        })
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                root.name = f"{scope['method']} {route.path}"
+                root.attributes["http.route"] = route.path
+            root.attributes["http.response.status_code"] = status_code
+            if status_code >= 500:
+                root.status = STATUS_ERROR
+            root.end()
+            export(root.trace)
+
+
+# ---------------------------------------------
+# SQLAlchemy instrumentation
+# ---------------------------------------------
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is None:
+        return
+    context._trace_span = parent.child(
+        "db." + statement.lstrip().split(None, 1)[0].upper(),
+        KIND_CLIENT,
+        **{"db.system": conn.dialect.name, "db.statement": statement[:_MAX_STATEMENT_LENGTH]},
+    )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_span = getattr(context, "_trace_span", None)
+    if db_span is not None:
+        db_span.attributes["db.rowcount"] = cursor.rowcount
+        db_span.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    db_span = getattr(context, "_trace_span", None) if context is not None else None
+    if db_span is not None:
+        db_span.status = STATUS_ERROR
+        db_span.end()
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    parent = _current_span.get()
+    if parent is not None:
+        # Statements flushed by the commit become children of the commit span
+        commit_span = parent.child("db.session.commit")
+        session.info["_trace_commit"] = (commit_span, _current_span.set(commit_span))
+
+
+def _end_commit(session, failed: bool = False):
+    started = session.info.pop("_trace_commit", None)
+    if started is not None:
+        commit_span, token = started
+        _current_span.reset(token)
+        if failed:
+            commit_span.status = STATUS_ERROR
+        commit_span.end()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    _end_commit(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    _end_commit(session, failed=True)
@@ -0,0 +1,58 @@
+# app/user_queries.py
+
+"""
+Batch reads of users by id.
+
+`fetch_users_by_id` answers a list of ids with one `WHERE id IN (...)` query
+per LOOKUP_CHUNK_SIZE distinct ids, so a few hundred ids cost one round trip
+and the statement stays under SQLite's (999 on older builds) and
+PostgreSQL's (65535) bound-parameter limits.
+"""
+
+from typing import List, Optional
+
+from pydantic_core import to_json
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import User
+from app.schemas import UserRead
+
+# Distinct ids per IN (...) list
+LOOKUP_CHUNK_SIZE = 900
+# Ids accepted by one batch request
+MAX_LOOKUP_IDS = 10000
+
+# UserRead's fields, in the order the API serializes them
+USER_READ_FIELDS = list(UserRead.model_fields)
+USER_READ_COLUMNS = [getattr(User, name).label(name) for name in USER_READ_FIELDS]
+
+
+def parse_ids(text: str) -> List[int]:
+    """`1,2,3` -> [1, 2, 3]; raises ValueError on anything else."""
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def fetch_users_by_id(db: Session, ids: List[int]) -> List[Optional[dict]]:
+    """One UserRead dict per requested id, in request order; None where no user has that id."""
+    unique = list(dict.fromkeys(ids))
+    found = {}
+    for start in range(0, len(unique), LOOKUP_CHUNK_SIZE):
+        chunk = unique[start:start + LOOKUP_CHUNK_SIZE]
+        for row in db.execute(select(*USER_READ_COLUMNS).where(User.id.in_(chunk))).mappings():
+            found[row["id"]] = dict(row)
+    return [found.get(user_id) for user_id in ids]
+
+
+def fetch_user_by_id(db: Session, user_id: int) -> Optional[dict]:
+    row = db.execute(select(*USER_READ_COLUMNS).where(User.id == user_id)).mappings().first()
+    return dict(row) if row else None
+
+
+def render_user(user: dict) -> bytes:
+    return to_json(user)
+
+
+def render_users(users: List[Optional[dict]]) -> bytes:
+    """JSON for a list of user dicts (or None), matching UserRead output."""
+    return to_json(users)
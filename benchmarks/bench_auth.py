@@ -0,0 +1,78 @@
+# benchmarks/bench_auth.py
+
+"""
+Authentication overhead per request, with and without the verified-token cache.
+
+Measures two things:
+
+- `decode_access_token` alone, i.e. the JWT verification step;
+- a full authenticated `GET /users/me` through the ASGI app against an
+  in-memory SQLite database, which adds routing and the user lookup.
+
+Usage:
+    python benchmarks/bench_auth.py [--requests 2000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import database, security
+
+
+def time_per_call(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    database.engine = engine
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+
+    from main import app
+
+    logging.disable(logging.INFO)
+    client = TestClient(app)
+    client.post("/users/register", json={"username": "bench", "email": "bench@example.com", "password": "password123"})
+    token = client.post("/users/login", json={"email": "bench@example.com", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def decode():
+        security.decode_access_token(token)
+
+    def request():
+        assert client.get("/users/me", headers=headers).status_code == 200
+
+    print(f"{'':28}{'no cache':>12}{'cache':>12}")
+    for label, fn, n in [("decode_access_token (us)", decode, args.requests * 10), ("GET /users/me (us)", request, args.requests)]:
+        security.token_cache.maxsize = 0
+        security.token_cache.clear()
+        fn()
+        uncached = time_per_call(fn, n)
+        security.token_cache.maxsize = security.TOKEN_CACHE_SIZE or 10000
+        fn()
+        cached = time_per_call(fn, n)
+        print(f"{label:28}{uncached:12.1f}{cached:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/bench_list_read.py
+
+"""
+Cost of rendering one page of `GET /calculations` with the ORM path and
+with the Core read path, at 100 and 1,000 rows per page.
+
+  orm   session.query(Calculation), then what response_model does with the
+        objects: validate each into CalculationRead, dump to JSON-ready
+        dicts and json.dumps them
+  core  `calculation_queries.fetch_page` (only the response columns, no
+        identity map) and `render_calculations` (pydantic-core to_json)
+
+Both run against the same SQLite file database and produce the same bytes,
+which is checked before timing.
+
+Usage:
+    python benchmarks/bench_list_read.py [--pages 100,1000] [--repeat 200]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.calculation_queries import calculation_conditions, calculation_order, fetch_page, render_calculations
+from app.models import Calculation
+from app.schemas import CalculationRead
+
+USER_ID = 1
+adapter = TypeAdapter(list[CalculationRead])
+
+
+def orm_page(db, limit: int) -> bytes:
+    rows = (
+        db.query(Calculation)
+        .filter(Calculation.user_id == USER_ID)
+        .order_by(Calculation.id)
+        .limit(limit)
+        .all()
+    )
+    content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+    # A request's session is closed at the end; the identity map goes with it
+    db.expunge_all()
+    return body
+
+
+def core_page(db, limit: int) -> bytes:
+    conditions = calculation_conditions(USER_ID, None, "sqlite")
+    return render_calculations(fetch_page(db, conditions, calculation_order(None, "sqlite"), 0, limit))
+
+
+def timed(fn, db, limit: int, repeat: int) -> float:
+    fn(db, limit)
+    began = time.perf_counter()
+    for _ in range(repeat):
+        fn(db, limit)
+    return (time.perf_counter() - began) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="100,1000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    pages = [int(n) for n in args.pages.split(",")]
+
+    logging.disable(logging.CRITICAL)
+    engine = database.make_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'list.db')}")
+    database.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Calculation.__table__), [
+            {"a": i, "b": 7, "type_code": "Multiply", "result": i * 7, "user_id": USER_ID} for i in range(max(pages))
+        ])
+    db = sessionmaker(bind=engine)()
+
+    print(f"{'rows':>6}{'orm ms':>10}{'core ms':>10}{'speedup':>10}")
+    for limit in pages:
+        assert orm_page(db, limit) == core_page(db, limit)
+        orm = timed(orm_page, db, limit, args.repeat)
+        core = timed(core_page, db, limit, args.repeat)
+        print(f"{limit:6}{orm:10.3f}{core:10.3f}{orm / core:9.1f}x")
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
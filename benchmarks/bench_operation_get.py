@@ -0,0 +1,102 @@
+# benchmarks/bench_operation_get.py
+
+"""
+Cost of one arithmetic request through the app, for:
+
+  post        POST /add with a JSON body
+  get miss    GET /add?a=..&b=.. with the in-process cache disabled
+              (query validation, the operation and serialization each time)
+  get hit     the same URL answered from the LRU of response bytes
+  get 304     a hit with a matching If-None-Match
+
+Requests are driven straight through the ASGI app on one event loop (every
+middleware included, no sockets or test client), so the numbers are the
+app's own cost per request.
+
+Usage:
+    python benchmarks/bench_operation_get.py [--requests 2000] [--rounds 5]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from app.operation_cache import etag_for, operation_cache
+
+
+def asgi_request(app, loop, method: str, path: str, query: bytes = b"", body: bytes = b"", headers=()) -> int:
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "scheme": "http", "path": path,
+        "raw_path": path.encode(), "root_path": "", "query_string": query,
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), *headers],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80), "app": app,
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    loop.run_until_complete(app(scope, receive, send))
+    return status[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    from main import app
+
+    logging.disable(logging.CRITICAL)
+    loop = asyncio.new_event_loop()
+    body = json.dumps({"a": 2, "b": 3}).encode()
+    etag = etag_for(b'{"result":5.0}').encode()
+    maxsize = operation_cache.maxsize
+
+    def set_cache(enabled: bool):
+        operation_cache.clear()
+        operation_cache.maxsize = maxsize if enabled else 0
+        assert asgi_request(app, loop, "GET", "/add", b"a=2&b=3") == 200
+
+    modes = {
+        "post": (True, lambda: asgi_request(app, loop, "POST", "/add", body=body)),
+        "get miss": (False, lambda: asgi_request(app, loop, "GET", "/add", b"a=2&b=3")),
+        "get hit": (True, lambda: asgi_request(app, loop, "GET", "/add", b"a=2&b=3")),
+        "get 304": (True, lambda: asgi_request(app, loop, "GET", "/add", b"a=2&b=3", headers=[(b"if-none-match", etag)])),
+    }
+    for mode, (cached, request) in modes.items():
+        set_cache(cached)
+        assert request() == (304 if mode == "get 304" else 200), mode
+    best = {}
+    for _ in range(args.rounds):
+        for mode, (cached, request) in modes.items():
+            set_cache(cached)
+            began = time.perf_counter()
+            for _ in range(args.requests):
+                request()
+            elapsed = (time.perf_counter() - began) / args.requests * 1e6
+            best[mode] = min(best.get(mode, elapsed), elapsed)
+    operation_cache.maxsize = maxsize
+    loop.close()
+
+    print(f"{'mode':10}{'us/request':>12}")
+    for mode, us in best.items():
+        print(f"{mode:10}{us:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_server.py
+
+"""
+Requests per second through real HTTP, for several `app.server` launcher
+configurations.
+
+Each configuration starts `python -m app.server` on a fresh SQLite file
+database, then --clients threads send requests for --seconds over keep-alive
+connections. "add" is POST /add (no database) and "list" is
+GET /calculations?limit=10 for a logged-in user with 50 calculations.
+
+Configurations using uvloop or httptools are skipped when those packages are
+not installed. The load generator runs on the same machine and takes CPU
+away from the server, so compare configurations with each other rather than
+with production numbers.
+
+Usage:
+    python benchmarks/bench_server.py [--seconds 10] [--clients 16] [--workers 1,4] [--endpoint add|list]
+"""
+
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 8765
+BASE = f"http://127.0.0.1:{PORT}"
+
+
+def configurations(worker_counts):
+    configs = []
+    for workers in worker_counts:
+        configs.append((workers, "asyncio", "h11"))
+        if importlib.util.find_spec("httptools"):
+            configs.append((workers, "asyncio", "httptools"))
+        if importlib.util.find_spec("uvloop") and importlib.util.find_spec("httptools"):
+            configs.append((workers, "uvloop", "httptools"))
+    return configs
+
+
+def start_server(workers: int, loop: str, http: str):
+    tmpdir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'server.db')}", MIGRATE_ON_STARTUP="0")
+    subprocess.run([sys.executable, "-m", "app.migrations", "upgrade"], cwd=ROOT, env=env, check=True, capture_output=True)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--port", str(PORT), "--workers", str(workers), "--loop", loop, "--http", http],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.post(f"{BASE}/add", json={"a": 1, "b": 1})
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+def prepare_list_user() -> dict:
+    httpx.post(f"{BASE}/users/register", json={"username": "bench", "email": "bench@example.com", "password": "password123"})
+    token = httpx.post(f"{BASE}/users/login", json={"email": "bench@example.com", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(50):
+        httpx.post(f"{BASE}/calculations", headers=headers, json={"a": i, "b": 1, "type": "Add"})
+    return headers
+
+
+def load(endpoint: str, clients: int, seconds: float, headers: dict):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client():
+        nonlocal errors
+        mine, failed = [], 0
+        with httpx.Client(base_url=BASE, headers=headers) as http:
+            while time.monotonic() < deadline:
+                began = time.perf_counter()
+                try:
+                    if endpoint == "add":
+                        response = http.post("/add", json={"a": 2, "b": 3})
+                    else:
+                        response = http.get("/calculations?limit=10")
+                    ok = response.status_code == 200
+                except httpx.TransportError:
+                    ok = False
+                if ok:
+                    mine.append(time.perf_counter() - began)
+                else:
+                    failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    return len(latencies) / seconds, statistics.median(latencies) if latencies else 0.0, p99, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    parser.add_argument("--endpoint", choices=["add", "list"], default="add")
+    args = parser.parse_args()
+    worker_counts = sorted({int(n) for n in args.workers.split(",")})
+
+    print(f"{'workers':>8}  {'loop':8}{'http':10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for workers, loop, http in configurations(worker_counts):
+        process = start_server(workers, loop, http)
+        try:
+            headers = prepare_list_user() if args.endpoint == "list" else {}
+            rps, p50, p99, errors = load(args.endpoint, args.clients, args.seconds, headers)
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{workers:8}  {loop:8}{http:10}{rps:10.1f}{p50 * 1000:10.2f}{p99 * 1000:10.2f}{errors:8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_shards.py
+
+"""
+Calculation write throughput on SQLite with 1, 2 and 4 shards.
+
+Writer threads each insert calculations for their own user, through
+`database.shard_session`, for a fixed duration. With one shard every commit
+takes the same SQLite write lock. With more shards, users on different shards
+commit in parallel.
+
+With the throughput SQLite profile, commits skip fsync and the benchmark is
+bound by Python (GIL) work. Use `--sqlite-profile off` to see the case
+where every commit waits on the disk while holding the lock.
+
+Usage:
+    python benchmarks/bench_shards.py [--seconds 5] [--writers 8] [--shards 1,2,4] [--sqlite-profile off]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from app import database, migrations, sqlite_profile
+from app.models import Calculation
+
+
+def run(shards: int, writers: int, seconds: float) -> float:
+    tmpdir = tempfile.mkdtemp()
+    database.configure_shards([f"sqlite:///{os.path.join(tmpdir, f'shard{i}.db')}" for i in range(shards)])
+    for index, engine in enumerate(database.shard_engines):
+        migrations.migrate(engine, shard=index)
+
+    # Pick users that spread evenly over the shards
+    users = []
+    candidate = 1
+    while len(users) < writers:
+        if database.shard_for_user(candidate) == len(users) % shards:
+            users.append(candidate)
+        candidate += 1
+
+    total = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def writer(user_id):
+        nonlocal total
+        done = 0
+        while time.monotonic() < deadline:
+            db = database.shard_session(user_id)
+            try:
+                db.add(Calculation(a=1, b=2, type="Add", result=3, user_id=user_id))
+                db.commit()
+                done += 1
+            finally:
+                db.close()
+        with lock:
+            total += done
+
+    threads = [threading.Thread(target=writer, args=(u,)) for u in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    database.configure_shards([])
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--shards", default="1,2,4")
+    parser.add_argument("--sqlite-profile", choices=["throughput", "off"], default=sqlite_profile.SQLITE_PROFILE)
+    args = parser.parse_args()
+    sqlite_profile.SQLITE_PROFILE = args.sqlite_profile
+
+    logging.disable(logging.CRITICAL)
+    print(f"{'shards':>8}{'writes/s':>12}")
+    for shards in [int(n) for n in args.shards.split(",")]:
+        print(f"{shards:>8}{run(shards, args.writers, args.seconds):12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_sqlite.py
+
+"""
+Concurrent read/write throughput of the calculation endpoints on SQLite,
+with the throughput profile (`SQLITE_PROFILE=throughput`) and with SQLite
+defaults (`off`).
+
+Each profile gets a fresh file database. Writer threads POST /calculations
+and reader threads GET /calculations for a fixed duration, each thread with
+its own client, so database calls really overlap. Lock errors are counted
+rather than raised.
+
+In-process HTTP requests are mostly Python work under the GIL, which hides
+part of the database difference. `--layer db` runs the same insert and page
+query directly through SQLAlchemy sessions to isolate the storage engine.
+
+Usage:
+    python benchmarks/bench_sqlite.py [--seconds 10] [--readers 4] [--writers 2] [--layer http|db]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.models import Calculation
+
+
+def run_profile(profile: str, layer: str, seconds: float, readers: int, writers: int):
+    from main import app
+
+    tmpdir = tempfile.mkdtemp()
+    engine = database.make_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}", profile)
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    setup = TestClient(app)
+    setup.post("/users/register", json={"username": "bench", "email": "bench@example.com", "password": "password123"})
+    token = setup.post("/users/login", json={"email": "bench@example.com", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(200):
+        setup.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": "Add"})
+    user_id = setup.get("/users/me", headers=headers).json()["id"]
+
+    def http_request(client, kind):
+        if kind == "write":
+            response = client.post("/calculations", headers=headers, json={"a": 1, "b": 2, "type": "Multiply"})
+        else:
+            response = client.get("/calculations?limit=50", headers=headers)
+        return response.status_code == 200
+
+    def db_request(_, kind):
+        db = database.SessionLocal()
+        try:
+            if kind == "write":
+                db.add(Calculation(a=1, b=2, type="Multiply", result=2, user_id=user_id))
+                db.commit()
+            else:
+                db.query(Calculation).filter(Calculation.user_id == user_id).limit(50).all()
+            return True
+        finally:
+            db.close()
+
+    request = db_request if layer == "db" else http_request
+    counts = {"read": 0, "write": 0, "error": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(kind):
+        client = TestClient(app)
+        done = errors = 0
+        while time.monotonic() < deadline:
+            try:
+                if request(client, kind):
+                    done += 1
+                else:
+                    errors += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts[kind] += done
+            counts["error"] += errors
+
+    threads = [threading.Thread(target=worker, args=("read",)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=("write",)) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    return {k: v / seconds for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--layer", choices=["http", "db"], default="http")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    print(f"{'profile':12}{'reads/s':>10}{'writes/s':>10}{'errors/s':>10}")
+    for profile in ["off", "throughput"]:
+        result = run_profile(profile, args.layer, args.seconds, args.readers, args.writers)
+        print(f"{profile:12}{result['read']:10.1f}{result['write']:10.1f}{result['error']:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# benchmarks/bench_tracing.py
+
+"""
+Per-request overhead of tracing on POST /calculations and GET /calculations.
+
+Modes:
+  uninstrumented   TracingMiddleware and the SQLAlchemy listeners removed
+  off              TRACE_SAMPLE_RATE=0 (the default)
+  sampled 100%     every request traced and exported to a temporary file
+
+The modes are run in alternating rounds of --requests requests each, in a
+rotating order, so drift (e.g. a growing table) does not favour one mode.
+The fastest round of each mode is reported, which filters out scheduling
+noise that is larger than the differences being measured. The `with span(...)` blocks in app.security stay in
+every mode. Outside a trace they cost one context variable read.
+
+End-to-end differences of a few percent are within the noise of a shared
+machine, so the cost of the disabled instrumentation points is also timed
+directly (in microseconds per call). It is then added up for one
+POST /calculations: the middleware pass-through, two statements, one commit
+and three `span()` blocks.
+
+Usage:
+    python benchmarks/bench_tracing.py [--rounds 21] [--requests 100]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from fastapi.testclient import TestClient
+from starlette.middleware import Middleware
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import database, tracing
+
+LISTENERS = [
+    (Engine, "before_cursor_execute", tracing._before_cursor_execute),
+    (Engine, "after_cursor_execute", tracing._after_cursor_execute),
+    (Engine, "handle_error", tracing._handle_error),
+    (Session, "before_commit", tracing._before_commit),
+    (Session, "after_commit", tracing._after_commit),
+    (Session, "after_rollback", tracing._after_rollback),
+]
+
+
+def set_instrumented(app, instrumented: bool):
+    installed = any(m.cls is tracing.TracingMiddleware for m in app.user_middleware)
+    if instrumented == installed:
+        return
+    if instrumented:
+        app.user_middleware.insert(0, Middleware(tracing.TracingMiddleware))
+        for target, name, fn in LISTENERS:
+            event.listen(target, name, fn)
+    else:
+        app.user_middleware = [m for m in app.user_middleware if m.cls is not tracing.TracingMiddleware]
+        for target, name, fn in LISTENERS:
+            event.remove(target, name, fn)
+    app.middleware_stack = None
+
+
+def per_call_us(fn, calls: int = 200_000) -> float:
+    began = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - began) / calls * 1e6
+
+
+def disabled_costs() -> dict:
+    """Microseconds per call of each instrumentation point outside a trace."""
+    import asyncio
+
+    async def noop_app(scope, receive, send):
+        pass
+
+    middleware = tracing.TracingMiddleware(noop_app)
+    scope = {"type": "http", "method": "POST", "path": "/calculations", "headers": [(b"authorization", b"Bearer x")] * 4}
+    loop = asyncio.new_event_loop()
+
+    def through_middleware():
+        loop.run_until_complete(middleware(scope, None, None))
+
+    def direct():
+        loop.run_until_complete(noop_app(scope, None, None))
+
+    def in_span():
+        with tracing.span("x"):
+            pass
+
+    class Context:
+        pass
+
+    context = Context()
+    session = Context()
+    session.info = {}
+    costs = {
+        "middleware pass-through": per_call_us(through_middleware, 50_000) - per_call_us(direct, 50_000),
+        "statement listeners": per_call_us(lambda: (
+            tracing._before_cursor_execute(None, None, "SELECT 1", None, context, False),
+            tracing._after_cursor_execute(None, None, "SELECT 1", None, context, False),
+        )),
+        "commit listeners": per_call_us(lambda: (tracing._before_commit(session), tracing._after_commit(session))),
+        "span() block": per_call_us(in_span),
+    }
+    loop.close()
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=21)
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+
+    from main import app
+
+    logging.disable(logging.CRITICAL)
+    tmpdir = tempfile.mkdtemp()
+    engine = database.make_engine(f"sqlite:///{os.path.join(tmpdir, 'trace.db')}")
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    tracing.TRACE_FILE = os.path.join(tmpdir, "spans.jsonl")
+
+    client = TestClient(app)
+    client.post("/users/register", json={"username": "bench", "email": "bench@example.com", "password": "password123"})
+    token = client.post("/users/login", json={"email": "bench@example.com", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    modes = {"uninstrumented": (False, 0.0), "off": (True, 0.0), "sampled 100%": (True, 1.0)}
+    for endpoint in ["POST /calculations", "GET /calculations"]:
+        def request():
+            if endpoint.startswith("POST"):
+                client.post("/calculations", headers=headers, json={"a": 4, "b": 2, "type": "Divide"})
+            else:
+                client.get("/calculations?limit=10", headers=headers)
+
+        timings = {mode: [] for mode in modes}
+        for round_number in range(args.rounds):
+            order = list(modes)
+            order = order[round_number % len(order):] + order[:round_number % len(order)]
+            for mode in order:
+                instrumented, rate = modes[mode]
+                set_instrumented(app, instrumented)
+                tracing.TRACE_SAMPLE_RATE = rate
+                request()
+                began = time.perf_counter()
+                for _ in range(args.requests):
+                    request()
+                timings[mode].append((time.perf_counter() - began) / args.requests * 1000)
+
+        baseline = min(timings["uninstrumented"])
+        if endpoint.startswith("POST"):
+            post_baseline = baseline
+        print(endpoint)
+        print(f"  {'mode':16}{'ms/request':>12}{'overhead':>10}")
+        for mode, values in timings.items():
+            best = min(values)
+            print(f"  {mode:16}{best:12.3f}{(best / baseline - 1) * 100:9.1f}%")
+    set_instrumented(app, True)
+    engine.dispose()
+
+    costs = disabled_costs()
+    print("Disabled instrumentation, per call")
+    for name, us in costs.items():
+        print(f"  {name:26}{us:8.2f} us")
+    per_post = costs["middleware pass-through"] + 2 * costs["statement listeners"] + costs["commit listeners"] + 3 * costs["span() block"]
+    print(f"  {'per POST /calculations':26}{per_post:8.2f} us ({per_post / 1000 / post_baseline * 100:.2f}% of {post_baseline:.3f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,35 @@
 # main.py
 
-from fastapi import Depends, FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field, field_validator  # Use @validator for Pydantic 1.x
 from fastapi.exceptions import RequestValidationError
+from sqlalchemy import insert, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.operations import add, subtract, multiply, divide  # Ensure correct import path
-from app.database import Base, engine, get_db
+from app.database import engine, get_db, get_read_db
+from app.migrations import MIGRATE_ON_STARTUP, ensure_all_schemas
+from app.sharding import get_calc_db, get_calc_read_db
 from app.models import User, Calculation
-from app.schemas import UserCreate, UserRead, CalculationCreate, CalculationRead, Token, UserLogin, UserUpdate, PasswordChange
-from app.security import hash_password, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user
+from app.schemas import UserCreate, UserRead, CalculationCreate, CalculationRead, CalculationFilters, Token, UserLogin, UserUpdate, PasswordChange, RefreshRequest, LogoutRequest, ProfilerWindow, UserLookup, JobCreate, JobRead
+from app.security import hash_password, verify_password, password_needs_rehash, rehash_password, create_access_token, create_refresh_token, decode_access_token, decode_refresh_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user, get_current_user_for_update, oauth2_scheme, require_admin
+from app.revocation import revocation_list, run_sync as run_revocation_sync
+from app import archive, database, jobs
+from app.calculation_queries import READ_COLUMNS, as_read_row, calculation_conditions, calculation_order, delete_ids, delete_matching, fetch_page, first_id, get_calculation_filters, merge_by_id, render_calculations
+from app.sqlite_profile import run_maintenance as run_sqlite_maintenance
+from app.tracing import TracingMiddleware
+from app.query_stats import QueryStatsMiddleware
+from app import profiling
+from app.user_queries import MAX_LOOKUP_IDS, fetch_user_by_id, fetch_users_by_id, parse_ids, render_user, render_users
+from app import singleflight
+from app.singleflight import calculation_flights, user_flights
+from starlette.concurrency import run_in_threadpool
+from app.assets import DIST_DIR, AssetFiles, asset_url
+from app.operation_cache import CACHE_CONTROL, OperationCacheMiddleware, cacheable_response, canonical_query
 from datetime import timedelta
-import uvicorn
+from functools import lru_cache
+from typing import Optional
 import logging
 
 # Setup logging with detailed format
@@ -25,18 +41,51 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.info("FastAPI Calculator application starting up...")
 
+import asyncio
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create database tables
-    Base.metadata.create_all(bind=engine)
+    # One indexed read of the schema version; migrations normally run once per
+    # deployment via `python -m app.migrations upgrade`.
+    version = ensure_all_schemas(auto_migrate=MIGRATE_ON_STARTUP)
+    logger.info(f"Database schema at version {version}")
+    # Pull token revocations made by other workers in the background
+    sync_task = asyncio.create_task(run_revocation_sync(database.SessionLocal))
+    # WAL checkpoints and PRAGMA optimize; returns at once for other databases
+    maintenance_task = asyncio.create_task(run_sqlite_maintenance(engine))
+    # Pick up jobs queued before a restart
+    jobs.resume()
     yield
+    sync_task.cancel()
+    maintenance_task.cancel()
+    jobs.shutdown()
 
 app = FastAPI(lifespan=lifespan)
-
-# Setup templates directory
-templates = Jinja2Templates(directory="templates")
+# Serves repeated GET /add, /subtract, ... straight from an LRU of response bytes
+app.add_middleware(OperationCacheMiddleware)
+# Per-request SQL counts (Server-Timing), N+1 warnings and the slow-query log
+app.add_middleware(QueryStatsMiddleware)
+# Records sampled requests (TRACE_SAMPLE_RATE) to TRACE_FILE; see app/tracing.py
+app.add_middleware(TracingMiddleware)
+# Sampling profiler, switched on per request or per window; see app/profiling.py
+app.add_middleware(profiling.ProfilerMiddleware)
+# Tells clients when they last wrote, so any worker keeps their reads on the primary
+app.add_middleware(database.ReadAfterWriteMiddleware)
+
+# Setup templates directory. Jinja2 is imported on the first page render rather
+# than at startup, since API-only workers never need it.
+@lru_cache(maxsize=None)
+def get_templates():
+    from fastapi.templating import Jinja2Templates
+
+    templates = Jinja2Templates(directory="templates")
+    # Pages link their CSS and JS by content hash; see app/assets.py
+    templates.env.globals["asset_url"] = asset_url
+    return templates
+
+# Fingerprinted CSS/JS with immutable caching and precompressed variants
+app.mount("/static", AssetFiles(directory=DIST_DIR, check_dir=False), name="static")
 
 # Pydantic model for request data
 class OperationRequest(BaseModel):
@@ -82,7 +131,7 @@ async def read_root(request: Request):
     Serve the index.html template.
     """
     logger.info(f"Serving index page to {request.client.host if request.client else 'unknown'}")
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse("index.html", {"request": request})
 
 @app.post("/add", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
 async def add_route(operation: OperationRequest):
@@ -144,18 +193,58 @@ async def divide_route(operation: OperationRequest):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+# GET variants of the operations, cacheable by browsers, proxies and CDNs; see
+# app/operation_cache.py
+OPERATIONS = {"add": add, "subtract": subtract, "multiply": multiply, "divide": divide}
+
+
+def operation_get(request: Request, name: str, a: float, b: float) -> Response:
+    canonical = canonical_query(a, b)
+    if request.url.query != canonical:
+        return RedirectResponse(f"{request.url.path}?{canonical}", status_code=301, headers={"Cache-Control": CACHE_CONTROL})
+    try:
+        result = OPERATIONS[name](a, b)
+    except ValueError as e:
+        logger.error(f"{name.capitalize()} Operation Error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"{name.capitalize()} operation (GET) successful: a={a}, b={b}, result={result}")
+    return cacheable_response(request, OperationResponse(result=result).model_dump_json().encode())
+
+
+OperandA = Query(..., allow_inf_nan=False, description="The first number")
+OperandB = Query(..., allow_inf_nan=False, description="The second number")
+
+
+@app.get("/add", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
+async def add_get_route(request: Request, a: float = OperandA, b: float = OperandB):
+    return operation_get(request, "add", a, b)
+
+@app.get("/subtract", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
+async def subtract_get_route(request: Request, a: float = OperandA, b: float = OperandB):
+    return operation_get(request, "subtract", a, b)
+
+@app.get("/multiply", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
+async def multiply_get_route(request: Request, a: float = OperandA, b: float = OperandB):
+    return operation_get(request, "multiply", a, b)
+
+@app.get("/divide", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
+async def divide_get_route(request: Request, a: float = OperandA, b: float = OperandB):
+    return operation_get(request, "divide", a, b)
+
+
 @app.post("/users/register", response_model=UserRead)
 async def register_user(user_in: UserCreate, db: Session = Depends(get_db)):
     hashed_password = hash_password(user_in.password)
-    user = User(
-        username=user_in.username,
-        email=user_in.email,
-        password_hash=hashed_password,
+    # RETURNING hands back the generated id and created_at with the INSERT
+    # itself, so no SELECT is needed after the commit.
+    statement = (
+        insert(User)
+        .values(username=user_in.username, email=user_in.email, password_hash=hashed_password)
+        .returning(User.username, User.email, User.id, User.created_at)
     )
-    db.add(user)
     try:
+        user = db.execute(statement).mappings().one()
         db.commit()
-        db.refresh(user)
     except IntegrityError:
         db.rollback()
         raise HTTPException(status_code=400, detail="Username or email already registered")
@@ -164,41 +253,116 @@ async def register_user(user_in: UserCreate, db: Session = Depends(get_db)):
 
 @app.get("/register")
 async def register_page(request: Request):
-    return templates.TemplateResponse("register.html", {"request": request})
+    return get_templates().TemplateResponse("register.html", {"request": request})
 
 
 @app.get("/login")
 async def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return get_templates().TemplateResponse("login.html", {"request": request})
 
 
 @app.post("/users/login", response_model=Token)
-async def login_user(user_in: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user_in: UserLogin, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == user_in.email).first()
     
     if not user or not verify_password(user_in.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Hashes from an older scheme or cost are upgraded after the response is sent
+    if password_needs_rehash(user.password_hash):
+        background_tasks.add_task(rehash_password, user.id, user.password_hash, user_in.password)
     
+    return issue_tokens(user.id)
+
+
+def issue_tokens(user_id: int) -> dict:
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data={"sub": str(user_id)}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = create_refresh_token(data={"sub": str(user_id)})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+@app.post("/users/refresh", response_model=Token)
+async def refresh_tokens(refresh_in: RefreshRequest, db: Session = Depends(get_db)):
+    from jose import JWTError
+
+    try:
+        claims = decode_refresh_token(refresh_in.refresh_token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    # Refresh tokens are single use: rotating them means a stolen one stops
+    # working as soon as the legitimate client refreshes. The database insert
+    # decides: a replay handled by a worker that has not synced the first use
+    # yet still loses it.
+    if not revocation_list.revoke(db, claims["jti"], claims["exp"]):
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return issue_tokens(int(claims["sub"]))
+
+
+@app.post("/users/logout")
+async def logout_user(logout_in: LogoutRequest = None, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    from jose import JWTError
+
+    try:
+        claims = decode_access_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    if "jti" in claims:
+        revocation_list.revoke(db, claims["jti"], claims["exp"])
+    if logout_in and logout_in.refresh_token:
+        try:
+            refresh_claims = decode_refresh_token(logout_in.refresh_token)
+        except JWTError:
+            refresh_claims = None
+        if refresh_claims and refresh_claims["sub"] == claims["sub"]:
+            revocation_list.revoke(db, refresh_claims["jti"], refresh_claims["exp"])
+    return {"message": "Logged out successfully"}
 
 
 @app.get("/users/me", response_model=UserRead)
 async def read_user_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+def lookup_users(db: Session, ids: list) -> Response:
+    if len(ids) > MAX_LOOKUP_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_IDS} ids per request")
+    return Response(content=render_users(fetch_users_by_id(db, ids)), media_type="application/json")
+
+
+# Admin tooling only: the lookups list many users' emails at once
+@app.get("/users", response_model=list[Optional[UserRead]], dependencies=[Depends(require_admin)])
+async def read_users(ids: str, db: Session = Depends(get_read_db)):
+    """
+    Users for `ids=1,2,3` in the order given, with null for ids that do not
+    exist. Use POST /users/lookup for lists too long for a URL.
+    """
+    try:
+        id_list = parse_ids(ids)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    return lookup_users(db, id_list)
+
+
+@app.post("/users/lookup", response_model=list[Optional[UserRead]], dependencies=[Depends(require_admin)])
+async def lookup_users_route(lookup: UserLookup, db: Session = Depends(get_read_db)):
+    return lookup_users(db, lookup.ids)
+
+
 @app.get("/users/{user_id}", response_model=UserRead)
-async def read_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+async def read_user(user_id: int, db: Session = Depends(get_read_db)):
+    def load():
+        user = fetch_user_by_id(db, user_id)
+        return render_user(user) if user else None
+
+    # Concurrent reads of the same user share one query; see app/singleflight.py
+    body = await user_flights.do((user_id, id(db.get_bind())), lambda: run_in_threadpool(load))
+    if body is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return Response(content=body, media_type="application/json")
 
 @app.put("/users/me", response_model=UserRead)
-async def update_user_me(user_update: UserUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_user_me(user_update: UserUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user_for_update)):
     if user_update.username:
         # Check if username already exists
         existing_user = db.query(User).filter(User.username == user_update.username).first()
@@ -213,6 +377,7 @@ async def update_user_me(user_update: UserUpdate, db: Session = Depends(get_db),
             raise HTTPException(status_code=400, detail="Email already registered")
         current_user.email = user_update.email
     
+    user_flights.forget(current_user.id)
     try:
         db.commit()
         db.refresh(current_user)
@@ -223,7 +388,7 @@ async def update_user_me(user_update: UserUpdate, db: Session = Depends(get_db),
     return current_user
 
 @app.post("/users/me/password")
-async def change_password(password_change: PasswordChange, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def change_password(password_change: PasswordChange, db: Session = Depends(get_db), current_user: User = Depends(get_current_user_for_update)):
     if not verify_password(password_change.current_password, current_user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect current password")
     
@@ -232,85 +397,256 @@ async def change_password(password_change: PasswordChange, db: Session = Depends
     return {"message": "Password updated successfully"}
 
 @app.get("/calculations", response_model=list[CalculationRead])
-async def read_calculations(skip: int = 0, limit: int = 10, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    calculations = db.query(Calculation).filter(Calculation.user_id == current_user.id).offset(skip).limit(limit).all()
-    return calculations
+async def read_calculations(
+    filters: CalculationFilters = Depends(get_calculation_filters),
+    skip: int = 0,
+    limit: int = 10,
+    after_id: Optional[int] = None,
+    db: Session = Depends(get_calc_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    # Rows are read as plain column tuples and rendered straight to JSON; the
+    # output is the same as response_model would produce from ORM objects.
+    dialect_name = db.get_bind().dialect.name
+    conditions = calculation_conditions(current_user.id, filters, dialect_name, after_id)
+    order = calculation_order(filters, dialect_name)
+
+    # History is in id order across the archive and the live rows
+    if after_id is None and filters.is_empty():
+        def render_page():
+            archived_last = archive.last_id(current_user.id)
+            if archived_last is None:
+                return render_calculations(fetch_page(db, conditions, order, skip, limit))
+            live_first = first_id(db, conditions)
+            if live_first is None or archived_last < live_first:
+                # The usual case: every archived row is older, so pages are
+                # counted through the archive first, then the live rows
+                archived = archive.count(current_user.id)
+                if skip < archived:
+                    calculations = [as_read_row(row, dialect_name) for row in archive.read(current_user.id, skip, limit)]
+                    if len(calculations) < limit:
+                        calculations += fetch_page(db, conditions, order, 0, limit - len(calculations))
+                else:
+                    calculations = fetch_page(db, conditions, order, skip - archived, limit)
+            else:
+                archived = [as_read_row(row, dialect_name) for row in archive.read(current_user.id, 0, skip + limit)]
+                calculations = merge_by_id(archived, fetch_page(db, conditions, order, 0, skip + limit), skip, limit)
+            return render_calculations(calculations)
+
+        if skip == 0:
+            # Concurrent loads of the same first page share one read
+            key = (current_user.id, limit, id(db.get_bind()))
+            body = await calculation_flights.do(key, lambda: run_in_threadpool(render_page))
+        else:
+            body = render_page()
+        return Response(content=body, media_type="application/json")
+
+    # Filtered search and keyset pages: pass the last id of a page as after_id
+    # to get the next one without counting past earlier rows.
+    archived = [as_read_row(row, dialect_name) for row in archive.search(current_user.id, filters, after_id, skip + limit)]
+    if archived:
+        calculations = merge_by_id(archived, fetch_page(db, conditions, order, 0, skip + limit), skip, limit)
+    else:
+        calculations = fetch_page(db, conditions, order, skip, limit)
+    return Response(content=render_calculations(calculations), media_type="application/json")
 
 
 @app.get("/calculations/{calculation_id}", response_model=CalculationRead)
-async def read_calculation(calculation_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def read_calculation(calculation_id: int, db: Session = Depends(get_calc_read_db), current_user: User = Depends(get_current_user)):
     calculation = db.query(Calculation).filter(Calculation.id == calculation_id, Calculation.user_id == current_user.id).first()
+    if not calculation:
+        calculation = archive.get(current_user.id, calculation_id)
+        if calculation:
+            calculation = as_read_row(calculation, db.get_bind().dialect.name)
     if not calculation:
         raise HTTPException(status_code=404, detail="Calculation not found")
     return calculation
 
 
-@app.post("/calculations", response_model=CalculationRead)
-async def create_calculation(calculation_in: CalculationCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    calculation = Calculation(
-        a=calculation_in.a,
-        b=calculation_in.b,
-        type=calculation_in.type,
-        user_id=current_user.id,
-        result=0 # Placeholder, should be calculated
-    )
-    
-    # Calculate result based on type
-    if calculation.type == "Add":
-        calculation.result = calculation.a + calculation.b
-    elif calculation.type == "Subtract":
-        calculation.result = calculation.a - calculation.b
-    elif calculation.type == "Multiply":
-        calculation.result = calculation.a * calculation.b
-    elif calculation.type == "Divide":
-        if calculation.b == 0:
+def calculation_result(calculation_in: CalculationCreate) -> int:
+    a, b = calculation_in.a, calculation_in.b
+    if calculation_in.type == "Add":
+        return a + b
+    elif calculation_in.type == "Subtract":
+        return a - b
+    elif calculation_in.type == "Multiply":
+        return a * b
+    elif calculation_in.type == "Divide":
+        if b == 0:
              raise HTTPException(status_code=400, detail="Cannot divide by zero")
-        calculation.result = calculation.a // calculation.b # Integer division as per model
+        return a // b # Integer division as per model
+
 
-    db.add(calculation)
+@app.post("/calculations", response_model=CalculationRead)
+async def create_calculation(calculation_in: CalculationCreate, db: Session = Depends(get_calc_db), current_user: User = Depends(get_current_user)):
+    statement = (
+        insert(Calculation)
+        .values(
+            a=calculation_in.a,
+            b=calculation_in.b,
+            type=calculation_in.type,
+            result=calculation_result(calculation_in),
+            user_id=current_user.id,
+        )
+        .returning(*READ_COLUMNS)
+    )
+    calculation = db.execute(statement).mappings().one()
+    calculation_flights.forget(current_user.id)
     db.commit()
-    db.refresh(calculation)
     return calculation
 
 
 @app.put("/calculations/{calculation_id}", response_model=CalculationRead)
-async def update_calculation(calculation_id: int, calculation_in: CalculationCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    calculation = db.query(Calculation).filter(Calculation.id == calculation_id, Calculation.user_id == current_user.id).first()
+async def update_calculation(calculation_id: int, calculation_in: CalculationCreate, db: Session = Depends(get_calc_db), current_user: User = Depends(get_current_user)):
+    # The ownership check is part of the UPDATE; no row back means not found
+    statement = (
+        update(Calculation)
+        .where(Calculation.id == calculation_id, Calculation.user_id == current_user.id)
+        .values(
+            a=calculation_in.a,
+            b=calculation_in.b,
+            type=calculation_in.type,
+            result=calculation_result(calculation_in),
+        )
+        .returning(*READ_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    calculation = db.execute(statement).mappings().first()
     if not calculation:
+        db.rollback()
+        if archive.get(current_user.id, calculation_id):
+            raise HTTPException(status_code=409, detail="Calculation is archived and cannot be changed")
         raise HTTPException(status_code=404, detail="Calculation not found")
-
-    calculation.a = calculation_in.a
-    calculation.b = calculation_in.b
-    calculation.type = calculation_in.type
-    
-    # Recalculate result
-    if calculation.type == "Add":
-        calculation.result = calculation.a + calculation.b
-    elif calculation.type == "Subtract":
-        calculation.result = calculation.a - calculation.b
-    elif calculation.type == "Multiply":
-        calculation.result = calculation.a * calculation.b
-    elif calculation.type == "Divide":
-        if calculation.b == 0:
-             raise HTTPException(status_code=400, detail="Cannot divide by zero")
-        calculation.result = calculation.a // calculation.b
-
+    calculation_flights.forget(current_user.id)
     db.commit()
-    db.refresh(calculation)
     return calculation
 
 
+@app.delete("/calculations")
+async def delete_calculations(
+    filters: CalculationFilters = Depends(get_calculation_filters),
+    ids: Optional[str] = None,
+    delete_all: bool = Query(False, alias="all"),
+    db: Session = Depends(get_calc_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Delete calculations by id (`ids=1,2,3`), by the same filters as
+    GET /calculations, or all of them (`all=true`). Archived calculations are
+    deleted too.
+    """
+    calculation_flights.forget(current_user.id)
+    if ids is not None:
+        if not filters.is_empty():
+            raise HTTPException(status_code=400, detail="Pass either ids or filters, not both")
+        try:
+            id_list = [int(part) for part in ids.split(",") if part.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+        deleted = delete_ids(db, current_user.id, id_list)
+        deleted += archive.delete_calculations(current_user.id, ids=id_list)
+    elif filters.is_empty() and not delete_all:
+        raise HTTPException(status_code=400, detail="Pass ids, a filter, or all=true")
+    else:
+        conditions = calculation_conditions(current_user.id, filters, db.get_bind().dialect.name)
+        deleted = delete_matching(db, conditions)
+        deleted += archive.delete_calculations(current_user.id, filters=filters)
+    return {"deleted": deleted}
+
+
 @app.delete("/calculations/{calculation_id}")
-async def delete_calculation(calculation_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    calculation = db.query(Calculation).filter(Calculation.id == calculation_id, Calculation.user_id == current_user.id).first()
-    if not calculation:
+async def delete_calculation(calculation_id: int, db: Session = Depends(get_calc_db), current_user: User = Depends(get_current_user)):
+    calculation_flights.forget(current_user.id)
+    deleted = delete_ids(db, current_user.id, [calculation_id]) or archive.delete_calculations(current_user.id, ids=[calculation_id])
+    if not deleted:
         raise HTTPException(status_code=404, detail="Calculation not found")
-    
-    db.delete(calculation)
-    db.commit()
     return {"message": "Calculation deleted successfully"}
 
 
+# ---------------------------------------------
+# Background jobs (see app/jobs.py)
+# ---------------------------------------------
+
+def job_response(job: Optional[dict], status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Response(content=jobs.render(job), status_code=status_code, media_type="application/json", headers=headers)
+
+
+@app.post("/jobs", response_model=JobRead, status_code=202)
+async def create_job(job_in: JobCreate, current_user: User = Depends(get_current_user)):
+    if len(job_in.calculations) > jobs.JOB_MAX_CALCULATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {jobs.JOB_MAX_CALCULATIONS} calculations per job")
+    calculations = [[c.a, c.b, c.type] for c in job_in.calculations]
+    try:
+        job = await run_in_threadpool(jobs.submit, current_user.id, job_in.kind, calculations, job_in.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    jobs.ensure_dispatcher()
+    return job_response(job, status_code=202, headers={"Location": f"/jobs/{job['id']}"})
+
+
+@app.get("/jobs", response_model=list[JobRead])
+async def read_jobs(current_user: User = Depends(get_current_user)):
+    """The user's 50 most recent jobs, without their results."""
+    rows = jobs.list_jobs(current_user.id)
+    return Response(content=b"[" + b",".join(jobs.render(job) for job in rows) + b"]", media_type="application/json")
+
+
+@app.get("/jobs/{job_id}", response_model=JobRead)
+async def read_job(job_id: int, wait: float = Query(0, ge=0, le=30), current_user: User = Depends(get_current_user)):
+    """A job's status and, once it has succeeded, its result. `wait` long-polls until it finishes."""
+    if wait:
+        return job_response(await jobs.wait_until_finished(job_id, current_user.id, wait))
+    return job_response(jobs.get(job_id, current_user.id))
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: int, current_user: User = Depends(get_current_user)):
+    """Server-sent events with the job's status, until it finishes."""
+    if jobs.get(job_id, current_user.id, with_result=False) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(jobs.events(job_id, current_user.id), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.delete("/jobs/{job_id}", response_model=JobRead)
+async def cancel_job(job_id: int, current_user: User = Depends(get_current_user)):
+    job = jobs.cancel(job_id, current_user.id)
+    if job is not None and job["state"] != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job already {job['state']}")
+    return job_response(job)
+
+
+# ---------------------------------------------
+# Profiler administration (ADMIN_TOKEN)
+# ---------------------------------------------
+
+@app.get("/admin/profiler", dependencies=[Depends(require_admin)])
+async def profiler_status():
+    return profiling.status()
+
+
+@app.post("/admin/profiler", dependencies=[Depends(require_admin)])
+async def start_profiler(window: ProfilerWindow):
+    return profiling.start_window(window.seconds, window.fraction)
+
+
+@app.delete("/admin/profiler", dependencies=[Depends(require_admin)])
+async def stop_profiler():
+    profiling.stop_window()
+    # Profiles of this worker; the others write theirs when their sampler stops
+    return {"files": profiling.flush()}
+
+
+
+@app.get("/admin/coalescing", dependencies=[Depends(require_admin)])
+async def coalescing_stats():
+    """Queries run and saved by request coalescing in this worker."""
+    return singleflight.stats()
+
+
 if __name__ == "__main__":
+    import uvicorn
+
     logger.info("Starting FastAPI server on http://127.0.0.1:8000")
     uvicorn.run(app, host="127.0.0.1", port=8000)
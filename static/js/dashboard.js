@@ -0,0 +1,397 @@
+let token = localStorage.getItem('access_token');
+if (!token) {
+    window.location.href = '/login';
+}
+
+// Access tokens are short-lived: on a 401, exchange the refresh token
+// for a new pair once and retry the request. Refresh tokens are single use,
+// so concurrent 401s share one in-flight refresh instead of each spending
+// the same token (all but the first would fail and log the user out).
+let refreshInFlight = null;
+
+function refreshTokens() {
+    if (!refreshInFlight) {
+        refreshInFlight = exchangeRefreshToken().finally(() => { refreshInFlight = null; });
+    }
+    return refreshInFlight;
+}
+
+async function exchangeRefreshToken() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) return false;
+    const response = await fetch('/users/refresh', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: refreshToken })
+    });
+    if (!response.ok) return false;
+    const data = await response.json();
+    token = data.access_token;
+    localStorage.setItem('access_token', data.access_token);
+    localStorage.setItem('refresh_token', data.refresh_token);
+    return true;
+}
+
+async function authFetch(url, options = {}) {
+    const withAuth = bearer => fetch(url, {
+        ...options,
+        headers: { ...(options.headers || {}), 'Authorization': 'Bearer ' + bearer }
+    });
+    const sentWith = token;
+    let response = await withAuth(sentWith);
+    if (response.status === 401) {
+        // Another request may already have refreshed while this one was out
+        if (token !== sentWith || await refreshTokens()) {
+            response = await withAuth(token);
+        }
+    }
+    return response;
+}
+
+let currentEditingId = null;
+
+// ---------------------------------------------
+// History
+// ---------------------------------------------
+// Loaded calculations are kept in id order in `historyCache.rows`, and
+// `historyCache.byId` points at the same objects. Pages are requested with
+// the last loaded id as after_id; each cursor is fetched at most once.
+// Mutations apply the calculation the API returns to these objects and
+// the table, so the list is never re-fetched.
+const PAGE_SIZE = 200;
+const OVERSCAN = 10;
+
+const historyCache = {
+    rows: [],
+    byId: new Map(),
+    pages: new Map(),     // after_id -> Promise of that page's rows
+    nextCursor: 0,        // after_id of the next page; null when all are loaded
+    rowHeight: 49,        // measured from the first rendered row
+};
+
+function loadNextPage() {
+    const cursor = historyCache.nextCursor;
+    if (cursor === null || historyCache.pages.has(cursor)) return historyCache.pages.get(cursor);
+    const page = authFetch(`/calculations?after_id=${cursor}&limit=${PAGE_SIZE}`).then(async response => {
+        if (!response.ok) {
+            historyCache.pages.delete(cursor);
+            if (response.status === 401) logout();
+            return [];
+        }
+        const calculations = await response.json();
+        for (const calc of calculations) {
+            if (historyCache.byId.has(calc.id)) continue;
+            historyCache.byId.set(calc.id, calc);
+            historyCache.rows.push(calc);
+        }
+        historyCache.nextCursor = calculations.length < PAGE_SIZE ? null : calculations[calculations.length - 1].id;
+        renderHistory();
+        return calculations;
+    });
+    historyCache.pages.set(cursor, page);
+    return page;
+}
+
+function renderRow(calc) {
+    const tr = document.createElement('tr');
+    tr.dataset.id = calc.id;
+    for (const value of [calc.id, calc.a, calc.b, calc.type, calc.result]) {
+        const td = document.createElement('td');
+        td.textContent = value;
+        tr.appendChild(td);
+    }
+    const actions = document.createElement('td');
+    actions.innerHTML = '<button class="edit" data-action="edit">Edit</button> <button class="delete" data-action="delete">Delete</button>';
+    tr.appendChild(actions);
+    return tr;
+}
+
+let renderScheduled = false;
+
+function scheduleRender() {
+    if (renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(() => {
+        renderScheduled = false;
+        renderHistory();
+    });
+}
+
+// Renders only the rows in view (plus OVERSCAN above and below)
+function renderHistory() {
+    const viewport = document.getElementById('historyViewport');
+    const headerHeight = viewport.querySelector('.history-header').offsetHeight;
+    const table = document.getElementById('calculationsTable');
+    const tbody = table.querySelector('tbody');
+    const total = historyCache.rows.length;
+    document.getElementById('historySizer').style.height = (total * historyCache.rowHeight) + 'px';
+
+    const visibleHeight = Math.max(viewport.clientHeight - headerHeight, historyCache.rowHeight);
+    const first = Math.max(0, Math.floor(viewport.scrollTop / historyCache.rowHeight) - OVERSCAN);
+    const last = Math.min(total, Math.ceil((viewport.scrollTop + visibleHeight) / historyCache.rowHeight) + OVERSCAN);
+    const fragment = document.createDocumentFragment();
+    for (let i = first; i < last; i++) {
+        fragment.appendChild(renderRow(historyCache.rows[i]));
+    }
+    tbody.replaceChildren(fragment);
+    table.style.transform = `translateY(${first * historyCache.rowHeight}px)`;
+
+    const measured = tbody.firstElementChild && tbody.firstElementChild.offsetHeight;
+    if (measured && measured !== historyCache.rowHeight) {
+        historyCache.rowHeight = measured;
+        scheduleRender();
+    }
+    document.getElementById('historyStatus').innerText = historyCache.nextCursor === null
+        ? `${total} calculation${total === 1 ? '' : 's'}`
+        : `${total} calculations loaded, scroll for more`;
+    // Near the end of what is loaded: fetch the next page
+    if (historyCache.nextCursor !== null && last >= total - OVERSCAN) {
+        loadNextPage();
+    }
+}
+
+function showCalculation(calc) {
+    const existing = historyCache.byId.get(calc.id);
+    if (existing) {
+        Object.assign(existing, calc);
+        const tr = document.querySelector(`#calculationsTable tbody tr[data-id="${calc.id}"]`);
+        if (tr) tr.replaceWith(renderRow(existing));
+        return;
+    }
+    // New ids are the highest; while later pages are still unloaded the
+    // row arrives with the last page instead.
+    if (historyCache.nextCursor === null) {
+        historyCache.byId.set(calc.id, calc);
+        historyCache.rows.push(calc);
+        renderHistory();
+    }
+}
+
+function removeCalculation(id) {
+    const calc = historyCache.byId.get(id);
+    if (!calc) return;
+    historyCache.byId.delete(id);
+    historyCache.rows.splice(historyCache.rows.indexOf(calc), 1);
+    renderHistory();
+}
+
+document.getElementById('historyViewport').addEventListener('scroll', scheduleRender, { passive: true });
+document.querySelector('#calculationsTable tbody').addEventListener('click', event => {
+    const button = event.target.closest('button[data-action]');
+    if (!button) return;
+    const id = Number(button.closest('tr').dataset.id);
+    if (button.dataset.action === 'edit') startEdit(id);
+    else deleteCalculation(id);
+});
+
+async function addCalculation() {
+    try {
+        const a = document.getElementById('a').value;
+        const b = document.getElementById('b').value;
+        const type = document.getElementById('type').value;
+
+        const response = await authFetch('/calculations', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ a: parseInt(a), b: parseInt(b), type: type })
+        });
+
+        if (response.ok) {
+            showCalculation(await response.json());
+            document.getElementById('message').innerText = 'Calculation added successfully!';
+            document.getElementById('message').style.color = 'green';
+            clearForm();
+        } else {
+            const data = await response.json();
+            document.getElementById('message').innerText = 'Error: ' + (data.error || data.detail);
+            document.getElementById('message').style.color = 'red';
+        }
+    } catch (error) {
+        console.error("Error in addCalculation:", error);
+        document.getElementById('message').innerText = 'Error: ' + error.message;
+        document.getElementById('message').style.color = 'red';
+    }
+}
+
+async function deleteCalculation(id) {
+    if (!confirm('Are you sure you want to delete this calculation?')) return;
+
+    const response = await authFetch('/calculations/' + id, {
+        method: 'DELETE'
+    });
+
+    if (response.ok) {
+        removeCalculation(id);
+        if (currentEditingId === id) cancelEdit();
+    } else {
+        alert('Failed to delete calculation');
+    }
+}
+
+function startEdit(id) {
+    const calc = historyCache.byId.get(id);
+    currentEditingId = id;
+    document.getElementById('a').value = calc.a;
+    document.getElementById('b').value = calc.b;
+    document.getElementById('type').value = calc.type;
+
+    document.querySelector('button[onclick="addCalculation()"]').classList.add('hidden');
+    document.getElementById('updateBtn').classList.remove('hidden');
+    document.getElementById('cancelBtn').classList.remove('hidden');
+    document.querySelector('#addCalculationForm h2').innerText = 'Edit Calculation';
+}
+
+async function submitUpdate() {
+    const a = document.getElementById('a').value;
+    const b = document.getElementById('b').value;
+    const type = document.getElementById('type').value;
+
+    const response = await authFetch('/calculations/' + currentEditingId, {
+        method: 'PUT',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ a: parseInt(a), b: parseInt(b), type: type })
+    });
+
+    if (response.ok) {
+        showCalculation(await response.json());
+        document.getElementById('message').innerText = 'Calculation updated successfully!';
+        document.getElementById('message').style.color = 'green';
+        cancelEdit();
+    } else {
+        const data = await response.json();
+        document.getElementById('message').innerText = 'Error: ' + (data.error || data.detail);
+        document.getElementById('message').style.color = 'red';
+    }
+}
+
+function cancelEdit() {
+    currentEditingId = null;
+    clearForm();
+    document.querySelector('button[onclick="addCalculation()"]').classList.remove('hidden');
+    document.getElementById('updateBtn').classList.add('hidden');
+    document.getElementById('cancelBtn').classList.add('hidden');
+    document.querySelector('#addCalculationForm h2').innerText = 'Add Calculation';
+}
+
+function clearForm() {
+    document.getElementById('a').value = '';
+    document.getElementById('b').value = '';
+    document.getElementById('type').value = 'Add';
+}
+
+function logout() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    // Revoke both tokens server-side; don't wait for the response
+    fetch('/users/logout', {
+        method: 'POST',
+        keepalive: true,
+        headers: { 'Content-Type': 'application/json', 'Authorization': 'Bearer ' + token },
+        body: JSON.stringify({ refresh_token: refreshToken })
+    }).catch(() => {});
+    localStorage.removeItem('access_token');
+    localStorage.removeItem('refresh_token');
+    window.location.href = '/login';
+}
+
+// The profile is loaded once; updates come back in the PUT response
+let currentUser = null;
+
+// Initial load: the first history page and the profile, in parallel
+loadNextPage();
+fetchProfile();
+
+function showProfile(user) {
+    currentUser = user;
+    document.getElementById('profileUsername').value = user.username;
+    document.getElementById('profileEmail').value = user.email;
+    document.getElementById('userInfo').innerText = 'Logged in as: ' + user.username;
+}
+
+function toggleProfile() {
+    const profileSection = document.getElementById('profileSection');
+    const dashboardSection = document.getElementById('dashboardSection');
+    if (profileSection.classList.contains('hidden')) {
+        profileSection.classList.remove('hidden');
+        dashboardSection.classList.add('hidden');
+        if (currentUser) showProfile(currentUser); // Discard unsaved edits
+    } else {
+        profileSection.classList.add('hidden');
+        dashboardSection.classList.remove('hidden');
+        document.getElementById('profileMessage').innerText = '';
+        renderHistory(); // The viewport had no size while hidden
+    }
+}
+
+async function fetchProfile() {
+    try {
+        const response = await authFetch('/users/me');
+        if (response.ok) {
+            showProfile(await response.json());
+            document.getElementById('profileMessage').innerText = ''; // Clear fetching message
+        } else {
+            const errorText = await response.text();
+            console.error("Failed to fetch profile:", response.status, errorText);
+            document.getElementById('profileMessage').innerText = 'Error fetching profile: ' + response.status;
+            document.getElementById('profileMessage').style.color = 'red';
+        }
+    } catch (error) {
+        console.error("Error fetching profile:", error);
+    }
+}
+
+async function updateProfile() {
+    const username = document.getElementById('profileUsername').value;
+    const email = document.getElementById('profileEmail').value;
+
+    const body = {};
+    if (username) body.username = username;
+    if (email) body.email = email;
+
+    const response = await authFetch('/users/me', {
+        method: 'PUT',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(body)
+    });
+
+    const messageEl = document.getElementById('profileMessage');
+    if (response.ok) {
+        showProfile(await response.json());
+        messageEl.innerText = 'Profile updated successfully!';
+        messageEl.style.color = 'green';
+    } else {
+        const data = await response.json();
+        messageEl.innerText = 'Error: ' + (data.error || data.detail);
+        messageEl.style.color = 'red';
+    }
+}
+
+async function changePassword() {
+    const currentPassword = document.getElementById('currentPassword').value;
+    const newPassword = document.getElementById('newPassword').value;
+
+    const response = await authFetch('/users/me/password', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ current_password: currentPassword, new_password: newPassword })
+    });
+
+    const messageEl = document.getElementById('profileMessage');
+    if (response.ok) {
+        messageEl.innerText = 'Password changed successfully!';
+        messageEl.style.color = 'green';
+        document.getElementById('currentPassword').value = '';
+        document.getElementById('newPassword').value = '';
+    } else {
+        const data = await response.json();
+        messageEl.innerText = 'Error: ' + (data.error || data.detail);
+        messageEl.style.color = 'red';
+    }
+}
@@ -0,0 +1,48 @@
+document.getElementById('loginForm').addEventListener('submit', async function (e) {
+    e.preventDefault();
+
+    // Reset errors
+    document.querySelectorAll('.error-message').forEach(el => el.style.display = 'none');
+
+    const email = document.getElementById('email').value;
+    const password = document.getElementById('password').value;
+
+    let isValid = true;
+
+    // Client-side validation
+    const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+    if (!emailRegex.test(email)) {
+        document.getElementById('emailError').style.display = 'block';
+        isValid = false;
+    }
+
+    if (!isValid) return;
+
+    try {
+        const response = await fetch('/users/login', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ email, password })
+        });
+
+        const data = await response.json();
+
+        if (response.ok) {
+            // Store tokens; the refresh token renews the short-lived access token
+            localStorage.setItem('access_token', data.access_token);
+            localStorage.setItem('refresh_token', data.refresh_token);
+            // Redirect to home or dashboard
+            window.location.href = '/';
+        } else {
+            const serverError = document.getElementById('serverError');
+            serverError.innerText = data.detail || 'Login failed';
+            serverError.style.display = 'block';
+        }
+    } catch (error) {
+        const serverError = document.getElementById('serverError');
+        serverError.innerText = 'An error occurred. Please try again.';
+        serverError.style.display = 'block';
+    }
+});
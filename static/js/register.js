@@ -0,0 +1,60 @@
+document.getElementById('registerForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+
+    // Reset errors
+    document.querySelectorAll('.error-message').forEach(el => el.style.display = 'none');
+    document.getElementById('successMessage').style.display = 'none';
+
+    const username = document.getElementById('username').value;
+    const email = document.getElementById('email').value;
+    const password = document.getElementById('password').value;
+    const confirmPassword = document.getElementById('confirmPassword').value;
+
+    let isValid = true;
+
+    // Client-side validation
+    const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+    if (!emailRegex.test(email)) {
+        document.getElementById('emailError').style.display = 'block';
+        isValid = false;
+    }
+
+    if (password.length < 8) {
+        document.getElementById('passwordError').style.display = 'block';
+        isValid = false;
+    }
+
+    if (password !== confirmPassword) {
+        document.getElementById('confirmPasswordError').style.display = 'block';
+        isValid = false;
+    }
+
+    if (!isValid) return;
+
+    try {
+        const response = await fetch('/users/register', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ username, email, password })
+        });
+
+        const data = await response.json();
+
+        if (response.ok) {
+            document.getElementById('successMessage').style.display = 'block';
+            setTimeout(() => {
+                window.location.href = '/login';
+            }, 2000);
+        } else {
+            const serverError = document.getElementById('serverError');
+            serverError.innerText = data.detail || 'Registration failed';
+            serverError.style.display = 'block';
+        }
+    } catch (error) {
+        const serverError = document.getElementById('serverError');
+        serverError.innerText = 'An error occurred. Please try again.';
+        serverError.style.display = 'block';
+    }
+});
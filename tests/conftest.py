@@ -32,6 +32,25 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_
 database.engine = test_engine
 database.SessionLocal = TestingSessionLocal
 
+@pytest.fixture
+def login():
+    """
+    Fixture returning login(username): registers the user (if new), logs in
+    and returns the Authorization headers for API tests.
+    """
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = TestClient(app)
+
+    def login(username, password="password123"):
+        email = f"{username}@example.com"
+        client.post("/users/register", json={"username": username, "email": email, "password": password})
+        token = client.post("/users/login", json={"email": email, "password": password}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    return login
+
 @pytest.fixture(scope='session')
 def fastapi_server():
     """
@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app import archive, database
+from app.models import Calculation
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def setup_archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    database.Base.metadata.create_all(bind=database.engine)
+    yield tmp_path / "archive"
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+def age_calculations(ids, days):
+    with database.engine.begin() as conn:
+        conn.execute(
+            update(Calculation.__table__)
+            .where(Calculation.__table__.c.id.in_(ids))
+            .values(created_at=datetime.utcnow() - timedelta(days=days))
+        )
+
+
+def test_old_calculations_move_to_archive_and_stay_readable(setup_archive, login):
+    headers = login("archiver")
+    created = [
+        client.post("/calculations", headers=headers, json={"a": i, "b": 2, "type": "Multiply"}).json()
+        for i in range(5)
+    ]
+    age_calculations([c["id"] for c in created[:3]], days=400)
+
+    assert archive.run(older_than_days=365) == 3
+    user_id = created[0]["user_id"]
+    parts = archive.list_parts(user_id)
+    assert len(parts) == 1 and parts[0][2] == 3
+    assert parts[0][3].endswith(".arrow")
+
+    # Live rows are gone from the database
+    db = database.SessionLocal()
+    try:
+        assert db.query(Calculation).filter(Calculation.user_id == user_id).count() == 2
+    finally:
+        db.close()
+
+    # The full history still reads in order, across archive and live rows
+    listed = client.get("/calculations?limit=10", headers=headers).json()
+    assert [c["id"] for c in listed] == [c["id"] for c in created]
+    assert listed[0]["result"] == 0 and listed[2]["type"] == "Multiply"
+
+    page = client.get("/calculations?skip=2&limit=2", headers=headers).json()
+    assert [c["id"] for c in page] == [created[2]["id"], created[3]["id"]]
+    page = client.get("/calculations?skip=3&limit=2", headers=headers).json()
+    assert [c["id"] for c in page] == [created[3]["id"], created[4]["id"]]
+
+    archived = client.get(f"/calculations/{created[1]['id']}", headers=headers)
+    assert archived.status_code == 200
+    assert archived.json()["a"] == 1
+
+
+def test_archive_run_is_idempotent(setup_archive, login):
+    headers = login("archiver2")
+    created = [client.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": "Add"}).json() for i in range(2)]
+    age_calculations([c["id"] for c in created], days=400)
+    assert archive.run(older_than_days=365) == 2
+    assert archive.run(older_than_days=365) == 0
+    assert archive.count(created[0]["user_id"]) == 2
+
+
+def test_parts_are_read_by_record_batch(setup_archive, monkeypatch, login):
+    monkeypatch.setattr(archive, "ARCHIVE_BATCH_ROWS", 2)
+    headers = login("archiver3")
+    created = [client.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": "Add"}).json() for i in range(6)]
+    ids = [c["id"] for c in created]
+    age_calculations(ids[:5], days=400)
+    assert archive.run(older_than_days=365) == 5
+    user_id = created[0]["user_id"]
+
+    assert [r["id"] for r in archive.read(user_id, 1, 3)] == ids[1:4]
+    assert archive.get(user_id, ids[3])["a"] == 3
+    assert [r["id"] for r in archive.search(user_id, after_id=ids[2], limit=2)] == ids[3:5]
+
+    # Archived rows serialize exactly like live ones
+    listed = client.get("/calculations?limit=10", headers=headers).json()
+    assert [c["id"] for c in listed] == ids
+    assert {c["created_at"].endswith("Z") for c in listed} == {created[5]["created_at"].endswith("Z")}
+    assert client.get(f"/calculations/{ids[0]}", headers=headers).json()["created_at"] == listed[0]["created_at"]
+
+
+def test_archived_and_live_rows_are_merged_by_id(setup_archive, login):
+    headers = login("archiver4")
+    created = [client.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": "Add"}).json() for i in range(4)]
+    ids = [c["id"] for c in created]
+    # A newer row is archived while older ones stay live
+    age_calculations([ids[2]], days=400)
+    assert archive.run(older_than_days=365) == 1
+
+    assert [c["id"] for c in client.get("/calculations?limit=10", headers=headers).json()] == ids
+    assert [c["id"] for c in client.get("/calculations?skip=1&limit=2", headers=headers).json()] == ids[1:3]
+    assert [c["id"] for c in client.get(f"/calculations?after_id={ids[0]}&limit=2", headers=headers).json()] == ids[1:3]
+
+
+def test_rerun_after_an_interrupted_batch_only_skips_rows_already_archived(setup_archive, login):
+    headers = login("archiver5")
+    created = [client.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": "Add"}).json() for i in range(3)]
+    ids = [c["id"] for c in created]
+    age_calculations(ids, days=400)
+    user_id = created[0]["user_id"]
+    # A previous run wrote the first and last rows, then stopped before deleting them
+    stamp = datetime.now(timezone.utc) - timedelta(days=400)
+    rows = [{**{name: c[name] for name in archive.COLUMNS}, "created_at": stamp} for c in (created[0], created[2])]
+    archive._write_part(user_id, stamp.strftime("%Y-%m"), rows, str(setup_archive))
+
+    assert archive.run(older_than_days=365) == 3
+    assert archive.count(user_id) == 3
+    assert sorted(r["id"] for r in archive.read(user_id, 0, 10)) == ids
+
+
+def test_deleting_all_calculations_removes_archived_rows(setup_archive, login):
+    headers = login("archiver6")
+    created = [client.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": "Add"}).json() for i in range(4)]
+    age_calculations([c["id"] for c in created[:2]], days=400)
+    assert archive.run(older_than_days=365) == 2
+
+    assert client.delete("/calculations?all=true", headers=headers).json() == {"deleted": 4}
+    assert client.get("/calculations?limit=10", headers=headers).json() == []
+    assert client.get(f"/calculations/{created[0]['id']}", headers=headers).status_code == 404
+    assert archive.count(created[0]["user_id"]) == 0
+    # Part files are left as they were
+    assert sum(rows for _, _, rows, _ in archive.list_parts(created[0]["user_id"])) == 2
+
+
+def test_archived_rows_can_be_deleted_one_by_one_and_by_filter(setup_archive, monkeypatch, login):
+    monkeypatch.setattr(archive, "ARCHIVE_BATCH_ROWS", 2)
+    headers = login("archiver7")
+    created = [
+        client.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": "Divide" if i % 2 else "Add"}).json()
+        for i in range(6)
+    ]
+    ids = [c["id"] for c in created]
+    age_calculations(ids[:5], days=400)
+    assert archive.run(older_than_days=365) == 5
+
+    assert client.delete(f"/calculations/{ids[1]}", headers=headers).status_code == 200
+    assert client.get(f"/calculations/{ids[1]}", headers=headers).status_code == 404
+    assert client.delete(f"/calculations/{ids[1]}", headers=headers).status_code == 404
+    assert [c["id"] for c in client.get("/calculations?limit=10", headers=headers).json()] == ids[:1] + ids[2:]
+    assert [c["id"] for c in client.get("/calculations?skip=1&limit=2", headers=headers).json()] == ids[2:4]
+
+    # ids[3] is archived, ids[5] live; ids[1] was deleted already
+    assert client.delete("/calculations?type=Divide", headers=headers).json() == {"deleted": 2}
+    assert [c["id"] for c in client.get("/calculations?limit=10", headers=headers).json()] == [ids[0], ids[2], ids[4]]
+    assert client.get("/calculations?type=Divide", headers=headers).json() == []
+
+
+def test_archived_rows_are_read_only(setup_archive, login):
+    headers = login("archiver8")
+    created = client.post("/calculations", headers=headers, json={"a": 4, "b": 2, "type": "Add"}).json()
+    age_calculations([created["id"]], days=400)
+    assert archive.run(older_than_days=365) == 1
+
+    response = client.put(f"/calculations/{created['id']}", headers=headers, json={"a": 9, "b": 3, "type": "Divide"})
+    assert response.status_code == 409
+    assert "archived" in response.json()["error"]
+    assert client.get(f"/calculations/{created['id']}", headers=headers).json()["result"] == 6
+    assert client.put("/calculations/999999", headers=headers, json={"a": 1, "b": 1, "type": "Add"}).status_code == 404
@@ -0,0 +1,90 @@
+import gzip
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+from app import assets
+from main import app
+
+client = TestClient(app)
+
+
+def test_build_writes_hashed_files_and_a_manifest(tmp_path):
+    static = tmp_path / "static"
+    (static / "js").mkdir(parents=True)
+    (static / "js" / "page.js").write_text("console.log(1);\n")
+    dist = tmp_path / "dist"
+
+    manifest = assets.build(str(static), str(dist))
+    built = manifest["js/page.js"]
+    assert built.startswith("js/page.") and built.endswith(".js") and built != "js/page.js"
+    assert (dist / built).read_text() == "console.log(1);\n"
+    assert gzip.decompress((dist / f"{built}.gz").read_bytes()) == b"console.log(1);\n"
+    assert json.loads((dist / "manifest.json").read_text()) == manifest
+
+    # A changed file gets a new name; the old build stays for pages already rendered
+    (static / "js" / "page.js").write_text("console.log(2);\n")
+    rebuilt = assets.build(str(static), str(dist))["js/page.js"]
+    assert rebuilt != built
+    assert (dist / built).exists()
+
+
+def test_pages_link_fingerprinted_assets():
+    for path, name in [("/", "js/dashboard.js"), ("/login", "js/login.js"), ("/register", "js/register.js")]:
+        html = client.get(path).text
+        assert assets.asset_url(name) in html
+        assert "<script>" not in html and "<style>" not in html
+
+
+def test_assets_are_served_immutable_and_precompressed():
+    url = assets.asset_url("css/auth.css")
+    with open(os.path.join(assets.STATIC_DIR, "css", "auth.css"), "rb") as f:
+        source = f.read()
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert plain.content == source
+    assert plain.headers["cache-control"] == assets.CACHE_CONTROL
+    assert plain.headers["content-type"].startswith("text/css")
+    assert "content-encoding" not in plain.headers
+
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.content == source  # decoded by the client
+    assert int(compressed.headers["content-length"]) < len(source)
+
+    etag = compressed.headers["etag"]
+    assert client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+
+
+def test_accept_encoding_parsing():
+    assert assets._accepts("gzip, br;q=0.5", "br")
+    assert not assets._accepts("gzip, br;q=0", "br")
+    assert not assets._accepts("identity", "gzip")
+
+
+def test_unknown_assets_are_404():
+    assert client.get("/static/js/missing.js").status_code == 404
+
+
+def test_edited_sources_are_rebuilt_outside_production(tmp_path, monkeypatch):
+    static = tmp_path / "static"
+    (static / "css").mkdir(parents=True)
+    (static / "css" / "page.css").write_text("body { color: red; }\n")
+    monkeypatch.setattr(assets, "STATIC_DIR", str(static))
+    monkeypatch.setattr(assets, "DIST_DIR", str(tmp_path / "dist"))
+    monkeypatch.setattr(assets, "_manifest", None)
+
+    first = assets.asset_url("css/page.css")
+    assert assets.asset_url("css/page.css") == first
+    (static / "css" / "page.css").write_text("body { color: blue; }\n")
+    second = assets.asset_url("css/page.css")
+    assert second != first
+    assert assets.is_current(assets.load_manifest(), str(static))
+
+    # Production builds once and never looks at the sources again
+    monkeypatch.setattr(assets, "ASSETS_AUTO_REBUILD", False)
+    (static / "css" / "page.css").write_text("body { color: green; }\n")
+    assert assets.asset_url("css/page.css") == second
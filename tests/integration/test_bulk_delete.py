@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, update
+
+from app import calculation_queries, database
+from app.models import Calculation
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def setup_database():
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+def create(headers, count, type="Add"):
+    return [client.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": type}).json()["id"] for i in range(count)]
+
+
+def remaining(headers):
+    return [c["id"] for c in client.get("/calculations?limit=1000", headers=headers).json()]
+
+
+def test_delete_by_ids_only_touches_own_rows(setup_database, login):
+    headers, other = login("bulk_ids"), login("bulk_other")
+    mine, theirs = create(headers, 5), create(other, 2)
+
+    response = client.delete(f"/calculations?ids={mine[0]},{mine[2]},{theirs[0]},999999", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"deleted": 2}
+    assert remaining(headers) == [mine[1], mine[3], mine[4]]
+    assert remaining(other) == theirs
+
+
+def test_delete_by_filters_in_chunks(setup_database, monkeypatch, login):
+    monkeypatch.setattr(calculation_queries, "DELETE_CHUNK_SIZE", 3)
+    headers = login("bulk_filters")
+    adds, divides = create(headers, 7, "Add"), create(headers, 2, "Divide")
+
+    deletes = []
+    record = lambda conn, cursor, statement, *args: deletes.append(statement) if statement.startswith("DELETE") else None
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        response = client.delete("/calculations?type=Add", headers=headers)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+    assert response.json() == {"deleted": 7}
+    # 3 + 3 + 1 rows, one statement each
+    assert len(deletes) == 3
+    assert remaining(headers) == divides
+
+
+def test_delete_by_date_range(setup_database, login):
+    headers = login("bulk_dates")
+    ids = create(headers, 4)
+    with database.engine.begin() as conn:
+        conn.execute(
+            update(Calculation.__table__)
+            .where(Calculation.__table__.c.id.in_(ids[:3]))
+            .values(created_at=datetime.utcnow() - timedelta(days=30))
+        )
+    until = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    assert client.delete(f"/calculations?until={until}", headers=headers).json() == {"deleted": 3}
+    assert remaining(headers) == ids[3:]
+
+
+def test_delete_needs_explicit_criteria(setup_database, login):
+    headers = login("bulk_all")
+    create(headers, 3)
+    assert client.delete("/calculations", headers=headers).status_code == 400
+    assert client.delete("/calculations?ids=1,x", headers=headers).status_code == 400
+    assert client.delete("/calculations?ids=1&type=Add", headers=headers).status_code == 400
+    assert client.delete("/calculations?all=true", headers=headers).json() == {"deleted": 3}
+    assert remaining(headers) == []
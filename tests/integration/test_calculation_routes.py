@@ -1,6 +1,8 @@
 from fastapi.testclient import TestClient
 from app import database
 from app.models import User, Calculation
+from app.schemas import CalculationRead
+from pydantic import TypeAdapter
 from main import app
 import pytest
 
@@ -145,3 +147,24 @@ def test_user_isolation(setup_database):
     # User 2 tries to delete User 1's calculation
     response = client.delete(f"/calculations/{calc_id1}", headers=headers2)
     assert response.status_code == 404
+
+def test_list_matches_response_model_serialization(setup_database):
+    token = get_auth_token("calcuser_bytes", "calc_bytes@example.com", "password123")
+    headers = {"Authorization": f"Bearer {token}"}
+    for a in range(5):
+        client.post("/calculations", headers=headers, json={"a": a, "b": 3, "type": "Multiply"})
+
+    response = client.get("/calculations?limit=100", headers=headers)
+    assert response.headers["content-type"] == "application/json"
+
+    # What response_model=list[CalculationRead] renders from ORM objects
+    db = database.SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == "calcuser_bytes").first()
+        rows = db.query(Calculation).filter(Calculation.user_id == user.id).order_by(Calculation.id).all()
+        expected = TypeAdapter(list[CalculationRead]).dump_json(
+            TypeAdapter(list[CalculationRead]).validate_python(rows, from_attributes=True)
+        )
+    finally:
+        db.close()
+    assert response.content == expected
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text, update
+
+from app import archive, database
+from app.calculation_queries import calculation_conditions, calculation_order
+from app.models import Calculation
+from app.schemas import CalculationFilters
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def setup_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+def create(headers, a, b, type):
+    return client.post("/calculations", headers=headers, json={"a": a, "b": b, "type": type}).json()
+
+
+def ids(response):
+    assert response.status_code == 200, response.text
+    return [c["id"] for c in response.json()]
+
+
+def test_filter_by_type_and_result_range(setup_database, login):
+    headers = login("searcher")
+    created = [create(headers, i, 2, "Add" if i % 2 else "Multiply") for i in range(10)]
+    adds = [c["id"] for c in created if c["type"] == "Add"]
+
+    assert ids(client.get("/calculations?type=Add&limit=100", headers=headers)) == adds
+    wanted = [c["id"] for c in created if 5 <= c["result"] <= 10]
+    assert ids(client.get("/calculations?min_result=5&max_result=10&limit=100", headers=headers)) == wanted
+    both = [c["id"] for c in created if c["type"] == "Multiply" and c["result"] >= 8]
+    assert ids(client.get("/calculations?type=Multiply&min_result=8&limit=100", headers=headers)) == both
+
+
+def test_invalid_type_filter_is_rejected(setup_database, login):
+    headers = login("badfilter")
+    response = client.get("/calculations?type=Modulo", headers=headers)
+    assert response.status_code == 400
+
+
+def test_created_at_window(setup_database, login):
+    headers = login("windowed")
+    created = [create(headers, i, 1, "Add") for i in range(4)]
+    with database.engine.begin() as conn:
+        conn.execute(
+            update(Calculation.__table__)
+            .where(Calculation.__table__.c.id.in_([c["id"] for c in created[:2]]))
+            .values(created_at=datetime.utcnow() - timedelta(days=10))
+        )
+    since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    until = (datetime.utcnow() - timedelta(days=5)).isoformat()
+    assert ids(client.get(f"/calculations?since={since}", headers=headers)) == [c["id"] for c in created[2:]]
+    assert ids(client.get(f"/calculations?until={until}", headers=headers)) == [c["id"] for c in created[:2]]
+
+
+def test_keyset_pages_walk_the_filtered_history(setup_database, login):
+    headers = login("pager")
+    created = [create(headers, i, 1, "Subtract" if i % 3 == 0 else "Add") for i in range(12)]
+    wanted = [c["id"] for c in created if c["type"] == "Subtract"]
+
+    seen, after_id = [], None
+    while True:
+        url = "/calculations?type=Subtract&limit=2" + (f"&after_id={after_id}" if after_id else "")
+        page = ids(client.get(url, headers=headers))
+        if not page:
+            break
+        seen += page
+        after_id = page[-1]
+    assert seen == wanted
+
+
+def test_filters_cover_archived_rows(setup_database, login):
+    headers = login("archsearch")
+    created = [create(headers, i, 1, "Add" if i % 2 else "Divide") for i in range(6)]
+    with database.engine.begin() as conn:
+        conn.execute(
+            update(Calculation.__table__)
+            .where(Calculation.__table__.c.id.in_([c["id"] for c in created[:4]]))
+            .values(created_at=datetime.utcnow() - timedelta(days=400))
+        )
+    assert archive.run(older_than_days=365) == 4
+
+    adds = [c["id"] for c in created if c["type"] == "Add"]
+    assert ids(client.get("/calculations?type=Add", headers=headers)) == adds
+    # Keyset paging crosses from the archive into live rows
+    first = ids(client.get("/calculations?type=Add&limit=2", headers=headers))
+    rest = ids(client.get(f"/calculations?type=Add&limit=2&after_id={first[-1]}", headers=headers))
+    assert first + rest == adds
+    since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    assert ids(client.get(f"/calculations?since={since}", headers=headers)) == [c["id"] for c in created[4:]]
+
+
+@pytest.mark.parametrize("filters,after_id,index", [
+    (CalculationFilters(type="Add"), 0, "ix_calculations_user_id_type_code_id"),
+    (CalculationFilters(since=datetime(2024, 1, 1)), None, "ix_calculations_user_id_created_at"),
+    (CalculationFilters(), 0, "ix_calculations_user_id_id"),
+])
+def test_query_plan_uses_composite_index(setup_database, filters, after_id, index):
+    query = (
+        select(Calculation.id)
+        .where(*calculation_conditions(1, filters, "sqlite", after_id))
+        .order_by(calculation_order(filters, "sqlite"))
+        .limit(10)
+    )
+    sql = str(query.compile(database.engine, compile_kwargs={"literal_binds": True}))
+    with database.engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert index in plan
@@ -0,0 +1,171 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, jobs
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def setup_database():
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    """A fresh queue file, small chunks and fast polling."""
+    jobs.shutdown()
+    monkeypatch.setattr(jobs, "JOB_DB_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(jobs, "JOB_CHUNK_SIZE", 2)
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.05)
+    yield
+    jobs.shutdown()
+
+
+def calculations(n):
+    return [{"a": i, "b": 2, "type": "Multiply"} for i in range(n)]
+
+
+def test_batch_job_runs_in_the_pool(setup_database, queue, login):
+    headers = login("jobs_batch")
+    big = 10 ** 1000
+    response = client.post("/jobs", headers=headers, json={
+        "kind": "batch",
+        "calculations": calculations(5) + [{"a": big, "b": big, "type": "Multiply"}, {"a": 7, "b": 2, "type": "Divide"}],
+    })
+    assert response.status_code == 202
+    job = response.json()
+    assert job["state"] == "queued"
+    assert job["total"] == 7
+    assert response.headers["location"] == f"/jobs/{job['id']}"
+
+    finished = client.get(f"/jobs/{job['id']}?wait=30", headers=headers).json()
+    assert finished["state"] == "succeeded"
+    assert finished["done"] == 7
+    # Integers longer than json.loads accepts still come back exact
+    raw = client.get(f"/jobs/{job['id']}", headers=headers).content
+    assert str(big * big).encode() in raw
+    assert finished["result"][:5] == [0, 2, 4, 6, 8]
+    assert finished["result"][-1] == 3
+
+    assert client.delete(f"/jobs/{job['id']}", headers=headers).status_code == 409
+    assert [j["id"] for j in client.get("/jobs", headers=headers).json()] == [job["id"]]
+    assert client.get(f"/jobs/{job['id']}", headers=login("jobs_other")).status_code == 404
+
+
+def test_import_job_stores_calculations(setup_database, queue, login):
+    headers = login("jobs_import")
+    job = client.post("/jobs", headers=headers, json={"kind": "import", "calculations": calculations(5)}).json()
+
+    events = []
+    with client.stream("GET", f"/jobs/{job['id']}/events", headers=headers) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[len("data: "):]))
+    assert events[-1]["state"] == "succeeded"
+    assert events[-1]["result"] == {"imported": 5, "errors": []}
+    done = [event["done"] for event in events]
+    assert done == sorted(done)
+
+    stored = client.get("/calculations", headers=headers).json()
+    assert sorted(c["result"] for c in stored) == [0, 2, 4, 6, 8]
+
+
+def test_queued_jobs_can_be_cancelled(setup_database, queue, login):
+    headers = login("jobs_cancel")
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    # Queued directly, so no dispatcher picks it up
+    job = jobs.submit(user_id, "batch", [[1, 2, "Add"]])
+
+    response = client.delete(f"/jobs/{job['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["state"] == "cancelled"
+    # Cancelling again changes nothing
+    assert client.delete(f"/jobs/{job['id']}", headers=headers).json()["state"] == "cancelled"
+    assert client.delete(f"/jobs/{job['id']}", headers=login("jobs_cancel_other")).status_code == 404
+
+
+def test_claims_follow_priority_and_concurrency_limits(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_CONCURRENCY", 2)
+    monkeypatch.setattr(jobs, "JOB_USER_CONCURRENCY", 1)
+    low = jobs.submit(1, "batch", [[1, 1, "Add"]], priority=1)
+    high = jobs.submit(1, "batch", [[1, 1, "Add"]], priority=9)
+    other_user = jobs.submit(2, "batch", [[1, 1, "Add"]], priority=5)
+    third_user = jobs.submit(3, "batch", [[1, 1, "Add"]], priority=5)
+
+    engine = jobs.get_engine()
+    with engine.begin() as conn:
+        claimed = [jobs.claim_next(conn) for _ in range(3)]
+    # User 1's high priority job, then user 2's; user 1's second job waits
+    # for its first, and the host-wide limit of 2 stops user 3's
+    assert [job and job["id"] for job in claimed] == [high["id"], other_user["id"], None]
+
+    with engine.begin() as conn:
+        assert jobs.requeue_stale(conn, owner=jobs.OWNER) == 2
+        assert jobs.claim_next(conn)["id"] == high["id"]
+    assert jobs.get(low["id"], 1)["state"] == "queued"
+    assert jobs.get(third_user["id"], 3)["state"] == "queued"
+
+
+def test_jobs_are_validated(setup_database, queue, monkeypatch, login):
+    headers = login("jobs_invalid")
+    assert client.post("/jobs", headers=headers, json={"kind": "shell", "calculations": []}).status_code == 400
+    assert client.post("/jobs", headers=headers, json={"kind": "batch", "calculations": [{"a": 1, "b": 0, "type": "Divide"}]}).status_code == 400
+    monkeypatch.setattr(jobs, "JOB_MAX_CALCULATIONS", 3)
+    response = client.post("/jobs", headers=headers, json={"kind": "batch", "calculations": calculations(4)})
+    assert response.status_code == 400
+    assert client.post("/jobs", json={"kind": "batch", "calculations": []}).status_code == 401
+
+
+def test_imports_whose_operands_do_not_fit_an_integer_column_are_rejected(setup_database, queue, login):
+    headers = login("jobs_overflow")
+    response = client.post("/jobs", headers=headers, json={"kind": "import", "calculations": calculations(4) + [{"a": 10 ** 30, "b": 1, "type": "Add"}]})
+    assert response.status_code == 400
+    assert client.get("/jobs", headers=headers).json() == []
+    assert client.get("/calculations", headers=headers).json() == []
+    # A batch only returns its results, so they may be any size
+    response = client.post("/jobs", headers=headers, json={"kind": "batch", "calculations": [{"a": 10 ** 30, "b": 1, "type": "Add"}]})
+    assert response.status_code == 202
+
+
+def test_a_chunk_stored_before_a_restart_is_not_stored_again(setup_database, queue, login):
+    headers = login("jobs_resume")
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    job = jobs.submit(user_id, "import", [[1, 2, "Add"], [3, 4, "Add"], [5, 6, "Add"]])
+    with jobs.get_engine().begin() as conn:
+        running = jobs._Running(jobs.claim_next(conn))
+    # The first chunk was stored, but the worker died before recording progress
+    rows, errors = jobs._import_rows(running, running.next_chunk(), [3, 7])
+    assert errors == []
+    assert jobs._store_calculations(running, rows)
+    with jobs.get_engine().begin() as conn:
+        assert jobs.requeue_stale(conn, owner=jobs.OWNER) == 1
+
+    jobs.ensure_dispatcher()
+    finished = client.get(f"/jobs/{job['id']}?wait=30", headers=headers).json()
+    assert finished["state"] == "succeeded"
+    assert sorted(c["result"] for c in client.get("/calculations", headers=headers).json()) == [3, 7, 11]
+
+
+def test_import_rows_whose_result_does_not_fit_are_reported_per_row(setup_database, queue, login):
+    headers = login("jobs_overflow_result")
+    low, high = jobs.integer_bounds()
+    rows = calculations(3) + [{"a": high, "b": 2, "type": "Multiply"}, {"a": 5, "b": 1, "type": "Add"}, {"a": low, "b": 1, "type": "Subtract"}]
+    # The results are computed by the pool, not while the request is served
+    response = client.post("/jobs", headers=headers, json={"kind": "import", "calculations": rows})
+    assert response.status_code == 202
+
+    finished = client.get(f"/jobs/{response.json()['id']}?wait=30", headers=headers).json()
+    assert finished["state"] == "succeeded"
+    assert finished["done"] == 6
+    assert finished["result"]["imported"] == 4
+    assert [error["index"] for error in finished["result"]["errors"]] == [3, 5]
+    assert str(high * 2) in finished["result"]["errors"][0]["error"]
+    assert sorted(c["result"] for c in client.get("/calculations", headers=headers).json()) == [0, 2, 4, 6]
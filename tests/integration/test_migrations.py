@@ -0,0 +1,197 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app import migrations
+from app.models import CALCULATION_TYPE_CODES, Calculation
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_fresh_database_has_no_version(engine):
+    assert migrations.current_version(engine) is None
+
+
+def test_migrate_applies_all_migrations_once(engine):
+    applied = migrations.migrate(engine)
+    assert applied == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.current_version(engine) == migrations.LATEST_VERSION
+
+    # Running again is a no-op
+    assert migrations.migrate(engine) == []
+
+    inspector = inspect(engine)
+    assert {"users", "calculations", "schema_version"} <= set(inspector.get_table_names())
+    index_names = {ix["name"] for ix in inspector.get_indexes("calculations")}
+    assert "ix_calculations_user_id_id" in index_names
+
+
+def test_migrations_are_idempotent_on_existing_tables(engine):
+    # Databases created by the old create_all() startup have tables but no version
+    migrations.Base.metadata.create_all(bind=engine)
+    assert migrations.migrate(engine) == [m.version for m in migrations.MIGRATIONS]
+
+
+def test_ensure_schema_refuses_outdated_schema_without_auto_migrate(engine):
+    with pytest.raises(RuntimeError, match="app.migrations upgrade"):
+        migrations.ensure_schema(engine, auto_migrate=False)
+
+
+def test_ensure_schema_migrates_then_takes_fast_path(engine):
+    assert migrations.ensure_schema(engine) == migrations.LATEST_VERSION
+    assert migrations.ensure_schema(engine, auto_migrate=False) == migrations.LATEST_VERSION
+
+
+def create_version_4_schema(engine, types):
+    """A database last migrated before calculation types became codes."""
+    migrations.version_metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50), email VARCHAR(255), password_hash VARCHAR(255), created_at DATETIME)"))
+        conn.execute(text(
+            "CREATE TABLE calculations (id INTEGER PRIMARY KEY, a INTEGER NOT NULL, b INTEGER NOT NULL, "
+            "type VARCHAR NOT NULL, result INTEGER NOT NULL, user_id INTEGER NOT NULL REFERENCES users (id), "
+            "created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_calculations_user_id_id ON calculations (user_id, id)"))
+        conn.execute(text("CREATE INDEX ix_calculations_user_id_type_id ON calculations (user_id, type, id)"))
+        conn.execute(text("CREATE TABLE revoked_tokens (id INTEGER PRIMARY KEY, jti VARCHAR(64) UNIQUE NOT NULL, expires_at DATETIME NOT NULL, revoked_at DATETIME)"))
+        conn.execute(text("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'old', 'old@example.com', 'x')"))
+        for i, type in enumerate(types):
+            conn.execute(text("INSERT INTO calculations (a, b, type, result, user_id) VALUES (:a, 1, :type, 0, 1)"), {"a": i, "type": type})
+        for m in migrations.MIGRATIONS:
+            if m.version <= 4:
+                conn.execute(migrations.schema_version.insert().values(version=m.version, description=m.description))
+
+
+def test_type_strings_are_converted_to_codes_in_batches(engine, monkeypatch):
+    types = ["Add", "Subtract", "Multiply", "Divide", "Add", "Divide", "Multiply"]
+    create_version_4_schema(engine, types)
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH_SIZE", 2)
+
+    # upgrade holds back the contract step, which drops the old column
+    assert migrations.migrate(engine) == [5, 7]
+    assert migrations.ensure_schema(engine, auto_migrate=False) == 7
+    assert migrations.migrate(engine, contract=True) == [6]
+
+    inspector = inspect(engine)
+    assert {c["name"] for c in inspector.get_columns("calculations")} >= {"type_code"}
+    assert "type" not in {c["name"] for c in inspector.get_columns("calculations")}
+    index_names = {ix["name"] for ix in inspector.get_indexes("calculations")}
+    assert "ix_calculations_user_id_type_code_id" in index_names
+    assert "ix_calculations_user_id_type_id" not in index_names
+
+    with engine.connect() as conn:
+        codes = conn.execute(text("SELECT type_code FROM calculations ORDER BY id")).scalars().all()
+        lookup = dict(conn.execute(text("SELECT id, name FROM calculation_types")).all())
+        triggers = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars().all()
+    assert [lookup[code] for code in codes] == types
+    assert triggers == []
+
+    # The ORM still reads and filters by the operation names
+    session = sessionmaker(bind=engine)()
+    try:
+        rows = session.query(Calculation).filter(Calculation.type == "Divide").order_by(Calculation.id).all()
+        assert [(c.a, c.type) for c in rows] == [(3, "Divide"), (5, "Divide")]
+    finally:
+        session.close()
+
+
+def test_old_and_new_workers_share_the_expanded_schema(engine):
+    create_version_4_schema(engine, ["Add"])
+    assert migrations.migrate(engine) == [5, 7]
+
+    # A new worker writes only type_code, an old one only type
+    session = sessionmaker(bind=engine)()
+    try:
+        session.add(Calculation(a=1, b=2, type="Multiply", result=2, user_id=1))
+        session.commit()
+        session.query(Calculation).filter(Calculation.a == 0).update({"type": "Subtract"})
+        session.commit()
+    finally:
+        session.close()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO calculations (a, b, type, result, user_id) VALUES (2, 1, 'Divide', 2, 1)"))
+        conn.execute(text("UPDATE calculations SET type = 'Add' WHERE a = 1"))
+        rows = conn.execute(text("SELECT a, type, type_code FROM calculations ORDER BY a")).all()
+        assert conn.execute(text("PRAGMA integrity_check")).scalar() == "ok"
+    codes = CALCULATION_TYPE_CODES
+    assert rows == [(0, "Subtract", codes["Subtract"]), (1, "Add", codes["Add"]), (2, "Divide", codes["Divide"])]
+
+
+def create_baseline_schema(engine):
+    """A database created by the old create_all() startup: tables, no versions."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE users (id INTEGER NOT NULL PRIMARY KEY, username VARCHAR(50) NOT NULL, "
+            "email VARCHAR(255) NOT NULL, password_hash VARCHAR(255) NOT NULL, "
+            "created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL)"
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX ix_users_username ON users (username)"))
+        conn.execute(text("CREATE UNIQUE INDEX ix_users_email ON users (email)"))
+        conn.execute(text(
+            "CREATE TABLE calculations (id INTEGER NOT NULL PRIMARY KEY, a INTEGER NOT NULL, b INTEGER NOT NULL, "
+            "type VARCHAR NOT NULL, result INTEGER NOT NULL, user_id INTEGER NOT NULL REFERENCES users (id), "
+            "created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_calculations_id ON calculations (id)"))
+        conn.execute(text("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'old', 'old@example.com', 'x')"))
+        conn.execute(text("INSERT INTO calculations (a, b, type, result, user_id) VALUES (6, 3, 'Divide', 2, 1)"))
+
+
+def test_baseline_databases_keep_the_legacy_column_until_contract(engine):
+    create_baseline_schema(engine)
+    assert migrations.migrate(engine) == [1, 2, 3, 4, 5, 7]
+    assert "type" in {c["name"] for c in inspect(engine).get_columns("calculations")}
+
+    # Baseline workers still write `type` during the rolling deploy
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO calculations (a, b, type, result, user_id) VALUES (2, 3, 'Add', 5, 1)"))
+        rows = conn.execute(text("SELECT a, type, type_code FROM calculations ORDER BY id")).all()
+    assert rows == [(6, "Divide", CALCULATION_TYPE_CODES["Divide"]), (2, "Add", CALCULATION_TYPE_CODES["Add"])]
+
+    assert migrations.migrate(engine, contract=True) == [6]
+    assert "type" not in {c["name"] for c in inspect(engine).get_columns("calculations")}
+
+
+def test_new_databases_get_the_type_lookup_table(engine):
+    migrations.migrate(engine)
+    with engine.connect() as conn:
+        lookup = dict(conn.execute(text("SELECT name, id FROM calculation_types")).all())
+    assert lookup == CALCULATION_TYPE_CODES
+
+
+MIGRATE_SCRIPT = """
+import sys
+from sqlalchemy import create_engine
+from app import migrations
+sys.stdin.read()  # start together
+migrations.migrate(create_engine(sys.argv[1]))
+"""
+
+
+def test_concurrent_migrations_on_sqlite_are_serialized(engine):
+    url = str(engine.url)
+    env = dict(os.environ, DATABASE_URL=url)
+    procs = [
+        subprocess.Popen([sys.executable, "-c", MIGRATE_SCRIPT, url], stdin=subprocess.PIPE,
+                         stderr=subprocess.PIPE, env=env, text=True)
+        for _ in range(6)
+    ]
+    for proc in procs:
+        proc.stdin.close()
+    for proc in procs:
+        assert proc.wait(timeout=60) == 0, proc.stderr.read()
+        proc.stderr.close()
+    assert migrations.current_version(engine) == migrations.LATEST_VERSION
+    with engine.connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_version")).scalars().all()
+    assert sorted(versions) == [m.version for m in migrations.MIGRATIONS]
@@ -0,0 +1,75 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.operation_cache import CACHE_CONTROL, canonical_number, operation_cache
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    operation_cache.clear()
+    yield
+    operation_cache.clear()
+
+
+@pytest.mark.parametrize("path,expected", [("add", 15.0), ("subtract", 5.0), ("multiply", 50.0), ("divide", 2.0)])
+def test_get_matches_post(path, expected):
+    response = client.get(f"/{path}?a=10&b=5")
+    assert response.status_code == 200
+    assert response.json() == {"result": expected}
+    assert response.content == client.post(f"/{path}", json={"a": 10, "b": 5}).content
+    assert response.headers["cache-control"] == CACHE_CONTROL
+    assert response.headers["etag"].startswith('"')
+
+
+def test_non_canonical_queries_redirect_to_the_canonical_url():
+    for query in ["b=5&a=10", "a=10.0&b=5", "a=10&b=5&x=1", "a=1e1&b=5.00"]:
+        response = client.get(f"/add?{query}", follow_redirects=False)
+        assert response.status_code == 301
+        assert response.headers["location"] == "/add?a=10&b=5"
+        assert response.headers["cache-control"] == CACHE_CONTROL
+    assert client.get("/add?b=5&a=10").json() == {"result": 15.0}
+
+
+def test_canonical_numbers_round_trip():
+    for value in [10.0, 0.1, -0.0, 1e16, 1.5e-7, -3.25]:
+        assert float(canonical_number(value)) == value
+    assert canonical_number(-0.0) == "-0"
+    assert client.get("/multiply?a=1e%2B16&b=2", follow_redirects=False).status_code == 200
+
+
+def test_if_none_match_gets_304():
+    first = client.get("/add?a=1&b=2")
+    etag = first.headers["etag"]
+    # Once from the route, once from the in-process cache
+    for _ in range(2):
+        response = client.get("/add?a=1&b=2", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        operation_cache.clear()
+    assert client.get("/add?a=1&b=2", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_hits_are_served_from_the_cache():
+    first = client.get("/divide?a=1&b=3")
+    hits = operation_cache.hits
+    second = client.get("/divide?a=1&b=3")
+    assert operation_cache.hits == hits + 1
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.headers["content-type"] == "application/json"
+
+
+def test_errors_are_not_cached():
+    response = client.get("/divide?a=1&b=0")
+    assert response.status_code == 400
+    assert response.json() == {"error": "Cannot divide by zero!"}
+    assert "cache-control" not in response.headers
+    assert len(operation_cache) == 0
+
+    assert client.get("/add?a=x&b=1").status_code == 400
+    assert client.get("/add?a=nan&b=1").status_code == 400
+    assert client.get("/add?a=1").status_code == 400
@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, password_hashing
+from app.models import User
+from app.security import get_pwd_context, hash_password, rehash_password
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def setup_database():
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+@pytest.fixture
+def rounds(monkeypatch):
+    """Changes the configured pbkdf2 cost, as a restart with new settings would."""
+    def configure(value):
+        monkeypatch.setitem(password_hashing.SETTINGS, "pbkdf2_sha256", {"rounds": value})
+        get_pwd_context.cache_clear()
+
+    yield configure
+    get_pwd_context.cache_clear()
+
+
+def stored_hash(email):
+    db = database.SessionLocal()
+    try:
+        return db.query(User).filter(User.email == email).one().password_hash
+    finally:
+        db.close()
+
+
+def login(email, password="password123"):
+    return client.post("/users/login", json={"email": email, "password": password})
+
+
+def test_login_upgrades_hashes_made_with_another_cost(setup_database, rounds):
+    rounds(1000)
+    client.post("/users/register", json={"username": "rehash_user", "email": "rehash@example.com", "password": "password123"})
+    assert stored_hash("rehash@example.com").startswith("$pbkdf2-sha256$1000$")
+
+    rounds(2000)
+    assert login("rehash@example.com").status_code == 200
+    upgraded = stored_hash("rehash@example.com")
+    assert upgraded.startswith("$pbkdf2-sha256$2000$")
+
+    # Already current: the hash is left alone
+    assert login("rehash@example.com").status_code == 200
+    assert stored_hash("rehash@example.com") == upgraded
+    assert login("rehash@example.com", "wrong-password").status_code == 401
+
+
+def test_rehash_does_not_overwrite_a_newer_password(setup_database, rounds):
+    rounds(1000)
+    client.post("/users/register", json={"username": "rehash_race", "email": "race@example.com", "password": "password123"})
+    old_hash = stored_hash("race@example.com")
+    db = database.SessionLocal()
+    user = db.query(User).filter(User.email == "race@example.com").one()
+    user.password_hash = hash_password("changed-password")
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    rounds(2000)
+    rehash_password(user_id, old_hash, "password123")
+    assert login("race@example.com", "changed-password").status_code == 200
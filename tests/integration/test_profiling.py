@@ -0,0 +1,101 @@
+import marshal
+import os
+import pstats
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, profiling, security
+from main import app
+
+client = TestClient(app)
+
+ADMIN = {"X-Admin-Token": "s3cret"}
+
+
+@pytest.fixture(scope="module")
+def setup_database():
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 1)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_CONTROL_FILE", str(tmp_path / "control.json"))
+    profiling.reset()
+    yield tmp_path
+    profiling.wait_for_sampler()
+    profiling.reset()
+    profiling._refresh_control(0)
+
+
+def register(username):
+    client.post("/users/register", json={"username": username, "email": f"{username}@example.com", "password": "password123"})
+    return {"email": f"{username}@example.com", "password": "password123"}
+
+
+def test_admin_routes_need_the_admin_token(setup_database, profiler, monkeypatch):
+    assert client.get("/admin/profiler").status_code == 403
+    assert client.get("/admin/profiler", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/profiler", headers=ADMIN).status_code == 200
+
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "")
+    assert client.get("/admin/profiler", headers=ADMIN).status_code == 404
+
+
+def test_header_profiles_a_single_request_by_route(setup_database, profiler):
+    credentials = register("profiled")
+    headers = {"X-Profile": "1", **ADMIN}
+    for _ in range(3):
+        assert client.post("/users/login", json=credentials, headers=headers).status_code == 200
+    # Without the admin token the header is ignored
+    client.post("/users/login", json=credentials, headers={"X-Profile": "1"})
+    profiling.wait_for_sampler()
+
+    files = sorted(os.listdir(profiler / "requests"))
+    assert files == [f"POST_users_login.{os.getpid()}.collapsed", f"POST_users_login.{os.getpid()}.pstats"]
+    collapsed = (profiler / "requests" / files[0]).read_text()
+    assert "login_user (main.py:" in collapsed
+    stats = pstats.Stats(str(profiler / "requests" / files[1]))
+    assert any(name == "verify_password" for _, _, name in stats.stats)
+
+
+def test_window_reaches_workers_through_the_control_file(setup_database, profiler):
+    response = client.post("/admin/profiler", json={"seconds": 60, "fraction": 1}, headers=ADMIN)
+    assert response.status_code == 200
+    session = response.json()["session"]
+
+    # Another worker sees the window on its next check of the control file
+    profiling._refresh_control(0)
+    assert profiling.active_window()["session"] == session
+
+    credentials = register("windowed")
+    for _ in range(3):
+        client.post("/users/login", json=credentials)
+    assert client.get("/admin/profiler", headers=ADMIN).json()["window"]["session"] == session
+
+    files = client.delete("/admin/profiler", headers=ADMIN).json()["files"]
+    assert any(f.endswith(".collapsed") and "POST_users_login" in f for f in files)
+    assert all(os.path.dirname(f) == str(profiler / session) for f in files)
+    assert profiling.active_window() is None
+
+
+def test_pstats_data_from_samples():
+    main = ("main.py", 1, "main")
+    work = ("app.py", 10, "work")
+    leaf = ("app.py", 20, "leaf")
+    stacks = Counter({(main, work, leaf): 3, (main, work): 1})
+    data = marshal.loads(marshal.dumps(profiling.pstats_data(stacks, 0.01)))
+
+    cc, nc, tt, ct, callers = data[work]
+    assert (cc, nc) == (4, 4)
+    assert tt == pytest.approx(0.01)
+    assert ct == pytest.approx(0.04)
+    assert callers[main][:2] == (4, 4)
+    assert data[leaf][2] == pytest.approx(0.03)
+    assert profiling.collapsed(stacks).splitlines()[0] == "main (main.py:1);work (app.py:10) 1"
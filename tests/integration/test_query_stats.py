@@ -0,0 +1,75 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import database, query_stats
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def setup_database():
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+def server_timing_count(response):
+    header = response.headers["server-timing"]
+    assert header.startswith("db;dur=")
+    return int(header.split('desc="')[1].split()[0])
+
+
+def test_server_timing_counts_the_requests_queries(setup_database, login):
+    headers = login("stats_user")
+    # User lookup, two uniqueness checks and the UPDATE
+    response = client.put("/users/me", headers=headers, json={"username": "stats_user2", "email": "stats_user2@example.com"})
+    assert response.status_code == 200
+    assert server_timing_count(response) >= 4
+
+    assert server_timing_count(client.post("/add", json={"a": 1, "b": 2})) == 0
+
+
+def test_repeated_statements_are_flagged_as_n_plus_one():
+    stats = query_stats.QueryStats()
+    stats.statements.update(["SELECT a FROM t WHERE id = ?"] * 6 + ["SELECT 1"])
+    assert stats.repeated(5) == [("SELECT a FROM t WHERE id = ?", 6)]
+
+
+def test_n_plus_one_warning_names_the_route(setup_database, caplog, login):
+    headers = login("stats_loop")
+    for a in range(3):
+        client.post("/calculations", headers=headers, json={"a": a, "b": 1, "type": "Add"})
+    ids = [c["id"] for c in client.get("/calculations", headers=headers).json()]
+    with caplog.at_level(logging.WARNING, logger="app.query_stats"):
+        # The bulk delete runs one DELETE for all ids
+        client.delete(f"/calculations?ids={','.join(map(str, ids))}", headers=headers)
+    assert not any("N+1" in r.message for r in caplog.records)
+
+    original = query_stats.N_PLUS_ONE_THRESHOLD
+    query_stats.N_PLUS_ONE_THRESHOLD = 1
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.query_stats"):
+            client.get("/calculations", headers=headers)
+    finally:
+        query_stats.N_PLUS_ONE_THRESHOLD = original
+    assert any("Possible N+1 query in GET /calculations" in r.message for r in caplog.records)
+
+
+def test_slow_queries_are_logged_with_parameter_shape(setup_database, caplog, monkeypatch):
+    monkeypatch.setattr(query_stats, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="app.slow_queries"):
+        with database.engine.connect() as conn:
+            conn.execute(text("SELECT :name, :age"), {"name": "secret-value", "age": 42})
+    [record] = [r for r in caplog.records if r.name == "app.slow_queries"]
+    assert "SELECT ?, ?" in record.message
+    assert "parameters=['str', 'int']" in record.message
+    assert "secret-value" not in record.message
+
+
+def test_parameter_shape_of_executemany():
+    shape = query_stats.parameter_shape([{"a": 1, "b": "x"}, {"a": 2, "b": "y"}], executemany=True)
+    assert shape == {"rows": 2, "each": {"a": "int", "b": "str"}}
@@ -0,0 +1,77 @@
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from main import app
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """A file-based SQLite primary with one replica copied from it."""
+    primary_path = tmp_path / "primary.db"
+    replica_path = tmp_path / "replica.db"
+    primary = create_engine(f"sqlite:///{primary_path}", connect_args={"check_same_thread": False})
+    database.Base.metadata.create_all(bind=primary)
+
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=primary))
+
+    def sync_replica():
+        # Stand-in for replication: copy the primary file over the replica
+        database.configure_replicas([])
+        shutil.copy(primary_path, replica_path)
+        database.configure_replicas([f"sqlite:///{replica_path}"])
+
+    sync_replica()
+    yield sync_replica
+    database.configure_replicas([])
+    primary.dispose()
+
+
+def test_reads_go_to_replica_and_writes_stick_to_primary(replicated, monkeypatch):
+    client = TestClient(app)
+    client.post("/users/register", json={"username": "replica_user", "email": "replica@example.com", "password": "password123"})
+    token = client.post("/users/login", json={"email": "replica@example.com", "password": "password123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    replicated()
+
+    created = client.post("/calculations", headers=headers, json={"a": 2, "b": 3, "type": "Add"}).json()
+
+    # Within the stickiness window the writer reads its own write from the primary
+    assert client.get(f"/calculations/{created['id']}", headers=headers).status_code == 200
+
+    # Another worker, or a client with a refreshed token, is still sticky:
+    # the last write travels in a cookie
+    assert client.cookies.get(database.LAST_WRITE_COOKIE)
+    fresh = TestClient(app, cookies={database.LAST_WRITE_COOKIE: client.cookies.get(database.LAST_WRITE_COOKIE)})
+    assert fresh.get(f"/calculations/{created['id']}", headers=headers).status_code == 200
+    # A forged time in the future does not make a client sticky
+    forged = TestClient(app, cookies={database.LAST_WRITE_COOKIE: "99999999999"})
+    assert forged.get(f"/calculations/{created['id']}", headers=headers).status_code == 404
+
+    # Once the window has passed, reads go to the replica, which has not
+    # received the row yet
+    monkeypatch.setattr(database, "READ_AFTER_WRITE_SECONDS", 0)
+    assert client.get(f"/calculations/{created['id']}", headers=headers).status_code == 404
+
+    replicated()
+    assert client.get(f"/calculations/{created['id']}", headers=headers).status_code == 200
+
+
+def test_user_missing_on_replica_falls_back_to_primary(replicated):
+    client = TestClient(app)
+    client.post("/users/register", json={"username": "lagging", "email": "lagging@example.com", "password": "password123"})
+    token = client.post("/users/login", json={"email": "lagging@example.com", "password": "password123"}).json()["access_token"]
+
+    response = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["username"] == "lagging"
+
+
+def test_without_replicas_reads_share_the_primary_session(monkeypatch):
+    database.configure_replicas([])
+    gen = database.get_read_db(request=None, db="primary-session")
+    assert next(gen) == "primary-session"
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import database, security
+from app.singleflight import calculation_flights, user_flights
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def setup_database():
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+@pytest.fixture
+def slow_selects():
+    """Counts SELECTs from `table` and makes each take 50 ms, so concurrent requests overlap."""
+    counts = {}
+
+    def slow(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT"):
+            for table in ("calculations", "users"):
+                if f"FROM {table}" in statement:
+                    counts[table] = counts.get(table, 0) + 1
+            time.sleep(0.05)
+
+    event.listen(database.engine, "before_cursor_execute", slow)
+    yield counts
+    event.remove(database.engine, "before_cursor_execute", slow)
+
+
+def concurrent_gets(path, n, headers=None):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as http:
+            return await asyncio.gather(*[http.get(path) for _ in range(n)])
+
+    return asyncio.run(main())
+
+
+def test_concurrent_user_reads_share_a_query(setup_database, slow_selects, login):
+    headers = login("coalesce_user")
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    user_flights.reset_stats()
+    slow_selects.clear()
+
+    responses = concurrent_gets(f"/users/{user_id}", 10)
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.content for r in responses}) == 1
+    assert responses[0].json()["username"] == "coalesce_user"
+    stats = user_flights.stats()
+    assert stats["saved"] > 0
+    assert stats["queries"] + stats["saved"] == 10
+    assert slow_selects["users"] == stats["queries"]
+
+    assert client.get("/users/999999").status_code == 404
+
+
+def test_concurrent_first_pages_share_a_query(setup_database, slow_selects, login):
+    headers = login("coalesce_calcs")
+    for a in range(3):
+        client.post("/calculations", headers=headers, json={"a": a, "b": 1, "type": "Add"})
+    calculation_flights.reset_stats()
+    slow_selects.clear()
+
+    responses = concurrent_gets("/calculations", 8, headers)
+    assert [len(r.json()) for r in responses] == [3] * 8
+    stats = calculation_flights.stats()
+    assert stats["saved"] > 0
+    assert slow_selects["calculations"] == stats["queries"]
+
+
+def test_coalescing_stats_need_the_admin_token(monkeypatch):
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/admin/coalescing").status_code == 403
+    body = client.get("/admin/coalescing", headers={"X-Admin-Token": "s3cret"}).json()
+    assert set(body) == {"users", "calculations"}
+    assert set(body["users"]) == {"queries", "saved", "timeouts", "in_flight"}
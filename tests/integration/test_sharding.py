@@ -0,0 +1,83 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app import database, migrations, sharding
+from app.models import Calculation
+from main import app
+
+
+def shard_url(tmp_path, i):
+    return f"sqlite:///{tmp_path / f'shard{i}.db'}"
+
+
+def calculations_on(url):
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(Calculation.__table__.c.id, Calculation.__table__.c.user_id)).all()
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}", connect_args={"check_same_thread": False})
+    migrations.migrate(primary)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=primary))
+    urls = [shard_url(tmp_path, i) for i in range(2)]
+    database.configure_shards(urls)
+    for i, e in enumerate(database.shard_engines):
+        migrations.migrate(e, shard=i)
+    yield urls
+    database.configure_shards([])
+    primary.dispose()
+
+
+def test_shard_for_user_is_stable_and_spreads_users():
+    assert sharding.shard_for_user(42, 4) == sharding.shard_for_user(42, 4)
+    assert len({sharding.shard_for_user(uid, 4) for uid in range(100)}) == 4
+
+
+def test_calculations_are_stored_on_the_users_shard(sharded, login):
+    client = TestClient(app)
+    users = []
+    for n in range(6):
+        headers = login(f"shard{n}")
+        user_id = client.get("/users/me", headers=headers).json()["id"]
+        created = client.post("/calculations", headers=headers, json={"a": n, "b": 1, "type": "Add"}).json()
+        users.append((user_id, created["id"], headers))
+
+    for user_id, calc_id, headers in users:
+        shard = database.shard_for_user(user_id)
+        assert (calc_id, user_id) in calculations_on(sharded[shard])
+        # Ids come from the shard's own range, so they are unique across shards
+        assert (shard + 1) * database.SHARD_ID_STRIDE < calc_id < (shard + 2) * database.SHARD_ID_STRIDE
+        assert client.get(f"/calculations/{calc_id}", headers=headers).status_code == 200
+        assert client.put(f"/calculations/{calc_id}", headers=headers, json={"a": 2, "b": 2, "type": "Multiply"}).json()["result"] == 4
+        assert client.delete(f"/calculations/{calc_id}", headers=headers).status_code == 200
+
+
+def test_rebalance_moves_rows_to_new_shards(sharded, tmp_path, login):
+    client = TestClient(app)
+    for n in range(8):
+        headers = login(f"shard{n}")
+        for i in range(3):
+            client.post("/calculations", headers=headers, json={"a": i, "b": 1, "type": "Add"})
+    before = sorted(calculations_on(sharded[0]) + calculations_on(sharded[1]))
+    database.configure_shards([])
+
+    new_urls = sharded + [shard_url(tmp_path, 2)]
+    moves = sharding.rebalance(sharded, new_urls, batch_size=2)
+    assert sum(moves.values()) > 0
+
+    after = []
+    for index, url in enumerate(new_urls):
+        rows = calculations_on(url)
+        assert all(sharding.shard_for_user(user_id, 3) == index for _, user_id in rows)
+        after += rows
+    assert sorted(after) == before
+
+    # Running it again finds nothing left to move
+    assert sharding.rebalance(new_urls, new_urls) == {}
@@ -0,0 +1,21 @@
+from sqlalchemy import create_engine, insert
+
+from app import migrations, storage
+from app.models import Calculation
+
+
+def test_report_counts_rows_and_bytes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'storage.db'}")
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Calculation.__table__), [
+            {"a": i, "b": 1, "type_code": "Add", "result": i + 1, "user_id": 1} for i in range(500)
+        ])
+
+    report = {r["table"]: r for r in storage.report(engine)}
+    calculations = report["calculations"]
+    assert calculations["rows"] == 500
+    assert calculations["table_bytes"] > 0 and calculations["index_bytes"] > 0
+    assert calculations["table_bytes_per_row"] == calculations["table_bytes"] / 500
+    assert report["calculation_types"]["rows"] == 4
+    engine.dispose()
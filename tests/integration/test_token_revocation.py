@@ -0,0 +1,110 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database
+from app.revocation import RevocationList, revocation_list
+from app.security import token_cache
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def setup_database():
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+    revocation_list.clear()
+    token_cache.clear()
+
+
+def login(username, email, password="password123"):
+    client.post("/users/register", json={"username": username, "email": email, "password": password})
+    response = client.post("/users/login", json={"email": email, "password": password})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_login_returns_refresh_token(setup_database):
+    tokens = login("refresh_user", "refresh@example.com")
+    assert tokens["token_type"] == "bearer"
+    assert tokens["refresh_token"]
+
+
+def test_refresh_issues_new_tokens_and_rotates(setup_database):
+    tokens = login("rotate_user", "rotate@example.com")
+    response = client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    new_tokens = response.json()
+    me = client.get("/users/me", headers={"Authorization": f"Bearer {new_tokens['access_token']}"})
+    assert me.json()["username"] == "rotate_user"
+
+    # The old refresh token was used once and is now revoked
+    reuse = client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert reuse.status_code == 401
+
+
+def test_refresh_token_is_not_an_access_token(setup_database):
+    tokens = login("type_user", "type@example.com")
+    response = client.get("/users/me", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401
+
+
+def test_logout_revokes_access_and_refresh_tokens(setup_database):
+    tokens = login("logout_user", "logout@example.com")
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    response = client.post("/users/logout", headers=headers, json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+
+    assert client.get("/users/me", headers=headers).status_code == 401
+    assert client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+
+def test_other_workers_pick_up_revocations_on_sync(setup_database):
+    from jose import jwt
+
+    tokens = login("sync_user", "sync@example.com")
+    client.post("/users/logout", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    jti = jwt.get_unverified_claims(tokens["access_token"])["jti"]
+
+    other_worker = RevocationList()
+    assert not other_worker.is_revoked(jti)
+    db = database.SessionLocal()
+    try:
+        assert other_worker.sync(db) >= 1
+        # A second sync finds nothing new
+        assert other_worker.sync(db) == 0
+    finally:
+        db.close()
+    assert other_worker.is_revoked(jti)
+
+
+def test_refresh_token_replay_fails_on_a_worker_that_has_not_synced(setup_database):
+    tokens = login("replay_user", "replay@example.com")
+    assert client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    # Another worker's in-memory list does not know the token was used
+    revocation_list.clear()
+    token_cache.clear()
+    assert client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+
+def test_sync_picks_up_rows_that_commit_out_of_order(setup_database):
+    from datetime import datetime, timedelta, timezone
+    from app.models import RevokedToken
+
+    expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    worker = RevocationList()
+    db = database.SessionLocal()
+    try:
+        db.add(RevokedToken(id=1000, jti="late-high-id", expires_at=expires))
+        db.commit()
+        worker.sync(db)
+        # A row with a lower id, committed after the sync
+        db.add(RevokedToken(id=999, jti="late-low-id", expires_at=expires))
+        db.commit()
+        assert worker.sync(db) == 1
+    finally:
+        db.close()
+    assert worker.is_revoked("late-low-id")
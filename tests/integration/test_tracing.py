@@ -0,0 +1,77 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, tracing
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+    tracing.reset_exporter()
+    database.Base.metadata.create_all(bind=database.engine)
+    yield path
+    database.Base.metadata.drop_all(bind=database.engine)
+    tracing.reset_exporter()
+
+
+def read_traces(path):
+    if not path.exists():
+        return []
+    traces = []
+    for line in path.read_text().splitlines():
+        traces.append(json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"])
+    return traces
+
+
+def test_nothing_is_recorded_when_sampling_is_off(trace_file, monkeypatch, login):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    headers = login("untraced")
+    client.post("/calculations", headers=headers, json={"a": 1, "b": 2, "type": "Add"})
+    assert read_traces(trace_file) == []
+
+
+def test_sampled_request_records_nested_spans(trace_file, monkeypatch, login):
+    headers = login("traced")
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    response = client.post("/calculations", headers=headers, json={"a": 1, "b": 2, "type": "Add"})
+    assert response.status_code == 200
+
+    [spans] = read_traces(trace_file)
+    by_name = {s["name"]: s for s in spans}
+    root = by_name["POST /calculations"]
+    assert root["kind"] == tracing.KIND_SERVER and "parentSpanId" not in root
+    attributes = {a["key"]: a["value"] for a in root["attributes"]}
+    assert attributes["http.route"] == {"stringValue": "/calculations"}
+    assert attributes["http.response.status_code"] == {"intValue": "200"}
+
+    assert {s["traceId"] for s in spans} == {root["traceId"]}
+    assert by_name["security.decode_token"]["parentSpanId"] == root["spanId"]
+    assert by_name["auth.load_user"]["parentSpanId"] == root["spanId"]
+    commit = by_name["db.session.commit"]
+    insert = by_name["db.INSERT"]
+    assert insert["parentSpanId"] == root["spanId"]
+    assert "INSERT INTO calculations" in {a["key"]: a["value"] for a in insert["attributes"]}["db.statement"]["stringValue"]
+    assert int(commit["endTimeUnixNano"]) >= int(commit["startTimeUnixNano"])
+
+
+def test_password_hashing_is_traced(trace_file, monkeypatch, login):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    login("hashing")
+    names = [{s["name"] for s in spans} for spans in read_traces(trace_file)]
+    assert "security.hash_password" in names[0]
+    assert "security.verify_password" in names[1]
+
+
+def test_traceparent_header_continues_the_callers_trace(trace_file, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    client.post("/add", json={"a": 1, "b": 2}, headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+    client.post("/add", json={"a": 1, "b": 2}, headers={"traceparent": f"00-{trace_id}-{parent_id}-00"})
+    [spans] = read_traces(trace_file)
+    assert spans[-1]["traceId"] == trace_id and spans[-1]["parentSpanId"] == parent_id
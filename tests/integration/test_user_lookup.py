@@ -0,0 +1,76 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import database, security, user_queries
+from main import app
+
+client = TestClient(app)
+ADMIN = {"X-Admin-Token": "s3cret"}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(security, "ADMIN_TOKEN", "s3cret")
+
+
+@pytest.fixture(scope="module")
+def users():
+    database.Base.metadata.create_all(bind=database.engine)
+    ids = []
+    for i in range(5):
+        response = client.post("/users/register", json={"username": f"lookup{i}", "email": f"lookup{i}@example.com", "password": "password123"})
+        ids.append(response.json()["id"])
+    yield ids
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+@pytest.fixture
+def selects():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(database.engine, "before_cursor_execute", record)
+
+
+def test_users_come_back_in_request_order_with_nulls(users, selects):
+    missing = max(users) + 1000
+    requested = [users[3], missing, users[0], users[3]]
+    response = client.get("/users", params={"ids": ",".join(map(str, requested))}, headers=ADMIN)
+    assert response.status_code == 200
+    body = response.json()
+    assert [u and u["id"] for u in body] == [users[3], None, users[0], users[3]]
+    assert body[0] == client.get(f"/users/{users[3]}").json()
+    assert len(selects) == 1 + 1  # the batch, then the single lookup above
+    assert " IN (" in selects[0]
+
+
+def test_post_lookup_and_chunking(users, selects, monkeypatch):
+    monkeypatch.setattr(user_queries, "LOOKUP_CHUNK_SIZE", 2)
+    response = client.post("/users/lookup", json={"ids": users}, headers=ADMIN)
+    assert [u["username"] for u in response.json()] == [f"lookup{i}" for i in range(5)]
+    assert len(selects) == 3
+
+
+def test_invalid_and_oversized_requests(users, monkeypatch):
+    assert client.get("/users?ids=1,x", headers=ADMIN).status_code == 400
+    assert client.get("/users", headers=ADMIN).status_code == 400
+    assert client.get("/users?ids=", headers=ADMIN).json() == []
+    monkeypatch.setattr("main.MAX_LOOKUP_IDS", 3)
+    response = client.post("/users/lookup", json={"ids": [1, 2, 3, 4]}, headers=ADMIN)
+    assert response.status_code == 400
+    assert response.json() == {"error": "At most 3 ids per request"}
+
+
+def test_lookups_need_the_admin_token(users):
+    ids = ",".join(map(str, users))
+    assert client.get(f"/users?ids={ids}").status_code == 403
+    assert client.post("/users/lookup", json={"ids": users}, headers={"X-Admin-Token": "wrong"}).status_code == 403
+    # A user's own token is not enough
+    token = client.post("/users/login", json={"email": "lookup0@example.com", "password": "password123"}).json()["access_token"]
+    assert client.get(f"/users?ids={ids}", headers={"Authorization": f"Bearer {token}"}).status_code == 403
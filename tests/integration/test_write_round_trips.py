@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import database
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def setup_database():
+    database.Base.metadata.create_all(bind=database.engine)
+    yield
+    database.Base.metadata.drop_all(bind=database.engine)
+
+
+@contextmanager
+def recorded_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()))
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+
+
+def writes(statements, table):
+    # The authenticated routes also look the current user up once
+    return [s for s in statements if table in s and not s.startswith("SELECT users.")]
+
+
+def test_register_is_one_round_trip(setup_database):
+    with recorded_statements() as statements:
+        response = client.post("/users/register", json={"username": "rt_user", "email": "rt_user@example.com", "password": "password123"})
+    assert response.status_code == 200
+    assert response.json()["id"] and response.json()["created_at"]
+    assert len(statements) == 1
+    assert statements[0].startswith("INSERT INTO users") and "RETURNING" in statements[0]
+
+
+def test_create_calculation_is_one_round_trip(setup_database, login):
+    headers = login("rt_create")
+    with recorded_statements() as statements:
+        response = client.post("/calculations", headers=headers, json={"a": 6, "b": 3, "type": "Divide"})
+    assert response.status_code == 200
+    assert response.json()["result"] == 2 and response.json()["created_at"]
+    calculation_statements = writes(statements, "calculations")
+    assert len(calculation_statements) == 1
+    assert calculation_statements[0].startswith("INSERT INTO calculations") and "RETURNING" in calculation_statements[0]
+    assert len(statements) == 2
+
+
+def test_update_calculation_is_one_round_trip(setup_database, login):
+    headers = login("rt_update")
+    created = client.post("/calculations", headers=headers, json={"a": 6, "b": 3, "type": "Add"}).json()
+    with recorded_statements() as statements:
+        response = client.put(f"/calculations/{created['id']}", headers=headers, json={"a": 6, "b": 3, "type": "Subtract"})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["type"], data["result"], data["created_at"]) == ("Subtract", 3, created["created_at"])
+    calculation_statements = writes(statements, "calculations")
+    assert len(calculation_statements) == 1
+    assert calculation_statements[0].startswith("UPDATE calculations") and "RETURNING" in calculation_statements[0]
+    assert len(statements) == 2
+
+
+def test_update_of_someone_elses_calculation_is_not_found(setup_database, login):
+    owner = login("rt_owner")
+    created = client.post("/calculations", headers=owner, json={"a": 1, "b": 1, "type": "Add"}).json()
+    response = client.put(f"/calculations/{created['id']}", headers=login("rt_other"), json={"a": 2, "b": 2, "type": "Add"})
+    assert response.status_code == 404
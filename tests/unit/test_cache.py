@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app.cache import LocalCache, SharedMemoryCache, make_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(params=["local", "shared"])
+def new_cache(request, tmp_path):
+    def create(maxsize, ttl=None):
+        if request.param == "local":
+            return LocalCache(maxsize, ttl)
+        return SharedMemoryCache("test", maxsize, ttl, directory=str(tmp_path))
+
+    return create
+
+
+def test_get_set_delete_and_stats(new_cache):
+    cache = new_cache(4)
+    assert cache.get("a") is None
+    assert cache.set("a", {"sub": "1"})
+    assert cache.get("a") == {"sub": "1"}
+    cache.delete("a")
+    assert cache.get(b"a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 0)
+    cache.set("b", 1)
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 0
+
+
+def test_entries_expire(new_cache):
+    cache = new_cache(4, ttl=60)
+    cache.set("short", 1, ttl=0.01)
+    cache.set("default", 2)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get("default") == 2
+
+
+def test_least_recently_used_entries_are_evicted(new_cache):
+    cache = new_cache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_version_stamps_drop_stale_fills(new_cache):
+    cache = new_cache(4)
+    cache.set("user:1", "old")
+    version = cache.version("user:1")
+    cache.invalidate("user:1")
+    assert cache.get("user:1") is None
+    # A value computed before the invalidation is not stored
+    assert not cache.set("user:1", "stale", version=version)
+    assert cache.set("user:1", "fresh", version=cache.version("user:1"))
+    assert cache.get("user:1") == "fresh"
+
+
+def test_zero_maxsize_disables_the_cache(new_cache):
+    cache = new_cache(4)
+    cache.maxsize = 0
+    assert not cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_shared_cache_is_visible_to_other_processes(tmp_path):
+    cache = SharedMemoryCache("test", 16, directory=str(tmp_path))
+    cache.set("from-parent", [1, 2])
+    code = (
+        "from app.cache import SharedMemoryCache; "
+        f"cache = SharedMemoryCache('test', 16, directory={str(tmp_path)!r}); "
+        "assert cache.get('from-parent') == [1, 2]; "
+        "cache.set('from-child', 'hello'); cache.invalidate('from-parent')"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=ROOT)
+    assert cache.get("from-child") == "hello"
+    assert cache.get("from-parent") is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_shared_cache_skips_values_larger_than_a_slot(tmp_path):
+    cache = SharedMemoryCache("test", 4, slot_size=128, directory=str(tmp_path))
+    assert not cache.set("big", b"x" * 200)
+    assert cache.get("big") is None
+    assert cache.stats()["oversize"] == 1
+
+
+def test_make_cache_picks_the_backend():
+    assert isinstance(make_cache("x", 4, backend="local"), LocalCache)
+    # A disabled cache needs no shared file
+    assert isinstance(make_cache("x", 0, backend="shared"), LocalCache)
+    with pytest.raises(ValueError):
+        make_cache("x", 4, backend="redis")
+
+
+def test_shared_values_are_bytes_or_json(tmp_path):
+    cache = SharedMemoryCache("test", 4, directory=str(tmp_path))
+    cache.set("raw", b"\x00body")
+    cache.set("claims", {"sub": "1", "exp": 5})
+    assert cache.get("raw") == b"\x00body"
+    assert cache.get("claims") == {"sub": "1", "exp": 5}
+    with pytest.raises(TypeError):
+        cache.set("object", object())
+
+
+def test_shared_cache_lives_in_a_private_directory(tmp_path):
+    cache = SharedMemoryCache("test", 4, directory=str(tmp_path))
+    directory = os.path.dirname(cache.path)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    assert os.stat(cache.path).st_mode & 0o777 == 0o600
+
+
+def test_shared_cache_refuses_files_others_can_touch(tmp_path):
+    directory = tmp_path / f"calculator-cache-{os.geteuid()}"
+    directory.mkdir(mode=0o777)
+    directory.chmod(0o777)
+    with pytest.raises(PermissionError):
+        SharedMemoryCache("test", 4, directory=str(tmp_path))
+
+    directory.chmod(0o700)
+    planted = directory / "test-4x512.cache"
+    planted.write_bytes(b"")
+    planted.chmod(0o666)
+    with pytest.raises(PermissionError):
+        SharedMemoryCache("test", 4, directory=str(tmp_path))
+
+    planted.unlink()
+    os.symlink(tmp_path / "elsewhere", planted)
+    with pytest.raises(OSError):
+        SharedMemoryCache("test", 4, directory=str(tmp_path))
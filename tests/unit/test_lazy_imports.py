@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_importing_main_does_not_load_crypto_or_templating():
+    code = (
+        "import sys, main; "
+        "print(','.join(m for m in ('jose', 'passlib', 'jinja2', 'uvicorn') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+        env={"DATABASE_URL": "sqlite:///:memory:", "PATH": ""},
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_operations_is_a_regular_package():
+    import app.operations
+
+    assert app.operations.__file__.endswith("__init__.py")
+    assert "app.operations_module" not in sys.modules
@@ -0,0 +1,52 @@
+from passlib.context import CryptContext
+
+from app import password_hashing
+
+
+def test_context_flags_hashes_with_another_cost(monkeypatch):
+    monkeypatch.setitem(password_hashing.SETTINGS, "pbkdf2_sha256", {"rounds": 2000})
+    context = CryptContext(**password_hashing.context_settings("pbkdf2_sha256"))
+    current = context.hash("secret")
+    assert "$2000$" in current
+    assert not context.needs_update(current)
+    for rounds in (1000, 3000):
+        other = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=rounds).hash("secret")
+        assert context.verify("secret", other)
+        assert context.needs_update(other)
+
+
+def test_context_hashes_with_the_configured_scheme_first():
+    settings = password_hashing.context_settings("argon2")
+    assert settings["schemes"][0] == "argon2"
+    assert set(settings["schemes"]) == set(password_hashing.SCHEMES)
+    assert settings["argon2__min_rounds"] == settings["argon2__max_rounds"] == password_hashing.SETTINGS["argon2"]["time_cost"]
+    assert settings["argon2__memory_cost"] == password_hashing.SETTINGS["argon2"]["memory_cost"]
+
+
+def test_calibrate_pbkdf2_meets_the_target(monkeypatch):
+    # A machine that hashes 3000 rounds per millisecond, so the result
+    # doesn't depend on how busy the test runner is
+    calls = []
+
+    def time_hash(scheme, settings, samples=5, concurrency=1):
+        calls.append((scheme, samples, concurrency))
+        return settings["rounds"] / 3000
+
+    monkeypatch.setattr(password_hashing, "time_hash", time_hash)
+    settings, ms = password_hashing.calibrate_pbkdf2(target_ms=5, samples=2, concurrency=2)
+    assert settings == {"rounds": 15000}
+    assert ms == 5
+    assert set(calls) == {("pbkdf2_sha256", 2, 2)}
+    assert password_hashing.env_lines("pbkdf2_sha256", settings) == [
+        "PASSWORD_SCHEME=pbkdf2_sha256",
+        f"PASSWORD_PBKDF2_ROUNDS={settings['rounds']}",
+    ]
+
+
+def test_calibrate_reports_missing_backends(capsys, monkeypatch):
+    def missing(*args, **kwargs):
+        raise RuntimeError("no backend")
+
+    monkeypatch.setitem(password_hashing.CALIBRATORS, "argon2", missing)
+    password_hashing.main(["calibrate", "--scheme", "argon2"])
+    assert "argon2: unavailable (RuntimeError: no backend)" in capsys.readouterr().out
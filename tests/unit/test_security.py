@@ -13,3 +13,36 @@ def test_verify_password_success_and_failure():
     hashed = hash_password(password)
     assert verify_password(password, hashed) is True
     assert verify_password("wrongpassword", hashed) is False
+
+
+def test_decode_access_token_caches_verified_claims(monkeypatch):
+    from jose import jwt
+    from app.security import create_access_token, decode_access_token, token_cache
+
+    token_cache.clear()
+    token = create_access_token({"sub": "42"})
+    assert decode_access_token(token)["sub"] == "42"
+
+    # A cached token must not be verified again
+    def fail(*args, **kwargs):
+        raise AssertionError("signature verified twice")
+
+    monkeypatch.setattr(jwt, "decode", fail)
+    assert decode_access_token(token)["sub"] == "42"
+    assert token_cache.hits == 1
+
+
+def test_token_cache_is_bounded_and_expires_entries():
+    import time
+    from app.security import TokenCache
+
+    cache = TokenCache(maxsize=2)
+    future = time.time() + 60
+    cache.set("a", {"sub": "1", "exp": future})
+    cache.set("b", {"sub": "2", "exp": future})
+    cache.set("c", {"sub": "3", "exp": future})
+    assert len(cache) == 2
+    assert cache.get("a") is None
+
+    cache.set("expired", {"sub": "4", "exp": time.time() - 1})
+    assert cache.get("expired") is None
@@ -0,0 +1,33 @@
+from app import server
+
+
+def test_defaults_size_workers_from_cpus(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr(server, "available_cpus", lambda: 3)
+    settings = server.server_config(server.build_parser().parse_args([]))
+    assert settings["workers"] == 3
+    assert settings["backlog"] == 2048
+    assert settings["timeout_keep_alive"] == 5
+    assert settings["limit_concurrency"] is None
+
+
+def test_environment_and_arguments_override_defaults(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "6")
+    monkeypatch.setenv("LIMIT_CONCURRENCY", "500")
+    args = server.build_parser().parse_args(["--keepalive-timeout", "20", "--loop", "asyncio", "--http", "h11"])
+    settings = server.server_config(args)
+    assert settings["workers"] == 6
+    assert settings["limit_concurrency"] == 500
+    assert settings["timeout_keep_alive"] == 20
+    assert (settings["loop"], settings["http"]) == ("asyncio", "h11")
+
+
+def test_auto_picks_fast_implementations_only_when_installed(monkeypatch):
+    monkeypatch.setattr(server, "_installed", lambda module: True)
+    assert (server.choose_loop(), server.choose_http()) == ("uvloop", "httptools")
+    monkeypatch.setattr(server, "_installed", lambda module: False)
+    assert (server.choose_loop(), server.choose_http()) == ("asyncio", "h11")
+
+
+def test_available_cpus_is_at_least_one():
+    assert server.available_cpus() >= 1
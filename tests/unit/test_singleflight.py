@@ -0,0 +1,143 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_calls_share_one_query():
+    group = SingleFlight("test", timeout=1)
+    calls = []
+
+    async def query():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"id": 1}
+
+    async def main():
+        return await asyncio.gather(*[group.do((1,), query) for _ in range(10)])
+
+    results = run(main())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert group.stats() == {"queries": 1, "saved": 9, "timeouts": 0, "in_flight": 0}
+
+
+def test_different_keys_and_later_calls_run_their_own_query():
+    group = SingleFlight("test", timeout=1)
+
+    async def query():
+        await asyncio.sleep(0.01)
+        return "row"
+
+    async def main():
+        await asyncio.gather(group.do((1,), query), group.do((2,), query))
+        await group.do((1,), query)
+
+    run(main())
+    assert group.stats()["queries"] == 3
+    assert group.stats()["saved"] == 0
+
+
+def test_followers_stop_waiting_after_the_timeout():
+    group = SingleFlight("test", timeout=1)
+    calls = []
+
+    async def slow():
+        calls.append("slow")
+        await asyncio.sleep(0.3)
+        return "slow"
+
+    async def fast():
+        calls.append("fast")
+        return "fast"
+
+    async def main():
+        leader = asyncio.ensure_future(group.do((1,), slow))
+        await asyncio.sleep(0)
+        follower = await group.do((1,), fast, timeout=0.05)
+        return await leader, follower
+
+    assert run(main()) == ("slow", "fast")
+    assert calls == ["slow", "fast"]
+    assert group.stats()["timeouts"] == 1
+
+
+def test_errors_reach_every_waiter():
+    group = SingleFlight("test", timeout=1)
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database is down")
+
+    async def main():
+        return await asyncio.gather(*[group.do((1,), failing) for _ in range(3)], return_exceptions=True)
+
+    results = run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert group.stats()["queries"] == 1
+
+
+def test_followers_run_their_own_query_when_the_leader_is_cancelled():
+    group = SingleFlight("test", timeout=1)
+
+    async def query():
+        await asyncio.sleep(0.05)
+        return "row"
+
+    async def main():
+        leader = asyncio.ensure_future(group.do((1,), query))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(group.do((1,), query))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert run(main()) == "row"
+    assert group.stats()["queries"] == 2
+
+
+def test_forget_stops_sharing_a_users_flights():
+    group = SingleFlight("test", timeout=1)
+    calls = []
+
+    async def query():
+        calls.append(1)
+        n = len(calls)
+        await asyncio.sleep(0.02)
+        return n
+
+    async def main():
+        first = asyncio.ensure_future(group.do((7, 10), query))
+        await asyncio.sleep(0)
+        group.forget(7)
+        second = await group.do((7, 10), query)
+        return await first, second
+
+    assert run(main()) == (1, 2)
+
+
+def test_calls_on_different_event_loops_never_share_a_flight():
+    group = SingleFlight("test", timeout=1)
+    calls = []
+
+    async def query():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "row"
+
+    async def follower():
+        await asyncio.sleep(0.02)
+        return await group.do((1,), query)
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(run, group.do((1,), query))
+        other = pool.submit(run, follower())
+        assert (leader.result(), other.result()) == ("row", "row")
+    assert len(calls) == 2
+    assert group.stats()["in_flight"] == 0
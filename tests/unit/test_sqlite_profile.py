@@ -0,0 +1,28 @@
+from sqlalchemy import text
+
+from app import sqlite_profile
+from app.database import make_engine
+
+
+def pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_throughput_profile_sets_connection_pragmas(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'profile.db'}", "throughput")
+    assert pragma(engine, "journal_mode") == "wal"
+    assert pragma(engine, "synchronous") == 1  # NORMAL
+    assert pragma(engine, "cache_size") == sqlite_profile.SQLITE_CACHE_SIZE
+    assert pragma(engine, "busy_timeout") == sqlite_profile.SQLITE_BUSY_TIMEOUT_MS
+    assert pragma(engine, "temp_store") == 2  # MEMORY
+    assert pragma(engine, "mmap_size") == sqlite_profile.SQLITE_MMAP_SIZE
+    sqlite_profile.checkpoint(engine)
+    sqlite_profile.optimize(engine)
+    engine.dispose()
+
+
+def test_profile_off_keeps_sqlite_defaults(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'default.db'}", "off")
+    assert pragma(engine, "journal_mode") == "delete"
+    engine.dispose()